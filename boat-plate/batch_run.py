@@ -0,0 +1,180 @@
+import sys
+import csv
+import json
+import time
+import argparse
+
+from ocr_engine import (ShipPlateEngine, DEFAULT_CONFIG, BACKENDS, DET_MODES, list_images, recognize_paths,
+                        load_camera_profiles)
+from ocr_pool import OcrProcessPool
+from result_cache import ResultCache, DEFAULT_CACHE_PATH
+from metrics import start_metrics
+from recognition_store import RecognitionStore, DEFAULT_DB_PATH
+from crop_store import CROP_FORMATS, CropStore, crop_dir_for
+
+CSV_FIELDS = ['image', 'text', 'score', 'box', 'decode_ms', 'det_ms', 'crop_ms', 'rec_ms', 'total_ms']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='船牌批量检测识别（无界面）')
+    parser.add_argument('inputs', nargs='+', help='图片文件、目录、通配符或 @文件列表')
+    parser.add_argument('-o', '--output', default='-', help='输出文件，默认输出到标准输出')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl', help='输出格式')
+    parser.add_argument('--batch-size', type=int, default=8, help='每批处理的图片数量')
+    parser.add_argument('--det-model-dir', default=DEFAULT_CONFIG['det_model_dir'])
+    parser.add_argument('--rec-model-dir', default=DEFAULT_CONFIG['rec_model_dir'])
+    parser.add_argument('--rec-cascade', action='store_true',
+                        help='识别级联：先用轻量识别模型，置信度低于--cascade-score的裁剪图再用完整模型识别')
+    parser.add_argument('--rec-light-model-dir', default=DEFAULT_CONFIG['rec_light_model_dir'])
+    parser.add_argument('--cascade-score', type=float, default=DEFAULT_CONFIG['rec_cascade_score'])
+    parser.add_argument('--device', choices=['auto', 'cpu', 'gpu'], default=DEFAULT_CONFIG['device'],
+                        help='推理设备，auto在有可用GPU时使用GPU')
+    parser.add_argument('--backend', choices=BACKENDS, default=DEFAULT_CONFIG['backend'],
+                        help='推理后端，onnxruntime/openvino需先用onnx_backend.py导出ONNX模型，只支持CPU')
+    parser.add_argument('--onnx-model-dir', default=DEFAULT_CONFIG['onnx_model_dir'])
+    parser.add_argument('--precision', choices=['fp32', 'int8'], default=DEFAULT_CONFIG['onnx_precision'],
+                        help='ONNX后端的模型精度，int8需先用onnx_quantize.py校准生成')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='CPU多进程数，每个进程加载一次模型；0表示在当前进程中运行')
+    parser.add_argument('--threads', type=int, default=None, help='每个进程的推理线程数')
+    parser.add_argument('--mkldnn', action='store_true', help='CPU推理开启mkldnn加速')
+    parser.add_argument('--rec-mode', choices=['all', 'selective'], default=DEFAULT_CONFIG['rec_mode'],
+                        help='selective：按检测分数和船牌形状排序，只识别前几个候选框')
+    parser.add_argument('--top-k', type=int, default=DEFAULT_CONFIG['rec_top_k'],
+                        help='selective模式每轮识别的候选框数')
+    parser.add_argument('--det-mode', choices=DET_MODES, default=DEFAULT_CONFIG['det_mode'],
+                        help='adaptive：先低分辨率粗检，只对小目标区域做完整分辨率细检；'
+                             'tiled：超大图切成重叠分块按原分辨率检测，找远处的小船牌')
+    parser.add_argument('--det-postprocess', choices=['paddle', 'fast'], default=DEFAULT_CONFIG['det_postprocess'],
+                        help='fast：使用向量化的DB后处理，检测框与paddle实现一致（误差在1~2像素内）')
+    parser.add_argument('--camera-profiles', default=None,
+                        help='摄像头配置文件，按图片路径匹配各自的检测分辨率参数')
+    parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_PATH, default=None, metavar='PATH',
+                        help='启用结果缓存，重复图片直接返回缓存结果；可指定缓存库路径')
+    parser.add_argument('--cache-size', type=int, default=100000, help='缓存最多保存的图片数')
+    parser.add_argument('--db', nargs='?', const=DEFAULT_DB_PATH, default=None, metavar='PATH',
+                        help='识别出文本的结果同时写入识别记录库（后台分组提交）；可指定库文件路径')
+    parser.add_argument('--crop-dir', default=None,
+                        help='船牌裁剪图目录，默认为库文件旁的 <库名>_crops；指定后不写库也保存裁剪图')
+    parser.add_argument('--crop-format', choices=sorted(CROP_FORMATS), default='png',
+                        help='裁剪图格式：png无损；webp有损，约小5倍')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='在 http://127.0.0.1:端口/metrics 提供Prometheus格式的性能指标')
+    parser.add_argument('--metrics-log-interval', type=float, default=None,
+                        help='每隔这么多秒输出一行性能指标日志')
+    return parser.parse_args(argv)
+
+
+class ResultWriter:
+    """逐条写出JSONL/CSV结果，每条写完立即刷新，便于边跑边看"""
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.csv_writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+            self.csv_writer.writeheader()
+
+    def write(self, record):
+        if self.fmt == 'jsonl':
+            self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        else:
+            timings = {k: record['timings'].get(k, 0.0) for k in ('decode', 'det', 'crop', 'rec', 'total')}
+            self.csv_writer.writerow({
+                'image': record['image'],
+                'text': record['text'],
+                'score': '%.4f' % record['score'],
+                'box': json.dumps(record['box']),
+                'decode_ms': '%.1f' % (timings['decode'] * 1000),
+                'det_ms': '%.1f' % (timings['det'] * 1000),
+                'crop_ms': '%.1f' % (timings['crop'] * 1000),
+                'rec_ms': '%.1f' % (timings['rec'] * 1000),
+                'total_ms': '%.1f' % (timings['total'] * 1000),
+            })
+        self.stream.flush()
+
+
+def iter_batches(items, batch_size):
+    for i in range(0, len(items), batch_size):
+        yield items[i:i + batch_size]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = list_images(args.inputs)
+    if not paths:
+        print('没有找到图片', file=sys.stderr)
+        return 1
+
+    config = {
+        'det_model_dir': args.det_model_dir,
+        'rec_model_dir': args.rec_model_dir,
+        'rec_cascade': args.rec_cascade,
+        'rec_light_model_dir': args.rec_light_model_dir,
+        'rec_cascade_score': args.cascade_score,
+        'device': args.device,
+        'enable_mkldnn': args.mkldnn,
+        'rec_mode': args.rec_mode,
+        'rec_top_k': args.top_k,
+        'det_mode': args.det_mode,
+        'det_postprocess': args.det_postprocess,
+        'backend': args.backend,
+        'onnx_model_dir': args.onnx_model_dir,
+        'onnx_precision': args.precision,
+    }
+    profiles = load_camera_profiles(args.camera_profiles) if args.camera_profiles else None
+    if args.threads:
+        config['cpu_threads'] = args.threads
+
+    metrics = start_metrics(args.metrics_port, args.metrics_log_interval)
+    store = RecognitionStore(args.db, metrics=metrics) if args.db else None
+    crop_dir = args.crop_dir or (crop_dir_for(args.db) if args.db else None)
+    stream = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+
+    def emit(record):
+        writer.write(record)
+        if metrics is not None:
+            metrics.observe_record(record, args.cache is not None)
+        if store is not None and record['text']:
+            store.add_result(record['image'], record)
+
+    try:
+        writer = ResultWriter(stream, args.format)
+        start = time.perf_counter()
+        done = 0
+        if args.workers > 0:
+            with OcrProcessPool(config, workers=args.workers, threads_per_worker=args.threads,
+                                chunk_size=args.batch_size, cache_path=args.cache,
+                                cache_size=args.cache_size, profiles=profiles,
+                                crop_dir=crop_dir, crop_format=args.crop_format) as pool:
+                for record in pool.imap(paths):
+                    emit(record)
+                    done += 1
+        else:
+            engine = ShipPlateEngine(config)
+            if metrics is not None:
+                engine.stage_timer = metrics
+            cache = ResultCache.for_engine(engine, args.cache, args.cache_size) if args.cache else None
+            crops = CropStore(crop_dir, args.crop_format) if crop_dir else None
+            for batch in iter_batches(paths, args.batch_size):
+                for record in recognize_paths(engine, batch, cache, profiles, crops):
+                    emit(record)
+                    done += 1
+            if cache is not None:
+                print('缓存命中率 %.1f%%' % (cache.hit_rate() * 100), file=sys.stderr)
+                cache.close()
+        elapsed = time.perf_counter() - start
+        print('处理 %d 张图片，耗时 %.2fs，%.2f 张/秒' % (done, elapsed, done / elapsed if elapsed else 0.0),
+              file=sys.stderr)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+        if store is not None:
+            store.close()
+        if metrics is not None:
+            metrics.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,467 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+
+import cv2
+import numpy as np
+
+from ocr_engine import (ShipPlateEngine, StageTimer, DEFAULT_CONFIG, BACKENDS, BASE_DIR, DET_MODES, REC_BATCHING,
+                        list_images, read_file, decode_image, load_image, plan_rec_batches, rec_input_width,
+                        get_rotate_crop_image)
+
+# 单进程模式下分阶段统计的耗时，顺序即流水线顺序
+STAGES = ('decode', 'det_preprocess', 'det_infer', 'db_postprocess', 'crop',
+          'rec_preprocess', 'rec_infer', 'ctc_decode')
+# 开启识别级联时，轻量识别模型的阶段排在完整模型之前
+CASCADE_STAGES = STAGES[:5] + ('rec_light_preprocess', 'rec_light_infer') + STAGES[5:]
+# 多进程模式只能拿到每条记录里的粗粒度耗时
+WORKER_STAGES = ('decode', 'det', 'crop', 'rec')
+MODES = ('single', 'batched', 'workers')
+
+
+def peak_rss_mb(children=False):
+    """进程的峰值常驻内存(MB)；children=True时为已结束子进程中的最大值。不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux上单位是KB，macOS上是字节
+    return rss / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0)
+
+
+def latency_stats(values):
+    """耗时列表(秒)的分位数统计，单位毫秒"""
+    if not values:
+        return {'count': 0}
+    ms = np.asarray(values) * 1000
+    return {'count': len(values), 'mean_ms': float(ms.mean()),
+            'p50_ms': float(np.percentile(ms, 50)), 'p95_ms': float(np.percentile(ms, 95)),
+            'p99_ms': float(np.percentile(ms, 99)), 'max_ms': float(ms.max())}
+
+
+def stage_stats(samples, num_images, stages):
+    """各阶段的每次调用耗时统计，以及平均到每张图片的耗时"""
+    stats = {}
+    for stage in stages:
+        values = samples.get(stage, [])
+        stats[stage] = dict(latency_stats(values), per_image_ms=1000 * sum(values) / num_images if num_images else 0.0)
+    return stats
+
+
+def run_engine(engine, paths, batch_size):
+    """在当前进程中按批解码、检测识别，返回每张图片的延迟(秒)。
+    同一批的图片一起返回结果，延迟都记为整批的耗时"""
+    latencies = []
+    for i in range(0, len(paths), batch_size):
+        chunk = paths[i:i + batch_size]
+        t0 = time.perf_counter()
+        images = []
+        for path in chunk:
+            t = time.perf_counter()
+            images.append(decode_image(read_file(path)))
+            engine.stage_timer.add('decode', time.perf_counter() - t)
+        engine.process_images(images)
+        latencies.extend([time.perf_counter() - t0] * len(chunk))
+    return latencies
+
+
+def bench_in_process(config, paths, batch_size, warmup, repeat):
+    """single/batched模式：先用warmup张图片预热并单独统计，再把全部图片跑repeat遍作为稳态结果"""
+    t0 = time.perf_counter()
+    engine = ShipPlateEngine(config)
+    startup = time.perf_counter() - t0
+    engine.stage_timer = StageTimer()
+    stages = CASCADE_STAGES if engine.config['rec_cascade'] else STAGES
+
+    warm_paths = paths[:warmup]
+    t0 = time.perf_counter()
+    warm = run_engine(engine, warm_paths, batch_size) if warm_paths else []
+    warm_elapsed = time.perf_counter() - t0
+    warm_stages = engine.stage_timer.samples
+
+    engine.stage_timer = StageTimer()
+    steady_paths = paths * repeat
+    t0 = time.perf_counter()
+    latencies = run_engine(engine, steady_paths, batch_size)
+    elapsed = time.perf_counter() - t0
+    counts = engine.stage_timer.counts
+    return {
+        'startup_s': startup,
+        'warmup': {'images': len(warm_paths), 'elapsed_s': warm_elapsed,
+                   'first_ms': 1000 * warm[0] if warm else 0.0, 'latency': latency_stats(warm),
+                   'stages': stage_stats(warm_stages, len(warm_paths), stages)},
+        'steady': {'images': len(steady_paths), 'elapsed_s': elapsed,
+                   'images_per_sec': len(steady_paths) / elapsed if elapsed else 0.0,
+                   'latency': latency_stats(latencies),
+                   'stages': stage_stats(engine.stage_timer.samples, len(steady_paths), stages),
+                   'rec_light_accepted': counts.get('rec_light_accepted', 0),
+                   'rec_fallbacks': counts.get('rec_fallbacks', 0)},
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def collect_records(records):
+    """多进程记录中的每张处理耗时和粗粒度阶段耗时"""
+    latencies, samples = [], {}
+    for record in records:
+        latencies.append(record['timings']['total'])
+        for stage in WORKER_STAGES:
+            samples.setdefault(stage, []).append(record['timings'].get(stage, 0.0))
+    return latencies, samples
+
+
+def bench_workers(config, paths, batch_size, warmup, repeat, workers, threads):
+    """workers模式：多进程池，延迟为单张图片在子进程中的处理耗时（不含排队），吞吐按墙上时间计算。
+    子进程在后台加载模型，启动耗时记为从创建进程池到收到第一条结果"""
+    from ocr_pool import OcrProcessPool
+    t0 = time.perf_counter()
+    with OcrProcessPool(config, workers=workers, threads_per_worker=threads, chunk_size=batch_size) as pool:
+        # 每个进程至少分到一批预热图片
+        warm_count = max(warmup, pool.workers * batch_size)
+        warm_paths = [paths[i % len(paths)] for i in range(warm_count)]
+        warm_records = []
+        for record in pool.imap(warm_paths):
+            if not warm_records:
+                startup = time.perf_counter() - t0
+            warm_records.append(record)
+        warm_elapsed = time.perf_counter() - t0
+        warm_latencies, warm_samples = collect_records(warm_records)
+
+        steady_paths = paths * repeat
+        t0 = time.perf_counter()
+        latencies, samples = collect_records(pool.imap(steady_paths))
+        elapsed = time.perf_counter() - t0
+        pool_workers, pool_threads = pool.workers, pool.threads_per_worker
+    return {
+        'workers': pool_workers,
+        'threads_per_worker': pool_threads,
+        'startup_s': startup,
+        'warmup': {'images': len(warm_paths), 'elapsed_s': warm_elapsed,
+                   'latency': latency_stats(warm_latencies),
+                   'stages': stage_stats(warm_samples, len(warm_paths), WORKER_STAGES)},
+        'steady': {'images': len(steady_paths), 'elapsed_s': elapsed,
+                   'images_per_sec': len(steady_paths) / elapsed if elapsed else 0.0,
+                   'latency': latency_stats(latencies),
+                   'stages': stage_stats(samples, len(steady_paths), WORKER_STAGES)},
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_worker_mb': peak_rss_mb(children=True),
+    }
+
+
+def sample_crops(paths, count, seed=0, max_ratio=12.0):
+    """从图片中随机截取count张裁剪图：高32~96像素，宽高比在1~max_ratio之间对数均匀分布，
+    模拟长短不一的船牌和其他文字区域"""
+    rng = np.random.RandomState(seed)
+    images = [img for img in (load_image(path) for path in paths[:20]) if img is not None]
+    crops = []
+    while len(crops) < count:
+        img = images[rng.randint(len(images))]
+        h = rng.randint(32, 97)
+        w = min(img.shape[1], int(h * np.exp(rng.uniform(0, np.log(max_ratio)))))
+        if h >= img.shape[0] or w < 8:
+            continue
+        y, x = rng.randint(img.shape[0] - h), rng.randint(img.shape[1] - w + 1)
+        crops.append(img[y:y + h, x:x + w])
+    return crops
+
+
+def rec_padding_efficiency(ratios, batches):
+    """各裁剪图自身的输入宽度之和 / 补零到批内最宽后的宽度之和，1表示没有补零浪费"""
+    used = padded = 0
+    for batch in batches:
+        width = rec_input_width(max(ratios[i] for i in batch))
+        used += sum(rec_input_width(ratios[i]) for i in batch)
+        padded += width * len(batch)
+    return used / float(padded) if padded else 1.0
+
+
+def bench_rec(config, crops, modes, repeat):
+    """同一组裁剪图按不同分批方式识别repeat遍，返回{分批方式: 统计}。
+    以第一种方式的识别结果为参照，统计其他方式结果一致的比例"""
+    engine = ShipPlateEngine(config)
+    engine.warmup()
+    ratios = [crop.shape[1] / float(crop.shape[0]) for crop in crops]
+    runs, reference = {}, None
+    for mode in modes:
+        engine.config['rec_batching'] = mode
+        texts = [text for text, _ in engine.recognize(crops)]  # 各批宽度不同，先跑一遍预热
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            engine.recognize(crops)
+        elapsed = time.perf_counter() - t0
+        batches = plan_rec_batches(ratios, mode, engine.config['rec_batch_num'],
+                                   engine.config['rec_batch_budget_mb'], engine.config['rec_bucket_spread'])
+        reference = reference or texts
+        runs[mode] = {'crops_per_sec': len(crops) * repeat / elapsed, 'batches': len(batches),
+                      'max_batch': max(len(b) for b in batches),
+                      'padding_efficiency': rec_padding_efficiency(ratios, batches),
+                      'same_text': sum(a == b for a, b in zip(texts, reference)) / float(len(crops))}
+    return runs
+
+
+def detected_crops(engine, paths, count):
+    """检测图片中的文字区域并裁剪，最多count张，作为识别级联的测试输入（与实际识别的输入分布一致）"""
+    crops = []
+    for path in paths:
+        img = load_image(path)
+        if img is None:
+            continue
+        crops.extend(get_rotate_crop_image(img, box) for box in engine.detect(img))
+        if len(crops) >= count:
+            break
+    return crops[:count]
+
+
+def bench_cascade(config, paths, count, scores, repeat):
+    """同一组检测裁剪图先只用完整识别模型、再按scores中的各个阈值开启识别级联各识别repeat遍。
+    返回(裁剪图数, [(阈值或None, 统计), ...])，统计含速度、轻量模型采用率和与完整模型结果一致的比例"""
+    engine = ShipPlateEngine(dict(config, rec_cascade=True))
+    engine.warmup()
+    crops = detected_crops(engine, paths, count)
+    if not crops:
+        return 0, []
+    runs, reference = [], None
+    for score in [None] + list(scores):
+        engine.config['rec_cascade'] = score is not None
+        if score is not None:
+            engine.config['rec_cascade_score'] = score
+        results, routes = engine.recognize_routed(crops)  # 同时作为预热
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            engine.recognize_routed(crops)
+        elapsed = time.perf_counter() - t0
+        texts = [text for text, _ in results]
+        reference = reference or texts
+        runs.append((score, {'crops_per_sec': len(crops) * repeat / elapsed,
+                             'ms_per_crop': 1000 * elapsed / (len(crops) * repeat),
+                             'light_rate': routes.count('light') / float(len(crops)),
+                             'same_text': sum(a == b for a, b in zip(texts, reference)) / float(len(crops))}))
+    return len(crops), runs
+
+
+def environment():
+    """记录运行环境，对比两次结果时据此判断是否可比"""
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+            'numpy': np.__version__, 'opencv': cv2.__version__}
+
+
+def run_benchmark(paths, config, modes, batch_size=8, warmup=5, repeat=3, workers=2, threads=None):
+    report = {'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'environment': environment(),
+              'config': {k: v for k, v in config.items() if not k.endswith('_model_dir')},
+              'images': len(paths), 'repeat': repeat, 'batch_size': batch_size, 'runs': {}}
+    for mode in modes:
+        if mode == 'workers':
+            report['runs'][mode] = bench_workers(config, paths, batch_size, warmup, repeat, workers, threads)
+        else:
+            report['runs'][mode] = bench_in_process(config, paths, 1 if mode == 'single' else batch_size,
+                                                    warmup, repeat)
+    return report
+
+
+def print_report(report):
+    print('图片 %d 张 x %d 遍，batch %d' % (report['images'], report['repeat'], report['batch_size']))
+    for mode, run in report['runs'].items():
+        steady, latency = run['steady'], run['steady']['latency']
+        rss = '%.0f' % run['peak_rss_mb'] if run['peak_rss_mb'] is not None else '-'
+        if mode == 'workers':
+            extra = '（%d 进程 x %d 线程）' % (run['workers'], run['threads_per_worker'])
+            if run['peak_rss_worker_mb'] is not None:
+                rss += '，子进程 %.0f' % run['peak_rss_worker_mb']
+        else:
+            extra = ''
+        print('\n[%s]%s 启动 %.2fs，预热 %d 张 %.2fs，稳态 %.2f 张/秒，峰值内存 %s MB' % (
+            mode, extra, run['startup_s'], run['warmup']['images'], run['warmup']['elapsed_s'],
+            steady['images_per_sec'], rss))
+        routed = steady.get('rec_light_accepted', 0) + steady.get('rec_fallbacks', 0)
+        if routed:
+            print('  识别级联：%d 张裁剪图，轻量模型采用 %.1f%%' % (routed, 100.0 * steady['rec_light_accepted'] / routed))
+        print('  延迟 ms  p50 %.1f  p95 %.1f  p99 %.1f  max %.1f  （预热阶段 p50 %.1f）' % (
+            latency['p50_ms'], latency['p95_ms'], latency['p99_ms'], latency['max_ms'],
+            run['warmup']['latency'].get('p50_ms', 0.0)))
+        print('  %-22s %12s %10s %10s' % ('阶段', '每张ms', 'p50 ms', 'p95 ms'))
+        for stage, s in steady['stages'].items():
+            print('  %-22s %12.2f %10.2f %10.2f' % (stage, s['per_image_ms'], s.get('p50_ms', 0.0),
+                                                    s.get('p95_ms', 0.0)))
+
+
+def comparable_metrics(run):
+    """参与对比的指标：(名称, 数值, 是否越大越好)"""
+    steady = run['steady']
+    metrics = [('images_per_sec', steady['images_per_sec'], True)]
+    metrics += [('latency.%s' % k, steady['latency'][k], False) for k in ('p50_ms', 'p95_ms', 'p99_ms')]
+    metrics += [('stage.%s' % stage, s['per_image_ms'], False) for stage, s in steady['stages'].items()]
+    if run.get('peak_rss_mb') is not None:
+        metrics.append(('peak_rss_mb', run['peak_rss_mb'], False))
+    return metrics
+
+
+def compare_reports(base, new, threshold=0.1, min_delta_ms=1.0):
+    """对比两次结果中相同模式的指标，变差超过threshold（相对值）的记为回退；
+    毫秒类指标的绝对变化小于min_delta_ms时视为噪声。返回[(模式, 指标, 旧值, 新值, 变化比例, 是否回退), ...]"""
+    rows = []
+    for mode in new['runs']:
+        if mode not in base['runs']:
+            continue
+        old_metrics = {name: value for name, value, _ in comparable_metrics(base['runs'][mode])}
+        for name, value, higher_better in comparable_metrics(new['runs'][mode]):
+            old = old_metrics.get(name)
+            if old is None:
+                continue
+            change = (value - old) / old if old else 0.0
+            worse = -change if higher_better else change
+            regressed = worse > threshold
+            if regressed and (name.startswith('stage.') or name.endswith('_ms')) and abs(value - old) < min_delta_ms:
+                regressed = False
+            rows.append((mode, name, old, value, change, regressed))
+    return rows
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='船牌识别流水线性能基准：分阶段耗时、延迟分位数、吞吐和峰值内存')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='运行基准测试')
+    run.add_argument('inputs', nargs='*', default=[os.path.join(BASE_DIR, 'test')],
+                     help='图片文件、目录或通配符，默认test目录')
+    run.add_argument('-o', '--output', default=None, help='结果写入JSON文件')
+    run.add_argument('--mode', nargs='+', choices=MODES, default=list(MODES),
+                     help='single逐张处理；batched按批处理；workers多进程')
+    run.add_argument('--batch-size', type=int, default=8)
+    run.add_argument('--warmup', type=int, default=5, help='预热图片数，单独统计，不计入稳态结果')
+    run.add_argument('--repeat', type=int, default=3, help='稳态阶段把全部图片跑几遍')
+    run.add_argument('--workers', type=int, default=2, help='workers模式的进程数')
+    run.add_argument('--threads', type=int, default=None, help='推理线程数（workers模式为每个进程的线程数）')
+    run.add_argument('--device', choices=['auto', 'cpu', 'gpu'], default='cpu')
+    run.add_argument('--backend', choices=BACKENDS, default=DEFAULT_CONFIG['backend'])
+    run.add_argument('--onnx-model-dir', default=DEFAULT_CONFIG['onnx_model_dir'])
+    run.add_argument('--precision', choices=['fp32', 'int8'], default=DEFAULT_CONFIG['onnx_precision'])
+    run.add_argument('--mkldnn', action='store_true')
+    run.add_argument('--rec-mode', choices=['all', 'selective'], default=DEFAULT_CONFIG['rec_mode'])
+    run.add_argument('--det-mode', choices=DET_MODES, default=DEFAULT_CONFIG['det_mode'])
+    run.add_argument('--det-postprocess', choices=['paddle', 'fast'], default=DEFAULT_CONFIG['det_postprocess'])
+    run.add_argument('--rec-cascade', action='store_true', help='开启识别级联')
+    run.add_argument('--cascade-score', type=float, default=DEFAULT_CONFIG['rec_cascade_score'])
+    run.add_argument('--rec-light-model-dir', default=DEFAULT_CONFIG['rec_light_model_dir'])
+
+    rec = sub.add_parser('rec', help='对比识别分批方式：同一组长短不一的裁剪图按naive/sorted/bucketed分批识别')
+    rec.add_argument('inputs', nargs='*', default=[os.path.join(BASE_DIR, 'test')], help='从这些图片中截取裁剪图')
+    rec.add_argument('--crops', type=int, default=256, help='裁剪图数量')
+    rec.add_argument('--repeat', type=int, default=3)
+    rec.add_argument('--batch-num', type=int, default=DEFAULT_CONFIG['rec_batch_num'], help='每批张数上限')
+    rec.add_argument('--budget-mb', type=float, default=DEFAULT_CONFIG['rec_batch_budget_mb'],
+                     help='bucketed每批输入张量的内存上限')
+    rec.add_argument('--threads', type=int, default=None)
+    rec.add_argument('--device', choices=['auto', 'cpu', 'gpu'], default='cpu')
+    rec.add_argument('--backend', choices=BACKENDS, default=DEFAULT_CONFIG['backend'])
+    rec.add_argument('--onnx-model-dir', default=DEFAULT_CONFIG['onnx_model_dir'])
+    rec.add_argument('--precision', choices=['fp32', 'int8'], default=DEFAULT_CONFIG['onnx_precision'])
+    rec.add_argument('--mkldnn', action='store_true')
+
+    cascade = sub.add_parser('cascade', help='对比只用完整识别模型与不同阈值下的识别级联：速度、轻量模型采用率、结果一致率')
+    cascade.add_argument('inputs', nargs='*', default=[os.path.join(BASE_DIR, 'test')], help='从这些图片中检测裁剪图')
+    cascade.add_argument('--crops', type=int, default=256, help='裁剪图数量上限')
+    cascade.add_argument('--scores', type=float, nargs='+', default=[0.8, 0.85, 0.9, 0.95],
+                         help='轻量模型结果的采用阈值')
+    cascade.add_argument('--repeat', type=int, default=3)
+    cascade.add_argument('--threads', type=int, default=None)
+    cascade.add_argument('--device', choices=['auto', 'cpu', 'gpu'], default='cpu')
+    cascade.add_argument('--backend', choices=BACKENDS, default=DEFAULT_CONFIG['backend'])
+    cascade.add_argument('--onnx-model-dir', default=DEFAULT_CONFIG['onnx_model_dir'])
+    cascade.add_argument('--precision', choices=['fp32', 'int8'], default=DEFAULT_CONFIG['onnx_precision'])
+    cascade.add_argument('--rec-light-model-dir', default=DEFAULT_CONFIG['rec_light_model_dir'])
+
+    cmp = sub.add_parser('compare', help='对比两次基准结果，指标变差超过阈值时返回非零')
+    cmp.add_argument('base', help='基准结果JSON')
+    cmp.add_argument('new', help='新结果JSON')
+    cmp.add_argument('--threshold', type=float, default=0.1, help='允许的相对变差，默认10%%')
+    cmp.add_argument('--min-delta-ms', type=float, default=1.0, help='毫秒指标的绝对变化小于该值时不算回退')
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        base, new = load_report(args.base), load_report(args.new)
+        if base['environment'] != new['environment'] or base['config'] != new['config']:
+            print('注意：两次结果的运行环境或配置不同，对比仅供参考', file=sys.stderr)
+        rows = compare_reports(base, new, args.threshold, args.min_delta_ms)
+        print('%-8s %-22s %12s %12s %9s' % ('模式', '指标', '基准', '新结果', '变化'))
+        for mode, name, old, value, change, regressed in rows:
+            print('%-8s %-22s %12.2f %12.2f %+8.1f%%%s' % (mode, name, old, value, 100 * change,
+                                                         '  回退' if regressed else ''))
+        regressions = sum(row[-1] for row in rows)
+        print('回退指标: %d' % regressions)
+        return 1 if regressions else 0
+
+    paths = list_images(args.inputs)
+    if not paths:
+        print('没有找到图片', file=sys.stderr)
+        return 1
+
+    if args.command == 'cascade':
+        config = {'device': args.device, 'backend': args.backend, 'onnx_model_dir': args.onnx_model_dir,
+                  'onnx_precision': args.precision, 'rec_light_model_dir': args.rec_light_model_dir}
+        if args.threads:
+            config['cpu_threads'] = args.threads
+        count, runs = bench_cascade(config, paths, args.crops, args.scores, args.repeat)
+        if not count:
+            print('图片中没有检测到文字区域', file=sys.stderr)
+            return 1
+        base = runs[0][1]['crops_per_sec']
+        print('%d 张裁剪图 x %d 遍' % (count, args.repeat))
+        print('%-10s %10s %10s %8s %12s %10s' % ('阈值', '张/秒', 'ms/张', '加速', '轻量采用', '结果一致'))
+        for score, run in runs:
+            print('%-10s %10.1f %10.2f %7.2fx %11.1f%% %9.1f%%' % (
+                '完整模型' if score is None else '%.2f' % score, run['crops_per_sec'], run['ms_per_crop'],
+                run['crops_per_sec'] / base, 100 * run['light_rate'], 100 * run['same_text']))
+        return 0
+
+    if args.command == 'rec':
+        config = {'device': args.device, 'backend': args.backend, 'onnx_model_dir': args.onnx_model_dir,
+                  'onnx_precision': args.precision, 'enable_mkldnn': args.mkldnn,
+                  'rec_batch_num': args.batch_num, 'rec_batch_budget_mb': args.budget_mb}
+        if args.threads:
+            config['cpu_threads'] = args.threads
+        runs = bench_rec(config, sample_crops(paths, args.crops), REC_BATCHING[::-1], args.repeat)
+        base = runs['naive']['crops_per_sec']
+        print('%d 张裁剪图 x %d 遍' % (args.crops, args.repeat))
+        print('%-10s %10s %8s %8s %10s %8s %10s' % ('分批', '张/秒', '加速', '批数', '最大批', '补零效率', '结果一致'))
+        for mode, run in runs.items():
+            print('%-10s %10.1f %7.2fx %8d %10d %9.0f%% %9.1f%%' % (
+                mode, run['crops_per_sec'], run['crops_per_sec'] / base, run['batches'], run['max_batch'],
+                100 * run['padding_efficiency'], 100 * run['same_text']))
+        return 0
+
+    config = {
+        'device': args.device,
+        'backend': args.backend,
+        'onnx_model_dir': args.onnx_model_dir,
+        'onnx_precision': args.precision,
+        'enable_mkldnn': args.mkldnn,
+        'rec_mode': args.rec_mode,
+        'det_mode': args.det_mode,
+        'det_postprocess': args.det_postprocess,
+        'rec_cascade': args.rec_cascade,
+        'rec_cascade_score': args.cascade_score,
+        'rec_light_model_dir': args.rec_light_model_dir,
+    }
+    if args.threads:
+        config['cpu_threads'] = args.threads
+    report = run_benchmark(paths, config, args.mode, args.batch_size, args.warmup, args.repeat,
+                           args.workers, args.threads)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
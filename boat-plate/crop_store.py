@@ -0,0 +1,145 @@
+import os
+import sys
+import hashlib
+import argparse
+import tempfile
+
+import cv2
+import numpy as np
+
+from ocr_engine import decode_image, read_file
+from recognition_store import DEFAULT_DB_PATH, connect, init_schema
+
+# 裁剪图编码格式：png无损，重新识别时与原裁剪图完全一致；webp有损但约小5倍，适合只做人工复核
+CROP_FORMATS = {
+    'png': ('.png', [cv2.IMWRITE_PNG_COMPRESSION, 3]),
+    'webp': ('.webp', [cv2.IMWRITE_WEBP_QUALITY, 90]),
+}
+
+
+def crop_dir_for(db_path):
+    """识别记录库对应的裁剪图目录，与库文件放在一起，如 ship_recognition_data_crops/"""
+    return os.path.splitext(db_path)[0] + '_crops'
+
+
+def crop_key(img):
+    """裁剪图像素内容的哈希，尺寸一并计入，相同的裁剪图只保存一份"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(img.shape).encode('ascii'))
+    h.update(np.ascontiguousarray(img).data)
+    return h.hexdigest()
+
+
+class CropStore:
+    """按内容寻址的裁剪图目录：文件名为像素哈希加扩展名（即记录中的crop_ref），
+    按哈希前两级分目录存放，避免单个目录下文件过多。写入先写临时文件再改名，
+    多个进程同时写同一个目录也是安全的"""
+
+    def __init__(self, root, fmt='png'):
+        if fmt not in CROP_FORMATS:
+            raise ValueError('未知的裁剪图格式: %s' % fmt)
+        self.root = root
+        self.ext, self.params = CROP_FORMATS[fmt]
+        self.written = 0
+        self.deduplicated = 0
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, ref):
+        return os.path.join(self.root, ref[:2], ref[2:4], ref)
+
+    def exists(self, ref):
+        return bool(ref) and os.path.isfile(self.path(ref))
+
+    def put(self, img):
+        """保存裁剪图，返回引用；已有相同内容时直接返回，空图返回None"""
+        if img is None or img.size == 0:
+            return None
+        ref = crop_key(img) + self.ext
+        path = self.path(ref)
+        if os.path.isfile(path):
+            self.deduplicated += 1
+            return ref
+        ok, buf = cv2.imencode(self.ext, img, self.params)
+        if not ok:
+            raise ValueError('裁剪图编码失败')
+        shard = os.path.dirname(path)
+        os.makedirs(shard, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=shard, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(buf.tobytes())
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.written += 1
+        return ref
+
+    def get(self, ref):
+        """读出裁剪图（BGR），不存在返回None"""
+        return decode_image(read_file(self.path(ref))) if ref else None
+
+    def refs(self):
+        """遍历目录中的全部引用"""
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith('.tmp'):
+                    yield name
+
+    def stats(self):
+        """返回(文件数, 总字节数)"""
+        count = size = 0
+        for ref in self.refs():
+            count += 1
+            size += os.path.getsize(self.path(ref))
+        return count, size
+
+    def gc(self, referenced):
+        """删除不在referenced集合中的裁剪图，返回(删除数, 释放字节数)。
+        刚写入、记录还没提交的裁剪图也会被删掉，应在没有程序写库时运行"""
+        removed = freed = 0
+        for ref in list(self.refs()):
+            if ref not in referenced:
+                path = self.path(ref)
+                freed += os.path.getsize(path)
+                os.unlink(path)
+                removed += 1
+        return removed, freed
+
+
+def referenced_crops(db_path):
+    """识别记录库中引用到的裁剪图集合"""
+    conn = connect(db_path)
+    init_schema(conn)
+    refs = {ref for (ref,) in conn.execute('SELECT DISTINCT crop_ref FROM recognitions WHERE crop_ref IS NOT NULL')}
+    conn.close()
+    return refs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='识别记录的裁剪图目录：统计、检查缺失、清理无引用的文件')
+    parser.add_argument('command', choices=['stats', 'check', 'gc'],
+                        help='stats：文件数和占用；check：库中引用但缺失的裁剪图；gc：删除库中没有引用的裁剪图')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='识别记录库路径')
+    parser.add_argument('--crop-dir', default=None, help='裁剪图目录，默认为库文件旁的 <库名>_crops')
+    args = parser.parse_args(argv)
+
+    store = CropStore(args.crop_dir or crop_dir_for(args.db))
+    if args.command == 'stats':
+        count, size = store.stats()
+        print('%d 张裁剪图，%.1f MB，平均 %.1f KB' % (count, size / 1e6, size / 1e3 / count if count else 0.0))
+        return 0
+    referenced = referenced_crops(args.db)
+    if args.command == 'check':
+        missing = sorted(ref for ref in referenced if not store.exists(ref))
+        for ref in missing:
+            print(ref)
+        print('库中引用 %d 张裁剪图，缺失 %d 张' % (len(referenced), len(missing)), file=sys.stderr)
+        return 1 if missing else 0
+    removed, freed = store.gc(referenced)
+    print('删除 %d 张无引用的裁剪图，释放 %.1f MB' % (removed, freed / 1e6))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
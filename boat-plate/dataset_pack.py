@@ -0,0 +1,383 @@
+import os
+import sys
+import json
+import time
+import random
+import struct
+import argparse
+import tempfile
+import concurrent.futures
+
+import cv2
+import numpy as np
+
+from ocr_engine import load_image
+from 增强 import TASKS, parse_label_line
+
+# 训练数据打包文件：把标注文件中的图片预先解码（可同时缩小）成BGR像素，连同标注写进一个文件，
+# 训练时用内存映射按下标随机读取，每个epoch不再重复解码JPEG、打开大量小文件。
+# 文件布局：各样本像素依次存放（每个按64字节对齐）→ 标注 → 索引数组 → 元数据JSON → 24字节文件尾
+PACK_MAGIC = b'SHIPPACK'
+PACK_VERSION = 1
+FOOTER = struct.Struct('<8sIQI')  # 魔数, 版本, 元数据偏移, 元数据长度
+ALIGN = 64
+
+# 每个样本一条：像素偏移、高、宽、通道数、标注偏移、标注长度
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('height', '<u4'), ('width', '<u4'), ('channels', '<u4'),
+                        ('label_offset', '<u8'), ('label_size', '<u4')])
+
+
+def resize_sample(img, label, task, max_side=0, height=0):
+    """打包前缩小：det按长边不超过max_side等比缩小，检测框坐标同比缩放；rec按高度缩放到height。
+    为0或图片已经够小时不缩放。label为parse_label_line解析出的标注（det为检测框列表，rec为文本），
+    返回(图片, 标注)"""
+    h, w = img.shape[:2]
+    if task == 'det' and max_side and max(h, w) > max_side:
+        scale = max_side / float(max(h, w))
+        img = cv2.resize(img, (max(1, int(round(w * scale))), max(1, int(round(h * scale)))),
+                         interpolation=cv2.INTER_AREA)
+        label = [dict(item, points=[[int(round(x * scale)), int(round(y * scale))] for x, y in item['points']])
+                 for item in label]
+    elif task == 'rec' and height and h > height:
+        img = cv2.resize(img, (max(1, int(round(w * height / float(h)))), height), interpolation=cv2.INTER_AREA)
+    return img, label
+
+
+def pack(label_file, output, task='det', data_dir=None, max_side=1280, height=64, threads=None, chunk=64):
+    """把标注文件中的样本打包成一个文件，返回(写入样本数, 跳过的样本数, 文件字节数, 耗时秒)，
+    图片读不出或标注行无法解析的样本跳过并计数，不中断打包。
+    标注文件逐行读取，每次chunk行用线程池并行解码（cv2解码时释放GIL），写完后原子替换output"""
+    data_dir = data_dir or os.path.dirname(os.path.abspath(label_file))
+    start = time.perf_counter()
+    index, labels = [], []
+    missing = label_size = 0
+
+    def load(sample):
+        path, label = sample
+        img = load_image(os.path.join(data_dir, path))
+        if img is None:
+            return path, None, None
+        img, label = resize_sample(img, label, task, max_side, height)
+        if task == 'det':
+            label = json.dumps(label, ensure_ascii=False)
+        return path, np.ascontiguousarray(img), label
+
+    def samples():
+        nonlocal missing
+        with open(label_file, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    sample = parse_label_line(line, task)
+                except ValueError:  # det标注不是合法JSON
+                    missing += 1
+                    print('标注行无法解析（第%d行）: %s' % (number, line.rstrip('\r\n')), file=sys.stderr)
+                    continue
+                if sample is not None:
+                    yield sample
+
+    out_dir = os.path.dirname(os.path.abspath(output))
+    fd, tmp = tempfile.mkstemp(dir=out_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f, concurrent.futures.ThreadPoolExecutor(threads) as executor:
+            pending = []
+            for sample in samples():
+                pending.append(sample)
+                if len(pending) < chunk:
+                    continue
+                missing += _write_chunk(f, executor.map(load, pending), index, labels)
+                pending = []
+            missing += _write_chunk(f, executor.map(load, pending), index, labels)
+
+            # 标注与源图片路径一起存成JSON，随机读取时按偏移切出一条解析
+            table = np.zeros(len(index), dtype=INDEX_DTYPE)
+            label_base = f.tell()
+            for k, ((offset, h, w, c), text) in enumerate(zip(index, labels)):
+                data = text.encode('utf-8')
+                table[k] = (offset, h, w, c, label_base + label_size, len(data))
+                f.write(data)
+                label_size += len(data)
+            _align(f)
+            index_offset = f.tell()
+            f.write(table.tobytes())
+            meta = json.dumps({'task': task, 'count': len(index), 'index_offset': index_offset,
+                               'source': os.path.abspath(label_file), 'max_side': max_side if task == 'det' else 0,
+                               'height': height if task == 'rec' else 0,
+                               'created': time.strftime('%Y-%m-%d %H:%M:%S')}, ensure_ascii=False).encode('utf-8')
+            meta_offset = f.tell()
+            f.write(meta)
+            f.write(FOOTER.pack(PACK_MAGIC, PACK_VERSION, meta_offset, len(meta)))
+        os.replace(tmp, output)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return len(index), missing, os.path.getsize(output), time.perf_counter() - start
+
+
+def _align(f):
+    f.write(b'\0' * (-f.tell() % ALIGN))
+
+
+def _write_chunk(f, samples, index, labels):
+    """把一批解码好的样本写入文件，返回其中读不出的图片数"""
+    missing = 0
+    for path, img, label in samples:
+        if img is None:
+            missing += 1
+            print('无法读取图片: %s' % path, file=sys.stderr)
+            continue
+        _align(f)
+        if img.ndim == 2:
+            img = img[:, :, np.newaxis]
+        index.append((f.tell(), img.shape[0], img.shape[1], img.shape[2]))
+        labels.append(json.dumps([path, label], ensure_ascii=False))
+        f.write(img.data)
+    return missing
+
+
+class PackedDataset:
+    """打包文件的随机读取：整个文件内存映射，ds[i]返回(BGR图片, 标注字符串)，图片是映射内存上的
+    只读视图，不拷贝；需要原地修改时先np.array()复制。多个进程打开同一个文件共享操作系统的页缓存。
+    分布式训练时每个进程用shard_id/num_shards只取自己那一份（下标按num_shards取模分配，各份张数至多差1）"""
+
+    def __init__(self, path, shard_id=0, num_shards=1):
+        if not 0 <= shard_id < num_shards:
+            raise ValueError('分片号应在0到%d之间: %s' % (num_shards - 1, shard_id))
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        if len(self.data) < FOOTER.size:
+            raise ValueError('不是训练数据打包文件: %s' % path)
+        magic, version, meta_offset, meta_size = FOOTER.unpack(self.data[-FOOTER.size:].tobytes())
+        if magic != PACK_MAGIC:
+            raise ValueError('不是训练数据打包文件: %s' % path)
+        if version != PACK_VERSION:
+            raise ValueError('打包文件版本 %d 不受支持，请重新打包: %s' % (version, path))
+        self.meta = json.loads(self.data[meta_offset:meta_offset + meta_size].tobytes().decode('utf-8'))
+        self.task = self.meta['task']
+        offset = self.meta['index_offset']
+        self.index = self.data[offset:offset + self.meta['count'] * INDEX_DTYPE.itemsize].view(INDEX_DTYPE)
+        self.indices = np.arange(shard_id, self.meta['count'], num_shards)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def record(self, i):
+        """第i个样本（分片内下标）的(源图片路径, 标注字符串)"""
+        entry = self.index[self.indices[i]]
+        start = int(entry['label_offset'])
+        return tuple(json.loads(self.data[start:start + int(entry['label_size'])].tobytes().decode('utf-8')))
+
+    def image(self, i):
+        entry = self.index[self.indices[i]]
+        h, w, c = int(entry['height']), int(entry['width']), int(entry['channels'])
+        start = int(entry['offset'])
+        img = self.data[start:start + h * w * c].reshape(h, w, c)
+        return img[:, :, 0] if c == 1 else img
+
+    def __getitem__(self, i):
+        return self.image(i), self.record(i)[1]
+
+    def aspect_ratios(self):
+        """全部样本（分片内）的宽高比，用于按宽高比分组采样"""
+        entries = self.index[self.indices]
+        return entries['width'] / entries['height'].astype(np.float64)
+
+
+def _ppocr_transforms():
+    """PaddleOCR训练代码中的数据变换函数：在PaddleOCR仓库中训练时为ppocr，pip安装的paddleocr包中为paddleocr.ppocr"""
+    try:
+        from ppocr.data.imaug import transform, create_operators
+    except ImportError:
+        from paddleocr.ppocr.data.imaug import transform, create_operators
+    return transform, create_operators
+
+
+class PackedDataSet:
+    """PaddleOCR训练用的数据集，接口与SimpleDataSet/MultiScaleDataSet相同：配置中的dataset
+    把name改成PackedDataSet、用pack_file代替data_dir和label_file_list，transforms不必修改。
+    图片已经解码，transforms中的DecodeImage跳过（img_mode为RGB时改为在这里转换）；
+    配合MultiScaleSampler时下标为(宽, 高, 下标[, 宽高比])，与MultiScaleDataSet相同。
+    需要在PaddleOCR的ppocr/data/__init__.py中导入本类并加入support_dict。
+    paddle.io.DataLoader只要求按下标取样本，不必继承paddle.io.Dataset，打包和读取打包文件也就不需要paddle"""
+
+    def __init__(self, config, mode, logger, seed=None):
+        self._transform, create_operators = _ppocr_transforms()
+        self.logger = logger
+        self.mode = mode.lower()
+        dataset_config = config[mode]['dataset']
+        loader_config = config[mode]['loader']
+        self.pack = PackedDataset(dataset_config['pack_file'])
+        self.seed = seed
+        self.do_shuffle = loader_config['shuffle']
+        self.data_idx_order_list = list(range(len(self.pack)))
+        if self.mode == 'train' and self.do_shuffle:
+            random.seed(seed)
+            random.shuffle(self.data_idx_order_list)
+
+        transforms, self.to_rgb = [], False
+        ext_op_transform_idx = dataset_config.get('ext_op_transform_idx', 2)
+        for k, op in enumerate(dataset_config['transforms']):
+            name = list(op)[0]
+            if name != 'DecodeImage':
+                transforms.append(op)
+                continue
+            params = op[name] or {}
+            if params.get('channel_first'):
+                raise ValueError('PackedDataSet不支持channel_first的DecodeImage')
+            self.to_rgb = params.get('img_mode', 'BGR') == 'RGB'
+            if k < ext_op_transform_idx:
+                ext_op_transform_idx -= 1
+        self.ops = create_operators(transforms, config['Global'])
+        self.ext_op_transform_idx = ext_op_transform_idx
+        self.need_reset = False
+
+        self.ds_width = dataset_config.get('ds_width', False)
+        if self.ds_width:
+            self.wh_ratio = self.pack.aspect_ratios()
+            self.wh_ratio_sort = np.argsort(self.wh_ratio)
+        logger.info('打包文件 %s：%d 个样本' % (dataset_config['pack_file'], len(self.pack)))
+
+    def _load(self, file_idx):
+        """读出一个样本，组成与SimpleDataSet解码后相同的数据字典；图片复制一份，变换可以原地修改"""
+        img, label = self.pack[file_idx]
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB) if self.to_rgb else np.array(img)
+        return {'img_path': self.pack.record(file_idx)[0], 'label': label, 'image': img}
+
+    def get_ext_data(self):
+        ext_data_num = 0
+        for op in self.ops:
+            if hasattr(op, 'ext_data_num'):
+                ext_data_num = getattr(op, 'ext_data_num')
+                break
+        load_data_ops = self.ops[:self.ext_op_transform_idx]
+        ext_data = []
+        while len(ext_data) < ext_data_num:
+            data = self._transform(self._load(self.data_idx_order_list[np.random.randint(len(self))]),
+                                   load_data_ops)
+            if data is None:
+                continue
+            if 'polys' in data and data['polys'].shape[1] != 4:
+                continue
+            ext_data.append(data)
+        return ext_data
+
+    def resize_norm_img(self, data, img_w, img_h):
+        """同MultiScaleDataSet.resize_norm_img：高缩放到img_h，宽按比例不超过img_w，归一化后右侧补零"""
+        img = data['image']
+        h, w = img.shape[:2]
+        resized_w = min(img_w, int(np.ceil(img_h * w / float(h))))
+        resized = cv2.resize(img, (resized_w, img_h)).astype(np.float32).transpose((2, 0, 1)) / 255
+        resized -= 0.5
+        resized /= 0.5
+        padded = np.zeros((3, img_h, img_w), dtype=np.float32)
+        padded[:, :, :resized_w] = resized
+        data['image'] = padded
+        data['valid_ratio'] = min(1.0, float(resized_w / img_w))
+        return data
+
+    def __getitem__(self, properties):
+        if isinstance(properties, (list, tuple)):
+            return self._get_multi_scale(properties)
+        idx = properties
+        outs = None
+        try:
+            data = self._load(self.data_idx_order_list[idx])
+            data['ext_data'] = self.get_ext_data()
+            outs = self._transform(data, self.ops)
+        except Exception as e:
+            self.logger.error('样本 %d 处理失败: %s' % (idx, e))
+        if outs is None:
+            # 评估时顺序取下一个，训练时随机换一个，同SimpleDataSet
+            rnd_idx = np.random.randint(len(self)) if self.mode == 'train' else (idx + 1) % len(self)
+            return self.__getitem__(rnd_idx)
+        return outs
+
+    def _get_multi_scale(self, properties):
+        img_h, idx = properties[1], properties[2]
+        wh_ratio = properties[3] if self.ds_width and len(properties) > 3 else None
+        if wh_ratio is not None:
+            img_w = img_h * max(1, int(round(wh_ratio)))
+            file_idx = self.wh_ratio_sort[idx]
+        else:
+            img_w = properties[0]
+            file_idx = self.data_idx_order_list[idx]
+        outs = None
+        try:
+            data = self._load(file_idx)
+            data['ext_data'] = self.get_ext_data()
+            outs = self._transform(data, self.ops[:-1])
+            if outs is not None:
+                outs = self._transform(self.resize_norm_img(outs, img_w, img_h), self.ops[-1:])
+        except Exception as e:
+            self.logger.error('样本 %d 处理失败: %s' % (file_idx, e))
+        if outs is None:
+            return self._get_multi_scale([img_w, img_h, (idx + 1) % len(self), wh_ratio])
+        return outs
+
+    def __len__(self):
+        return len(self.data_idx_order_list)
+
+
+def bench(path, count=2000, seed=0):
+    """随机读取count个样本，对比从打包文件读取与从源图片文件解码的每秒张数，
+    返回(打包文件张/秒, 源图片张/秒)；源图片路径取自打包时的标注文件"""
+    ds = PackedDataset(path)
+    rng = np.random.RandomState(seed)
+    picks = rng.randint(len(ds), size=count)
+    t0 = time.perf_counter()
+    for i in picks:
+        img, label = ds[i]
+        np.array(img)  # 训练时变换会修改图片，计入复制的开销
+    packed = count / (time.perf_counter() - t0)
+    data_dir = os.path.dirname(ds.meta['source'])
+    t0 = time.perf_counter()
+    for i in picks:
+        load_image(os.path.join(data_dir, ds.record(i)[0]))
+    source = count / (time.perf_counter() - t0)
+    return packed, source
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='训练数据打包：预先解码成一个可内存映射、按下标随机读取的文件')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    pk = sub.add_parser('pack', help='把标注文件中的样本打包')
+    pk.add_argument('label_file', help='PaddleOCR标注文件，每行 图片路径\\t标注')
+    pk.add_argument('output', help='输出的打包文件，如 datasets/train_det.pack')
+    pk.add_argument('--task', choices=TASKS, default='det')
+    pk.add_argument('--data-dir', default=None, help='标注中图片路径的根目录，默认为标注文件所在目录')
+    pk.add_argument('--max-side', type=int, default=1280,
+                    help='det：长边超过该值的图片等比缩小（检测框同比缩放），0为不缩放')
+    pk.add_argument('--height', type=int, default=64,
+                    help='rec：高度超过该值的裁剪图缩放到该高度（多尺度训练最高64），0为不缩放')
+    pk.add_argument('--threads', type=int, default=None, help='解码线程数')
+
+    info = sub.add_parser('info', help='显示打包文件的样本数、尺寸和来源')
+    info.add_argument('pack_file')
+
+    bench_parser = sub.add_parser('bench', help='随机读取速度：打包文件 vs 从源图片解码')
+    bench_parser.add_argument('pack_file')
+    bench_parser.add_argument('--count', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    if args.command == 'pack':
+        count, missing, size, elapsed = pack(args.label_file, args.output, args.task, args.data_dir,
+                                             args.max_side, args.height, args.threads)
+        print('打包 %d 个样本，%.1f MB，耗时 %.1fs；%d 个样本的图片无法读取或标注行无法解析，已跳过' % (
+            count, size / 1e6, elapsed, missing))
+        return 1 if missing else 0
+    if args.command == 'info':
+        ds = PackedDataset(args.pack_file)
+        entries = ds.index
+        print(json.dumps(ds.meta, ensure_ascii=False, indent=2))
+        if len(entries):
+            print('样本 %d 个，高 %d~%d，宽 %d~%d，%.1f MB' % (
+                len(entries), entries['height'].min(), entries['height'].max(), entries['width'].min(),
+                entries['width'].max(), os.path.getsize(args.pack_file) / 1e6))
+        return 0
+    packed, source = bench(args.pack_file, args.count)
+    print('随机读取：打包文件 %.0f 张/秒，源图片解码 %.0f 张/秒，%.1f 倍' % (packed, source, packed / source))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
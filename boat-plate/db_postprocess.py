@@ -0,0 +1,256 @@
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+
+def order_rect_corners(corners):
+    """与DBPostProcess.get_mini_boxes相同的角点排序，corners形状(N, 4, 2)"""
+    n = len(corners)
+    # 先按x坐标稳定排序，再在左右两对中按y区分上下
+    pts = np.take_along_axis(corners, np.argsort(corners[:, :, 0], axis=1, kind='stable')[:, :, None], axis=1)
+    left_swap = pts[:, 1, 1] <= pts[:, 0, 1]
+    right_swap = pts[:, 3, 1] <= pts[:, 2, 1]
+    rows = np.arange(n)
+    i1 = np.where(left_swap, 1, 0)
+    i4 = 1 - i1
+    i2 = np.where(right_swap, 3, 2)
+    i3 = 5 - i2
+    return np.stack([pts[rows, i1], pts[rows, i2], pts[rows, i3], pts[rows, i4]], axis=1)
+
+
+def rect_corners(centers, sizes, angles):
+    """批量计算旋转矩形的四个角点，与cv2.boxPoints一样用单精度计算，保证取整结果一致"""
+    theta = np.deg2rad(angles.astype(np.float64))
+    b = np.cos(theta).astype(np.float32) * np.float32(0.5)
+    a = np.sin(theta).astype(np.float32) * np.float32(0.5)
+    centers = centers.astype(np.float32)
+    w, h = sizes[:, 0].astype(np.float32), sizes[:, 1].astype(np.float32)
+    cx, cy = centers[:, 0], centers[:, 1]
+    p0 = np.stack([cx - a * h - b * w, cy + b * h - a * w], axis=1)
+    p1 = np.stack([cx + a * h - b * w, cy - b * h - a * w], axis=1)
+    p2 = np.float32(2) * centers - p0
+    p3 = np.float32(2) * centers - p1
+    return np.stack([p0, p1, p2, p3], axis=1)
+
+
+def quad_row_spans(quads, height, width):
+    """按cv2.fillPoly的规则求每个四边形逐行覆盖的像素区间，返回(所属框, 行号, 起始列, 结束列)。
+    fillPoly先用8连通直线画出各条边（从左端点画起，取整遇到0.5时偏向左端点一侧），
+    再按四舍五入填充内部，这里对所有框的所有行一次性算出同样的结果"""
+    n = len(quads)
+    ymin = np.clip(quads[:, :, 1].min(axis=1), 0, height - 1).astype(np.int64)
+    ymax = np.clip(quads[:, :, 1].max(axis=1), 0, height - 1).astype(np.int64)
+    heights = ymax - ymin + 1
+    owner = np.repeat(np.arange(n), heights)
+    ys = np.arange(heights.sum()) - np.repeat(np.cumsum(heights) - heights, heights) + ymin[owner]
+
+    # 每条边以左端点为a、右端点为b，形状(行数, 4)
+    p = quads[owner]
+    q = np.roll(quads, -1, axis=1)[owner]
+    swap = (q[:, :, 0] < p[:, :, 0]) | ((q[:, :, 0] == p[:, :, 0]) & (q[:, :, 1] < p[:, :, 1]))
+    ax = np.where(swap, q[:, :, 0], p[:, :, 0])
+    ay = np.where(swap, q[:, :, 1], p[:, :, 1])
+    bx = np.where(swap, p[:, :, 0], q[:, :, 0])
+    by = np.where(swap, p[:, :, 1], q[:, :, 1])
+    dx = bx - ax
+    dy = by - ay
+    y = ys[:, None].astype(np.float64)
+    in_rows = (np.minimum(ay, by) <= y) & (y <= np.maximum(ay, by))
+    dy_safe = np.where(dy == 0, 1, dy)
+
+    # 缓边：该行内直线上取整后落在本行的连续一段像素
+    shallow = np.abs(dx) > np.abs(dy)
+    x_up = ax + (2 * (y - ay) - 1) * dx / (2 * dy_safe)
+    x_down = ax + (2 * (y - ay) + 1) * dx / (2 * dy_safe)
+    flat_lo = np.where(dy == 0, ax, np.maximum(np.floor(np.minimum(x_up, x_down)) + 1, ax))
+    flat_hi = np.where(dy == 0, bx, np.minimum(np.floor(np.maximum(x_up, x_down)), bx))
+    flat_ok = shallow & (np.where(dy == 0, ay == y, flat_lo <= flat_hi))
+    # 陡边：每行一个像素
+    steep_x = np.ceil(ax + (y - ay) * dx / dy_safe - 0.5)
+    steep_ok = ~shallow & in_rows
+    line_lo = np.where(flat_ok, flat_lo, np.where(steep_ok, steep_x, np.inf)).min(axis=1)
+    line_hi = np.where(flat_ok, flat_hi, np.where(steep_ok, steep_x, -np.inf)).max(axis=1)
+
+    # 内部填充：各边在该行的交点四舍五入
+    cross = (dy != 0) & in_rows
+    x_at = ax + (y - ay) * dx / dy_safe
+    fill_lo = np.floor(np.where(cross, x_at, np.inf).min(axis=1) + 0.5)
+    fill_hi = np.ceil(np.where(cross, x_at, -np.inf).max(axis=1) - 0.5)
+
+    x_left = np.clip(np.minimum(line_lo, fill_lo), 0, width - 1)
+    x_right = np.clip(np.maximum(line_hi, fill_hi), -1, width - 1)
+    valid = np.isfinite(x_left) & np.isfinite(x_right) & (x_left <= x_right)
+    xl = np.where(valid, x_left, 0).astype(np.int64)
+    xr = np.where(valid, x_right, -1).astype(np.int64)
+    return owner, ys, xl, xr
+
+
+def box_score_masked(pred, quad):
+    """单个框的掩码均值，与DBPostProcess.box_score_fast相同"""
+    h, w = pred.shape
+    xmin = int(np.clip(np.floor(quad[:, 0].min()), 0, w - 1))
+    xmax = int(np.clip(np.ceil(quad[:, 0].max()), 0, w - 1))
+    ymin = int(np.clip(np.floor(quad[:, 1].min()), 0, h - 1))
+    ymax = int(np.clip(np.ceil(quad[:, 1].max()), 0, h - 1))
+    mask = np.zeros((ymax - ymin + 1, xmax - xmin + 1), dtype=np.uint8)
+    cv2.fillPoly(mask, (quad - (xmin, ymin)).reshape(1, -1, 2).astype(np.int32), 1)
+    return cv2.mean(pred[ymin:ymax + 1, xmin:xmax + 1], mask)[0]
+
+
+def quad_mean_scores(pred, quads):
+    """批量计算每个四边形内概率图的均值（同DBPostProcess.box_score_fast），
+    用按行累加和一次性求和，代替逐个框画掩码再求均值。
+    超出图像边界的框在fillPoly中会被裁剪，画线结果不同，这类少数框仍逐个画掩码"""
+    h, w = pred.shape
+    n = len(quads)
+    scores = np.zeros(n, dtype=np.float32)
+    if n == 0:
+        return scores
+    inside = ((quads[:, :, 0].min(axis=1) >= 0) & (np.ceil(quads[:, :, 0].max(axis=1)) <= w - 1)
+              & (quads[:, :, 1].min(axis=1) >= 0) & (np.ceil(quads[:, :, 1].max(axis=1)) <= h - 1))
+    for i in np.flatnonzero(~inside):
+        scores[i] = box_score_masked(pred, quads[i])
+    idx = np.flatnonzero(inside)
+    if len(idx) == 0:
+        return scores
+
+    integral = cv2.integral(pred.astype(np.float32, copy=False), sdepth=cv2.CV_64F)
+    # 与box_score_fast相同，顶点相对外接框左上角截断取整
+    inner = quads[idx]
+    origin = np.floor(inner.min(axis=1)).astype(np.float32)
+    inner = (np.trunc(inner - origin[:, None, :]) + origin[:, None, :]).astype(np.float64)
+
+    owner, ys, xl, xr = quad_row_spans(inner, h, w)
+    counts = xr - xl + 1
+    sums = (integral[ys + 1, xr + 1] - integral[ys + 1, xl]) - (integral[ys, xr + 1] - integral[ys, xl])
+    total = np.bincount(owner, weights=sums, minlength=len(idx))
+    pixels = np.bincount(owner, weights=counts, minlength=len(idx))
+    scores[idx] = total / np.maximum(pixels, 1)
+    return scores
+
+
+class FastDBPostProcess:
+    """向量化的DB后处理，可直接替换PaddleOCR的DBPostProcess（quad框）。
+    轮廓提取仍用cv2.findContours以保证候选框与原实现一致；框打分、
+    外扩(unclip)和缩放全部按批用NumPy完成，去掉了逐个轮廓的Python循环。
+    原实现对最小外接矩形做圆角外扩后再取最小外接矩形，结果就是每边向外平移
+    distance的矩形，因此这里直接解析计算，不再调用shapely和pyclipper；
+    与原实现的差别仅来自pyclipper的整数取整，框角点偏差在1~2个像素内"""
+
+    def __init__(self, thresh=0.3, box_thresh=0.7, max_candidates=1000, unclip_ratio=2.0,
+                 use_dilation=False, **kwargs):
+        self.thresh = thresh
+        self.box_thresh = box_thresh
+        self.max_candidates = max_candidates
+        self.unclip_ratio = unclip_ratio
+        self.min_size = 3
+        self.dilation_kernel = None if not use_dilation else np.array([[1, 1], [1, 1]])
+
+    def boxes_from_bitmap(self, pred, bitmap, dest_width, dest_height):
+        """与DBPostProcess.boxes_from_bitmap的输入输出相同，返回(int32框数组, 分数列表)"""
+        height, width = bitmap.shape
+        bitmap = bitmap.view(np.uint8) if bitmap.dtype == np.bool_ else bitmap.astype(np.uint8, copy=False)
+        contours, _ = cv2.findContours(bitmap, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        contours = contours[:self.max_candidates]
+        if not contours:
+            return np.zeros((0, 4, 2), dtype=np.int32), []
+
+        # 外接正矩形面积小于min_size**2的轮廓，最小外接矩形的短边必然小于min_size，批量先去掉
+        points = np.concatenate(contours).reshape(-1, 2)
+        starts = np.cumsum([0] + [len(c) for c in contours[:-1]])
+        extent = np.maximum.reduceat(points, starts) - np.minimum.reduceat(points, starts)
+        candidates = np.flatnonzero(extent[:, 0] * extent[:, 1] >= self.min_size ** 2)
+        if len(candidates) == 0:
+            return np.zeros((0, 4, 2), dtype=np.int32), []
+
+        rects = [cv2.minAreaRect(contours[i]) for i in candidates]
+        centers = np.array([r[0] for r in rects], dtype=np.float32)
+        sizes = np.array([r[1] for r in rects], dtype=np.float32)
+        angles = np.array([r[2] for r in rects], dtype=np.float32)
+
+        keep = sizes.min(axis=1) >= self.min_size
+        corners = order_rect_corners(rect_corners(centers[keep], sizes[keep], angles[keep]))
+        centers, sizes, angles = centers[keep], sizes[keep], angles[keep]
+
+        scores = quad_mean_scores(pred, corners)
+        keep = scores >= self.box_thresh
+        centers, sizes, angles, scores = centers[keep], sizes[keep], angles[keep], scores[keep]
+
+        # 外扩距离 = 面积 * unclip_ratio / 周长，矩形四边各向外平移该距离
+        distance = sizes[:, 0] * sizes[:, 1] * self.unclip_ratio / (2 * (sizes[:, 0] + sizes[:, 1]))
+        expanded = sizes + 2 * distance[:, None]
+        keep = expanded.min(axis=1) >= self.min_size + 2
+        boxes = order_rect_corners(rect_corners(centers[keep], expanded[keep], angles[keep]))
+        scores = scores[keep]
+
+        boxes[:, :, 0] = np.clip(np.round(boxes[:, :, 0] / width * dest_width), 0, dest_width)
+        boxes[:, :, 1] = np.clip(np.round(boxes[:, :, 1] / height * dest_height), 0, dest_height)
+        return boxes.astype(np.int32), [float(s) for s in scores]
+
+
+def corner_distance(box_a, box_b):
+    """两个四边形对应角点的最大偏差，起始角点不同时取各种轮换中的最小值"""
+    box_a = np.asarray(box_a, dtype=np.float32)
+    box_b = np.asarray(box_b, dtype=np.float32)
+    return min(float(np.abs(box_a - np.roll(box_b, k, axis=0)).max()) for k in range(4))
+
+
+def compare_boxes(reference, candidate):
+    """两组框按角点偏差一一匹配，返回(最大角点偏差, 未匹配的框数)"""
+    unmatched = list(range(len(candidate)))
+    worst, missing = 0.0, 0
+    for box in reference:
+        if not unmatched:
+            missing += 1
+            continue
+        dist, best = min((corner_distance(box, candidate[k]), k) for k in unmatched)
+        unmatched.remove(best)
+        worst = max(worst, dist)
+    return worst, missing + len(unmatched)
+
+
+def main(argv=None):
+    """用检测模型的真实概率图对比两种后处理的输出和耗时"""
+    from ocr_engine import ShipPlateEngine, DEFAULT_CONFIG, list_images, load_image
+    parser = argparse.ArgumentParser(description='对比PaddleOCR的DBPostProcess与FastDBPostProcess')
+    parser.add_argument('inputs', nargs='+', help='图片文件、目录或通配符')
+    parser.add_argument('--tolerance', type=float, default=2.0, help='允许的角点偏差（概率图像素）')
+    parser.add_argument('--device', choices=['auto', 'cpu', 'gpu'], default=DEFAULT_CONFIG['device'])
+    args = parser.parse_args(argv)
+
+    engine = ShipPlateEngine({'device': args.device})
+    paddle_post = engine.ocr.text_detector.postprocess_op
+    fast_post = engine.fast_postprocess
+    failed = 0
+    paddle_time = fast_time = 0.0
+    for path in list_images(args.inputs):
+        img = load_image(path)
+        if img is None:
+            continue
+        tensor, shape = engine.det_preprocess(img)
+        prob_map = engine.det_infer(tensor[np.newaxis])[0, 0]
+        mask = prob_map > paddle_post.thresh
+        src_h, src_w = int(shape[0]), int(shape[1])
+        t0 = time.perf_counter()
+        ref_boxes, _ = paddle_post.boxes_from_bitmap(prob_map, mask, src_w, src_h)
+        t1 = time.perf_counter()
+        new_boxes, _ = fast_post.boxes_from_bitmap(prob_map, mask, src_w, src_h)
+        t2 = time.perf_counter()
+        paddle_time += t1 - t0
+        fast_time += t2 - t1
+        # 偏差换算回概率图像素，与图片缩放比例无关
+        worst, mismatched = compare_boxes(ref_boxes, new_boxes)
+        worst *= min(shape[2], shape[3])
+        ok = worst <= args.tolerance and mismatched == 0
+        failed += not ok
+        print('%s  %s  框数 %d/%d  最大角点偏差 %.1fpx' % ('OK ' if ok else 'BAD', path, len(ref_boxes),
+                                                  len(new_boxes), worst))
+    print('DBPostProcess %.1fms，FastDBPostProcess %.1fms' % (paddle_time * 1000, fast_time * 1000))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
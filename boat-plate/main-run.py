@@ -1,26 +1,37 @@
+import time
+STARTED = time.perf_counter()  # 启动耗时从这里算起，须在其他导入之前
 import sys
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QLabel, QVBoxLayout,
                              QHBoxLayout, QWidget, QPushButton, QFileDialog,
-                             QFrame, QSizePolicy)
-from PyQt5.QtGui import QPixmap, QFont, QIcon, QColor, QPalette
-from PyQt5.QtCore import Qt, QCoreApplication, QSize
+                             QFrame, QSizePolicy, QListWidget, QListWidgetItem,
+                             QProgressBar)
+from PyQt5.QtGui import QFont, QIcon, QColor, QPalette
+from PyQt5.QtCore import Qt, QSize
 import os
-import cv2
-import numpy as np
-from paddleocr import PaddleOCR
+from ocr_worker import OcrWorker, format_startup_report, rgb_pixmap
+from metrics import start_metrics_from_env
 
 
 class ShipLicenseRecognitionApp(QMainWindow):
     def __init__(self):
         super().__init__()
+        self.results = {}  # 任务号 -> (图片路径, 识别结果)
+        self.follow_latest = True  # 用户没有点开较早的记录时，新结果出来就自动显示
         self.initUI()
-        # 初始化PaddleOCR
-        self.ocr = PaddleOCR(
-            det_model_dir='model/det',
-            rec_model_dir='model/rec',
-            use_angle_cls=False,
-            use_gpu=True
-        )
+        self.window_time = time.perf_counter() - STARTED
+        # 识别在后台线程中进行，界面不再卡顿；推理库的导入、模型加载和预热也在后台进行，
+        # 窗口先显示出来，加载期间上传的图片排队等待
+        # 设置环境变量SHIP_OCR_METRICS_PORT/SHIP_OCR_METRICS_LOG_INTERVAL时开启性能指标
+        self.metrics = start_metrics_from_env()
+        self.worker = OcrWorker(max_queue=16, metrics=self.metrics, started=STARTED)
+        self.worker.modelWarming.connect(lambda: self.status_label.setText("模型预热中..."))
+        self.worker.modelReady.connect(self.onModelReady)
+        self.worker.modelFailed.connect(lambda msg: self.status_label.setText("模型加载失败: " + msg))
+        self.worker.jobStarted.connect(self.onJobStarted)
+        self.worker.jobFinished.connect(self.onJobFinished)
+        self.worker.jobFailed.connect(self.onJobFailed)
+        self.worker.progress.connect(self.onProgress)
+        self.worker.start()
 
     def initUI(self):
         # 设置主窗口属性
@@ -67,6 +78,21 @@ class ShipLicenseRecognitionApp(QMainWindow):
         """)
         left_layout.addWidget(self.image_label)
 
+        # 识别记录列表，点击可回看之前的识别结果
+        self.history_list = QListWidget(self)
+        self.history_list.setFixedHeight(160)
+        self.history_list.setStyleSheet("""
+            QListWidget {
+                font-size: 14px;
+                color: #2c3e50;
+                background-color: #f8f9fa;
+                border-radius: 8px;
+                border: 1px solid #e0e0e0;
+            }
+        """)
+        self.history_list.itemClicked.connect(self.onHistoryClicked)
+        left_layout.addWidget(self.history_list)
+
         # 右侧面板 - 检测结果
         right_panel = QFrame()
         right_panel.setFrameShape(QFrame.StyledPanel)
@@ -167,6 +193,24 @@ class ShipLicenseRecognitionApp(QMainWindow):
 
         right_layout.addWidget(result_frame)
 
+        # 任务进度
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%v / %m")
+        self.progress_bar.setAlignment(Qt.AlignCenter)
+        right_layout.addWidget(self.progress_bar)
+
+        self.status_label = QLabel("模型加载中...", self)
+        self.status_label.setAlignment(Qt.AlignCenter)
+        self.status_label.setStyleSheet("""
+            QLabel {
+                font-size: 14px;
+                color: #7f8c8d;
+            }
+        """)
+        right_layout.addWidget(self.status_label)
+
         # 按钮区域
         button_frame = QFrame()
         button_layout = QVBoxLayout(button_frame)
@@ -197,6 +241,28 @@ class ShipLicenseRecognitionApp(QMainWindow):
         upload_button.clicked.connect(self.uploadImage)
         button_layout.addWidget(upload_button)
 
+        # 取消排队按钮
+        cancel_button = QPushButton("取消排队任务", self)
+        cancel_button.setStyleSheet("""
+            QPushButton {
+                background-color: #f39c12;
+                color: white;
+                font-size: 18px;
+                font-weight: bold;
+                padding: 12px;
+                border-radius: 8px;
+                border: none;
+            }
+            QPushButton:hover {
+                background-color: #d68910;
+            }
+            QPushButton:pressed {
+                background-color: #9c640c;
+            }
+        """)
+        cancel_button.clicked.connect(self.cancelPending)
+        button_layout.addWidget(cancel_button)
+
         # 退出按钮
         exit_button = QPushButton("退出系统", self)
         exit_button.setIcon(QIcon('icon/exit-icon.png'))
@@ -218,7 +284,7 @@ class ShipLicenseRecognitionApp(QMainWindow):
                 background-color: #922b21;
             }
         """)
-        exit_button.clicked.connect(QCoreApplication.instance().quit)
+        exit_button.clicked.connect(self.close)  # 通过closeEvent结束后台线程
         button_layout.addWidget(exit_button)
 
         right_layout.addWidget(button_frame)
@@ -243,100 +309,105 @@ class ShipLicenseRecognitionApp(QMainWindow):
 
         self.show()
 
+    def onModelReady(self, report):
+        report['window'] = self.window_time
+        text = format_startup_report(report)
+        self.status_label.setText("模型已就绪，" + text)
+        print(text, file=sys.stderr)
+
     def uploadImage(self):
-        # 打开文件对话框，选择图片文件
-        file_dialog = QFileDialog()
-        file_dialog.setNameFilter("图片文件 (*.png *.jpg *.bmp)")
-        image_path, _ = file_dialog.getOpenFileName(self, '选择图片', '', 'Image Files (*.png *.jpg *.bmp)')
-
-        if image_path:
-            # 加载图片并显示在左侧Label中
-            pixmap = QPixmap(image_path)
-            self.image_label.setPixmap(pixmap.scaled(
-                self.image_label.size(),
+        # 打开文件对话框，可一次选择多张图片排队识别
+        image_paths, _ = QFileDialog.getOpenFileNames(self, '选择图片', '', 'Image Files (*.png *.jpg *.bmp)')
+
+        rejected = 0
+        for image_path in image_paths:
+            if self.worker.submit(image_path) is None:
+                rejected += 1
+        if rejected:
+            self.status_label.setText("队列已满，%d 张图片未加入" % rejected)
+
+    def cancelPending(self):
+        self.worker.cancelAll()
+        self.status_label.setText("已取消排队中的任务")
+
+    def onProgress(self, done, total):
+        self.progress_bar.setRange(0, max(total, 1))
+        self.progress_bar.setValue(done)
+
+    def onJobStarted(self, job_id, image_path):
+        self.status_label.setText("正在识别: %s（排队 %d 张）" % (
+            os.path.basename(image_path), self.worker.pendingCount()))
+
+    def onJobFinished(self, job_id, image_path, result):
+        self.results[job_id] = (image_path, result)
+        item = QListWidgetItem("%s  —  %s" % (os.path.basename(image_path), result['text'] or "未识别"))
+        item.setData(Qt.UserRole, job_id)
+        self.history_list.addItem(item)
+        # 用户没有在回看较早的记录时，自动显示最新结果并选中它
+        if self.follow_latest:
+            self.history_list.setCurrentItem(item)
+            self.showResult(job_id)
+        if self.worker.pendingCount() == 0:
+            self.status_label.setText("识别完成")
+
+    def onJobFailed(self, job_id, image_path, message):
+        self.history_list.addItem("%s  —  失败: %s" % (os.path.basename(image_path), message))
+
+    def onHistoryClicked(self, item):
+        # 点的是最新一条时恢复自动显示，点较早的记录则停在该记录上
+        self.follow_latest = self.history_list.row(item) == self.history_list.count() - 1
+        job_id = item.data(Qt.UserRole)
+        if job_id in self.results:
+            self.showResult(job_id)
+
+    def showResult(self, job_id):
+        image_path, result = self.results[job_id]
+
+        # 在左侧Label中显示图片：识别线程已把图片解码并缩小成RGB数组，这里不再读文件、不再解码原图
+        self.image_label.setPixmap(rgb_pixmap(result['display']).scaled(
+            self.image_label.size(),
+            Qt.KeepAspectRatio,
+            Qt.SmoothTransformation
+        ))
+
+        # 在右侧Label中显示切割出来的船牌图片和识别结果
+        plate_img = result['plate']  # RGB，识别线程中已转换好
+        if plate_img is not None and plate_img.size > 0:
+            self.plate_image_label.setStyleSheet("""
+                QLabel {
+                    min-height: 150px;
+                    background-color: #eef2f7;
+                    border-radius: 8px;
+                    border: 1px dashed #a0a0a0;
+                }
+            """)
+            self.plate_image_label.setPixmap(rgb_pixmap(plate_img).scaled(
+                self.plate_image_label.size(),
                 Qt.KeepAspectRatio,
                 Qt.SmoothTransformation
             ))
-
-            # 更新状态
-            self.plate_image_label.setText("检测中...")
-            self.plate_number_label.setText("识别中...")
-            QApplication.processEvents()  # 强制更新UI
-
-            # 进行船牌检测与识别
-            plate_image, plate_number = self.detectAndRecognizeShipLicense(image_path)
-
-            # 在右侧Label中显示切割出来的船牌图片和识别结果
-            if plate_image is not None:
-                self.plate_image_label.setPixmap(QPixmap.fromImage(plate_image).scaled(
-                    self.plate_image_label.size(),
-                    Qt.KeepAspectRatio,
-                    Qt.SmoothTransformation
-                ))
-            else:
-                self.plate_image_label.setText("未检测到船牌")
-                self.plate_image_label.setStyleSheet("""
-                    QLabel {
-                        min-height: 150px;
-                        background-color: #fde8e8;
-                        border-radius: 8px;
-                        border: 1px dashed #e74c3c;
-                        font-size: 14px;
-                        color: #c0392b;
-                    }
-                """)
-
-            self.plate_number_label.setText(plate_number if plate_number else "未能识别船牌号码")
-
-    def detectAndRecognizeShipLicense(self, image_path):
-        # 读取图像
-        img = cv2.imread(image_path)
-
-        # 使用PaddleOCR进行检测和识别
-        result = self.ocr.ocr(img, cls=False)
-
-        # 如果没有检测到任何文本区域，返回None
-        if not result or not result[0]:
-            return None, ""
-
-        # 获取所有检测框和识别结果
-        boxes = [line[0] for line in result[0]]
-        texts = [line[1][0] for line in result[0]]
-        scores = [line[1][1] for line in result[0]]
-
-        # 找出最可能是船牌的文本区域（这里简单取第一个或得分最高的）
-        best_idx = scores.index(max(scores)) #0
-        if len(scores) > 1:
-            best_idx = scores.index(max(scores))
-
-        best_box = boxes[best_idx]
-        best_text = texts[best_idx]
-
-        # 裁剪船牌区域
-        x_coords = [int(p[0]) for p in best_box]
-        y_coords = [int(p[1]) for p in best_box]
-        x1, x2 = min(x_coords), max(x_coords)
-        y1, y2 = min(y_coords), max(y_coords)
-
-        # 确保坐标在图像范围内
-        h, w = img.shape[:2]
-        x1, y1 = max(0, x1), max(0, y1)
-        x2, y2 = min(w, x2), min(h, y2)
-
-        # 裁剪船牌区域
-        plate_img = img[y1:y2, x1:x2]
-
-        # 将OpenCV图像转换为Qt图像
-        if plate_img.size > 0:
-            plate_img = cv2.cvtColor(plate_img, cv2.COLOR_BGR2RGB)
-            h, w, ch = plate_img.shape
-            bytes_per_line = ch * w
-            from PyQt5.QtGui import QImage
-            q_img = QImage(plate_img.data, w, h, bytes_per_line, QImage.Format_RGB888)
         else:
-            q_img = None
-
-        return q_img, best_text
+            self.plate_image_label.setText("未检测到船牌")
+            self.plate_image_label.setStyleSheet("""
+                QLabel {
+                    min-height: 150px;
+                    background-color: #fde8e8;
+                    border-radius: 8px;
+                    border: 1px dashed #e74c3c;
+                    font-size: 14px;
+                    color: #c0392b;
+                }
+            """)
+
+        plate_number = result['text']
+        self.plate_number_label.setText(plate_number if plate_number else "未能识别船牌号码")
+
+    def closeEvent(self, event):
+        """关闭窗口前结束后台识别线程"""
+        self.worker.stop()
+        if self.metrics is not None:
+            self.metrics.close()
+        super().closeEvent(event)
 
 
 if __name__ == '__main__':
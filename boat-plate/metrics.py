@@ -0,0 +1,264 @@
+import os
+import time
+import bisect
+import logging
+import threading
+import collections
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 阶段耗时直方图的桶上限(秒)，覆盖解码的毫秒级到CPU整图识别的数秒
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 计数器及其说明，导出时名称加上前缀和_total后缀
+COUNTERS = {
+    'images': '处理完成的图片/帧数',
+    'errors': '处理失败的图片数',
+    'cache_hits': '结果缓存命中次数',
+    'cache_misses': '结果缓存未命中次数',
+    'db_writes': '写入识别记录库的记录数',
+    'db_errors': '写入识别记录库失败的次数',
+    'frames_skipped': '视频中画面无变化而跳过的帧数',
+    'batches': '识别服务送入引擎的批数',
+    'requests_rejected': '识别服务因排队已满拒绝的请求数',
+    'requests_timed_out': '识别服务超时的请求数',
+    'rec_light_accepted': '识别级联中由轻量模型直接给出结果的裁剪图数',
+    'rec_fallbacks': '识别级联中置信度不足、转交完整识别模型的裁剪图数',
+}
+
+# 开启指标的环境变量，图形界面没有命令行参数，通过它们开启
+ENV_PORT = 'SHIP_OCR_METRICS_PORT'
+ENV_LOG_INTERVAL = 'SHIP_OCR_METRICS_LOG_INTERVAL'
+
+logger = logging.getLogger('ship_ocr.metrics')
+
+
+class Histogram:
+    """Prometheus风格的直方图：各桶计数、总和与次数"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为+Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """进程内的指标汇总：各阶段耗时直方图、计数器、按需取值的仪表，以及最近一段时间的处理速度。
+    实现了StageTimer的add接口，可以直接赋给引擎的stage_timer。
+    关闭指标时调用方持有None，热路径上只多一次判断"""
+
+    def __init__(self, prefix='ship_ocr', buckets=DEFAULT_BUCKETS, rate_window=60.0):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self.rate_window = rate_window
+        self.histograms = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.gauges = {}  # 名称 -> (取值函数, 说明)
+        self.started = time.monotonic()
+        self._recent = collections.deque()  # 最近rate_window秒内完成的图片时间戳
+        self._lock = threading.Lock()
+        self.server = None
+        self.reporter = None
+
+    def add(self, stage, seconds):
+        with self._lock:
+            hist = self.histograms.get(stage)
+            if hist is None:
+                hist = self.histograms[stage] = Histogram(self.buckets)
+            hist.observe(seconds)
+
+    observe = add
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            if name == 'images':
+                now = time.monotonic()
+                self._recent.extend([now] * n)
+                self._prune(now)
+
+    def observe_record(self, record, cached_lookup=False):
+        """统计recognize_paths/多进程池返回的一条结果记录；cached_lookup表示该记录查过结果缓存"""
+        timings = record['timings']
+        for stage in ('decode', 'total'):
+            if stage in timings:
+                self.observe(stage, timings[stage])
+        if cached_lookup:
+            self.inc('cache_hits' if record.get('cached') else 'cache_misses')
+        self.inc('errors' if 'error' in record else 'images')
+
+    def gauge(self, name, func, help_text=''):
+        """注册一个仪表，导出时调用func取当前值（如队列长度）"""
+        self.gauges[name] = (func, help_text)
+
+    def _prune(self, now):
+        while self._recent and now - self._recent[0] > self.rate_window:
+            self._recent.popleft()
+
+    def images_per_sec(self):
+        """最近rate_window秒内的平均处理速度"""
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            window = min(self.rate_window, now - self.started)
+            return len(self._recent) / window if window > 0 else 0.0
+
+    def cache_hit_rate(self):
+        total = self.counters['cache_hits'] + self.counters['cache_misses']
+        return self.counters['cache_hits'] / total if total else 0.0
+
+    def rec_light_hit_rate(self):
+        total = self.counters['rec_light_accepted'] + self.counters['rec_fallbacks']
+        return self.counters['rec_light_accepted'] / total if total else 0.0
+
+    def snapshot(self):
+        """当前各阶段的(次数, 总耗时)和计数器的拷贝"""
+        with self._lock:
+            stages = {stage: (h.count, h.sum) for stage, h in self.histograms.items()}
+            return stages, dict(self.counters)
+
+    def render(self):
+        """Prometheus文本格式(0.0.4)"""
+        p = self.prefix
+        lines = []
+        with self._lock:
+            histograms = {stage: (list(h.counts), h.sum, h.count) for stage, h in self.histograms.items()}
+            counters = dict(self.counters)
+        lines.append('# HELP %s_stage_seconds 各处理阶段的耗时' % p)
+        lines.append('# TYPE %s_stage_seconds histogram' % p)
+        for stage in sorted(histograms):
+            counts, total, count = histograms[stage]
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                le = bound if isinstance(bound, str) else repr(float(bound))
+                lines.append('%s_stage_seconds_bucket{stage="%s",le="%s"} %d' % (p, stage, le, cumulative))
+            lines.append('%s_stage_seconds_sum{stage="%s"} %r' % (p, stage, total))
+            lines.append('%s_stage_seconds_count{stage="%s"} %d' % (p, stage, count))
+        for name in sorted(counters):
+            lines.append('# HELP %s_%s_total %s' % (p, name, COUNTERS.get(name, name)))
+            lines.append('# TYPE %s_%s_total counter' % (p, name))
+            lines.append('%s_%s_total %d' % (p, name, counters[name]))
+        gauges = [('images_per_second', self.images_per_sec, '最近%d秒的平均处理速度' % self.rate_window),
+                  ('cache_hit_ratio', self.cache_hit_rate, '结果缓存命中率'),
+                  ('rec_light_hit_ratio', self.rec_light_hit_rate, '识别级联中由轻量模型直接给出结果的比例')]
+        gauges += [(name, func, help_text) for name, (func, help_text) in sorted(self.gauges.items())]
+        for name, func, help_text in gauges:
+            lines.append('# HELP %s_%s %s' % (p, name, help_text))
+            lines.append('# TYPE %s_%s gauge' % (p, name))
+            lines.append('%s_%s %r' % (p, name, float(func())))
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        """在后台线程中提供 http://host:port/metrics"""
+        self.server = MetricsServer(self, port, host)
+        return self.server
+
+    def log_every(self, interval):
+        """每interval秒输出一行汇总日志"""
+        self.reporter = MetricsReporter(self, interval)
+        self.reporter.start()
+        return self.reporter
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        if self.reporter is not None:
+            self.reporter.stop()
+
+
+class MetricsServer:
+    """只监听本机的HTTP服务，GET /metrics 返回Prometheus格式的指标"""
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='metrics-http', daemon=True)
+        self.thread.start()
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class MetricsReporter(threading.Thread):
+    """定期输出一行日志：处理速度、队列、缓存命中率、识别级联命中率，以及这段时间内各阶段的平均耗时"""
+
+    def __init__(self, metrics, interval):
+        super().__init__(name='metrics-log', daemon=True)
+        self.metrics = metrics
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        last_stages, last_counters = self.metrics.snapshot()
+        while not self._stop_event.wait(self.interval):
+            stages, counters = self.metrics.snapshot()
+            images = counters['images'] - last_counters['images']
+            parts = ['%d 张，%.2f 张/秒' % (images, images / self.interval)]
+            for name, (func, _) in sorted(self.metrics.gauges.items()):
+                parts.append('%s=%g' % (name, func()))
+            lookups = sum(counters[k] - last_counters[k] for k in ('cache_hits', 'cache_misses'))
+            if lookups:
+                parts.append('缓存命中 %.0f%%' % (100.0 * (counters['cache_hits'] - last_counters['cache_hits'])
+                                                   / lookups))
+            routed = sum(counters[k] - last_counters[k] for k in ('rec_light_accepted', 'rec_fallbacks'))
+            if routed:
+                parts.append('轻量识别采用 %.0f%%' % (100.0 * (counters['rec_light_accepted']
+                                                       - last_counters['rec_light_accepted']) / routed))
+            for stage in sorted(stages):
+                count, total = stages[stage]
+                prev_count, prev_total = last_stages.get(stage, (0, 0.0))
+                if count > prev_count:
+                    parts.append('%s %.1fms' % (stage, 1000 * (total - prev_total) / (count - prev_count)))
+            logger.info('，'.join(parts))
+            last_stages, last_counters = stages, counters
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_metrics(port=None, log_interval=None):
+    """按参数开启指标：port提供HTTP接口，log_interval定期输出日志；两者都没有时返回None（完全关闭）"""
+    if not port and not log_interval:
+        return None
+    metrics = Metrics()
+    if port:
+        metrics.serve(port)
+    if log_interval:
+        if not logging.getLogger().handlers:
+            logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+        logger.setLevel(logging.INFO)
+        metrics.log_every(log_interval)
+    return metrics
+
+
+def start_metrics_from_env():
+    """图形界面使用：按环境变量SHIP_OCR_METRICS_PORT / SHIP_OCR_METRICS_LOG_INTERVAL开启指标"""
+    port = os.environ.get(ENV_PORT)
+    interval = os.environ.get(ENV_LOG_INTERVAL)
+    return start_metrics(int(port) if port else None, float(interval) if interval else None)
@@ -0,0 +1,962 @@
+import os
+import glob
+import json
+import math
+import fnmatch
+import time
+import hashlib
+import cv2
+import numpy as np
+
+from db_postprocess import FastDBPostProcess
+
+# 项目根目录，保证从任意工作目录运行都能找到模型
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+# 引擎默认配置，与界面程序中PaddleOCR的参数保持一致
+DEFAULT_CONFIG = {
+    'det_model_dir': os.path.join(BASE_DIR, 'model', 'det'),
+    'rec_model_dir': os.path.join(BASE_DIR, 'model', 'rec'),
+    'device': 'auto',  # auto / cpu / gpu，auto在有可用GPU时使用GPU
+    # 推理后端：paddle 使用Paddle Inference；onnxruntime / openvino 在CPU上运行
+    # onnx_backend.py导出的ONNX模型，前后处理不依赖paddle
+    'backend': 'paddle',
+    'onnx_model_dir': os.path.join(BASE_DIR, 'model', 'onnx'),
+    'onnx_precision': 'fp32',  # fp32 / int8，int8使用onnx_quantize.py量化后的模型
+    'cpu_threads': 10,  # CPU推理线程数（开启mkldnn时生效）
+    'enable_mkldnn': False,
+    'rec_batch_num': 32,  # 一次送入识别模型的裁剪图数量上限
+    # 识别分批方式（见plan_rec_batches）：bucketed 按宽高比分桶、按内存预算定批大小；
+    # sorted 按宽高比排序后定长分批（同PaddleOCR）；naive 按输入顺序定长分批
+    'rec_batching': 'bucketed',
+    'rec_batch_budget_mb': 6.0,  # bucketed：每批识别输入张量的内存上限，默认宽度320时约32张
+    'rec_bucket_spread': 1.25,  # bucketed：批内最宽与最窄裁剪图的输入宽度之比超过该值时另起一批
+    'det_batch_num': 1,  # process_images中缩放后尺寸相同的图片最多几张合并成一批检测，1为逐张检测
+    'drop_score': 0.5,  # 与PaddleOCR.ocr相同，低于该分数的识别结果丢弃
+    # 检测前处理/后处理参数，取PaddleOCR的默认值
+    'det_limit_side_len': 960,
+    'det_db_thresh': 0.3,
+    'det_db_box_thresh': 0.6,
+    'det_db_unclip_ratio': 1.5,
+    # DB后处理实现：paddle 使用PaddleOCR自带的逐框实现；fast 使用db_postprocess中的向量化实现
+    # （ONNX后端总是使用fast）
+    'det_postprocess': 'paddle',
+    # 检测分辨率策略：full 按det_limit_side_len一次检测；adaptive 先低分辨率粗检，
+    # 只在小目标区域或粗检无结果时用完整分辨率重新检测；tiled 把超大图切成重叠的分块按原分辨率检测
+    'det_mode': 'full',
+    'det_coarse_side_len': 480,
+    'det_refine_min_height': 16,  # 粗检图上高度低于该像素数的框认为不可靠，需要细检
+    'det_refine_margin': 0.5,  # 细检区域在框周围扩展的比例
+    'det_tile_size': 960,  # tiled：分块边长（原图像素），应为32的倍数
+    'det_tile_overlap': 192,  # tiled：相邻分块重叠的像素数，不小于最宽船牌时船牌总能完整落在某个分块内
+    'det_tile_min_side': 2560,  # tiled：长边不超过该值的图片不分块，按full检测
+    'det_tile_batch': 4,  # tiled：每次送入检测模型的分块数，决定检测时的峰值内存
+    'det_tile_global': True,  # tiled：另按det_limit_side_len对整图检测一次，找回跨多个分块的大目标
+    # 识别策略：all 识别全部检测框；selective 按检测分数和船牌形状排序，只识别前几个
+    'rec_mode': 'all',
+    'rec_top_k': 2,  # selective模式每轮识别的候选框数
+    'rec_accept_score': 0.85,  # 最高识别得分低于该值时再识别下一轮候选
+    'rec_max_candidates': 8,  # selective模式最多识别的候选框数
+    # 识别级联：先用rec_light_model_dir中的轻量模型（如PP-OCR mobile识别模型）识别全部裁剪图，
+    # 分数（平均字符置信度）低于rec_cascade_score的再交给rec_model_dir中的SVTR_HGNet模型重新识别
+    'rec_cascade': False,
+    'rec_light_model_dir': os.path.join(BASE_DIR, 'model', 'rec_light'),
+    'rec_cascade_score': 0.9,
+    # 结果中另外保留全部检测框及其检测分数（detections字段），不论是否识别、识别分数是否达到drop_score，
+    # 供plate_eval.py单独评估检测
+    'keep_detections': False,
+}
+
+# 可选的推理后端
+BACKENDS = ('paddle', 'onnxruntime', 'openvino')
+
+# 开启识别级联（rec_routes）或keep_detections（detections）时结果记录中才有的字段，
+# 结果缓存也保存这些字段（见result_cache.CACHED_FIELDS），命中与未命中返回的字段相同
+OPTIONAL_RESULT_FIELDS = ('rec_routes', 'detections')
+
+# 检测分辨率策略，见DEFAULT_CONFIG['det_mode']
+DET_MODES = ('full', 'adaptive', 'tiled')
+
+# 只影响速度、不影响识别结果的配置项，计算模型指纹时忽略
+RUNTIME_ONLY_KEYS = ('device', 'cpu_threads', 'enable_mkldnn', 'rec_batch_num', 'det_batch_num',
+                     'rec_batching', 'rec_batch_budget_mb', 'rec_bucket_spread', 'det_tile_batch')
+
+# 可以按摄像头单独设置的检测参数
+CAMERA_PROFILE_KEYS = ('det_mode', 'det_limit_side_len', 'det_coarse_side_len',
+                       'det_refine_min_height', 'det_refine_margin', 'det_tile_size', 'det_tile_overlap',
+                       'det_tile_min_side', 'det_tile_global')
+
+# 检测模型输入的归一化参数，与model/det/inference.yml中NormalizeImage一致
+DET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+DET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+# 识别模型输入尺寸，与model/rec/inference.yml中RecResizeImg一致
+REC_IMAGE_SHAPE = (3, 48, 320)
+REC_BATCHING = ('bucketed', 'sorted', 'naive')
+# 识别模型：light 级联中的轻量模型；full rec_model_dir中的模型
+REC_MODELS = ('light', 'full')
+
+
+def read_file(image_path):
+    """读取文件原始字节，失败返回None"""
+    try:
+        with open(image_path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def decode_image(data):
+    """把图片文件字节解码成BGR图像，失败返回None"""
+    if not data:
+        return None
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def load_image(image_path):
+    """读取图片，支持中文路径，失败返回None"""
+    return decode_image(read_file(image_path))
+
+
+def content_hash(data):
+    """图片内容哈希，用作结果缓存的键"""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def list_images(inputs):
+    """把目录、通配符、文件列表(@list.txt)和单个文件展开成图片路径列表"""
+    paths = []
+    for item in inputs:
+        if item.startswith('@'):
+            with open(item[1:], encoding='utf-8') as f:
+                paths.extend(line.strip() for line in f if line.strip())
+        elif os.path.isdir(item):
+            for name in sorted(os.listdir(item)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(item, name))
+        elif glob.has_magic(item):
+            paths.extend(p for p in sorted(glob.glob(item)) if p.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths.append(item)
+    return paths
+
+
+def edit_distance(a, b):
+    """两个字符串的编辑距离"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def text_similarity(a, b):
+    """基于编辑距离的文本相似度，范围0~1"""
+    if not a and not b:
+        return 1.0
+    return 1.0 - edit_distance(a, b) / max(len(a), len(b))
+
+
+def load_camera_profiles(path):
+    """读取摄像头配置文件，格式见camera_profiles.example.json"""
+    with open(path, encoding='utf-8') as f:
+        profiles = json.load(f)['profiles']
+    for profile in profiles:
+        unknown = set(profile) - set(CAMERA_PROFILE_KEYS) - {'name', 'match'}
+        if unknown:
+            raise ValueError('摄像头配置 %s 含有不支持的参数: %s' % (profile.get('name'), ', '.join(sorted(unknown))))
+    return profiles
+
+
+def match_camera_profile(image_path, profiles):
+    """按文件路径通配符找到图片对应的摄像头配置，返回检测参数字典，没有匹配时返回None"""
+    path = image_path.replace('\\', '/')
+    for profile in profiles or ():
+        if fnmatch.fnmatch(path, profile['match']):
+            return {k: v for k, v in profile.items() if k in CAMERA_PROFILE_KEYS}
+    return None
+
+
+def find_camera_profile(name, profiles):
+    """按名称查找摄像头配置（视频流使用）"""
+    for profile in profiles or ():
+        if profile.get('name') == name:
+            return {k: v for k, v in profile.items() if k in CAMERA_PROFILE_KEYS}
+    raise KeyError('没有名为 %s 的摄像头配置' % name)
+
+
+def gpu_available():
+    """当前Paddle是否为GPU版本且能找到显卡"""
+    try:
+        import paddle
+        return paddle.device.is_compiled_with_cuda() and paddle.device.cuda.device_count() > 0
+    except Exception:
+        return False
+
+
+def sorted_box_indices(dt_boxes):
+    """检测框从上到下、从左到右的排列顺序（与PaddleOCR的sorted_boxes一致），返回下标列表"""
+    order = sorted(range(len(dt_boxes)), key=lambda k: (dt_boxes[k][0][1], dt_boxes[k][0][0]))
+    for i in range(len(order) - 1):
+        for j in range(i, -1, -1):
+            a, b = dt_boxes[order[j]], dt_boxes[order[j + 1]]
+            if abs(b[0][1] - a[0][1]) < 10 and b[0][0] < a[0][0]:
+                order[j], order[j + 1] = order[j + 1], order[j]
+            else:
+                break
+    return order
+
+
+def sorted_boxes(dt_boxes):
+    """按从上到下、从左到右排序检测框"""
+    return [dt_boxes[k] for k in sorted_box_indices(dt_boxes)]
+
+
+def order_points_clockwise(pts):
+    """四个角点按左上、右上、右下、左下排列"""
+    rect = np.zeros((4, 2), dtype=np.float32)
+    s = pts.sum(axis=1)
+    rect[0] = pts[np.argmin(s)]
+    rect[2] = pts[np.argmax(s)]
+    tmp = np.delete(pts, (np.argmin(s), np.argmax(s)), axis=0)
+    diff = np.diff(np.array(tmp), axis=1)
+    rect[1] = tmp[np.argmin(diff)]
+    rect[3] = tmp[np.argmax(diff)]
+    return rect
+
+
+def plate_likeness(box, image_shape, aspect_range=(1.5, 10.0), min_area=0.0005):
+    """按宽高比、面积和位置估计检测框像船牌的程度，范围0~1"""
+    box = np.asarray(box, dtype=np.float32)
+    w = max(np.linalg.norm(box[0] - box[1]), np.linalg.norm(box[2] - box[3]))
+    h = max(np.linalg.norm(box[0] - box[3]), np.linalg.norm(box[1] - box[2]))
+    if w < 1 or h < 1:
+        return 0.0
+    img_h, img_w = image_shape[:2]
+    aspect = max(w, h) / min(w, h)
+    lo, hi = aspect_range
+    # 宽高比在范围内满分，超出范围按倍数衰减
+    aspect_score = 1.0 if lo <= aspect <= hi else min(aspect / lo, hi / aspect)
+    area = w * h / float(img_w * img_h)
+    area_score = min(1.0, area / min_area)
+    # 船牌多在画面中部，越靠边越减分，但最多减一半
+    cx, cy = box[:, 0].mean() / img_w, box[:, 1].mean() / img_h
+    position_score = 1.0 - 0.5 * min(1.0, 2 * max(abs(cx - 0.5), abs(cy - 0.5)))
+    return float(aspect_score * area_score * position_score)
+
+
+def get_rotate_crop_image(img, points):
+    """按四边形检测框做透视变换，得到送入识别模型的文本图像"""
+    points = np.asarray(points, dtype=np.float32)
+    crop_width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    crop_height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    pts_std = np.float32([[0, 0], [crop_width, 0], [crop_width, crop_height], [0, crop_height]])
+    M = cv2.getPerspectiveTransform(points, pts_std)
+    dst_img = cv2.warpPerspective(img, M, (crop_width, crop_height),
+                                  borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    # 竖排文字旋转成横排
+    if dst_img.shape[0] * 1.0 / dst_img.shape[1] >= 1.5:
+        dst_img = np.rot90(dst_img)
+    return dst_img
+
+
+def rec_resize_norm(img, max_wh_ratio, image_shape=REC_IMAGE_SHAPE):
+    """识别前处理（同PaddleOCR TextRecognizer.resize_norm_img）：高缩放到48，
+    宽按比例不超过48*max_wh_ratio，归一化到[-1, 1]，右侧补零"""
+    img_c, img_h, img_w = image_shape
+    img_w = int(img_h * max_wh_ratio)
+    h, w = img.shape[:2]
+    ratio = w / float(h)
+    resized_w = img_w if math.ceil(img_h * ratio) > img_w else int(math.ceil(img_h * ratio))
+    resized = cv2.resize(img, (resized_w, img_h)).astype(np.float32)
+    resized = resized.transpose((2, 0, 1)) / 255
+    resized -= 0.5
+    resized /= 0.5
+    padded = np.zeros((img_c, img_h, img_w), dtype=np.float32)
+    padded[:, :, :resized_w] = resized
+    return padded
+
+
+def rec_input_width(ratio, image_shape=REC_IMAGE_SHAPE):
+    """宽高比为ratio的裁剪图送入识别模型时的宽度：高缩放到48，不小于模型默认宽度320"""
+    _, img_h, img_w = image_shape
+    return int(img_h * max(img_w / float(img_h), ratio))
+
+
+def plan_rec_batches(ratios, mode='bucketed', batch_num=32, budget_mb=6.0, spread=1.25):
+    """识别分批，ratios为各裁剪图的宽高比，返回[[裁剪图下标, ...], ...]。
+    一批补零到批内最宽的一张，宽窄混在一起时窄图的计算大多浪费在补零上：
+    naive 按输入顺序每batch_num张一批；
+    sorted 按宽高比排序后每batch_num张一批（同PaddleOCR）；
+    bucketed 按宽高比排序后分桶，批内最宽与最窄的输入宽度之比超过spread时另起一批，
+    每批张数由输入张量的内存预算budget_mb决定（越宽的批张数越少），且不超过batch_num"""
+    if mode not in REC_BATCHING:
+        raise ValueError('未知的识别分批方式: %s' % mode)
+    n = len(ratios)
+    if mode == 'naive':
+        return [list(range(start, min(start + batch_num, n))) for start in range(0, n, batch_num)]
+    order = sorted(range(n), key=ratios.__getitem__)
+    if mode == 'sorted':
+        return [order[start:start + batch_num] for start in range(0, n, batch_num)]
+    img_c, img_h, _ = REC_IMAGE_SHAPE
+    budget = budget_mb * 1024 * 1024
+    batches, batch, first_width = [], [], 0
+    for i in order:
+        # 按宽高比升序，当前这张就是批内最宽的
+        width = rec_input_width(ratios[i])
+        size = min(batch_num, max(1, int(budget // (img_c * img_h * width * 4))))
+        if batch and (len(batch) >= size or width > first_width * spread):
+            batches.append(batch)
+            batch = []
+        if not batch:
+            first_width = width
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def ctc_decode(probs, characters):
+    """CTC贪心解码（同CTCLabelDecode）：取每步最大概率的字符，去掉重复和空白(下标0)，
+    分数为保留字符概率的平均值，返回[(文本, 分数), ...]"""
+    indices = probs.argmax(axis=2)
+    confidences = probs.max(axis=2)
+    keep = indices != 0
+    keep[:, 1:] &= indices[:, 1:] != indices[:, :-1]
+    results = []
+    for idx, conf, mask in zip(indices, confidences, keep):
+        text = ''.join(characters[i] for i in idx[mask])
+        score = float(conf[mask].mean()) if mask.any() else 0.0
+        results.append((text, score))
+    return results
+
+
+def crop_plate(img, box):
+    """按检测框的外接矩形裁剪船牌区域，用于界面显示，无效区域返回None"""
+    x_coords = [int(p[0]) for p in box]
+    y_coords = [int(p[1]) for p in box]
+    h, w = img.shape[:2]
+    x1, y1 = max(0, min(x_coords)), max(0, min(y_coords))
+    x2, y2 = min(w, max(x_coords)), min(h, max(y_coords))
+    if x1 >= x2 or y1 >= y2:
+        return None
+    return img[y1:y2, x1:x2]
+
+
+def fit_image(img, max_width, max_height):
+    """等比缩小到不超过max_width x max_height（不放大），用于界面显示；已经够小时原样返回。
+    INTER_AREA缩小4K图片比Qt的SmoothTransformation快得多，结果也不发虚"""
+    h, w = img.shape[:2]
+    scale = min(max_width / float(w), max_height / float(h))
+    if scale >= 1:
+        return img
+    return cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def box_rect(box):
+    """四边形检测框的外接矩形 (x1, y1, x2, y2)"""
+    pts = np.asarray(box, dtype=np.float32).reshape(-1, 2)
+    return float(pts[:, 0].min()), float(pts[:, 1].min()), float(pts[:, 0].max()), float(pts[:, 1].max())
+
+
+def box_iou(box_a, box_b):
+    """两个检测框外接矩形的交并比"""
+    ax1, ay1, ax2, ay2 = box_rect(box_a)
+    bx1, by1, bx2, by2 = box_rect(box_b)
+    iw = max(0.0, min(ax2, bx2) - max(ax1, bx1))
+    ih = max(0.0, min(ay2, by2) - max(ay1, by1))
+    inter = iw * ih
+    union = (ax2 - ax1) * (ay2 - ay1) + (bx2 - bx1) * (by2 - by1) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def box_overlap(box_a, box_b):
+    """两个检测框外接矩形的交集占较小框的比例，一个框基本落在另一个框内时接近1"""
+    ax1, ay1, ax2, ay2 = box_rect(box_a)
+    bx1, by1, bx2, by2 = box_rect(box_b)
+    iw = max(0.0, min(ax2, bx2) - max(ax1, bx1))
+    ih = max(0.0, min(ay2, by2) - max(ay1, by1))
+    smaller = min((ax2 - ax1) * (ay2 - ay1), (bx2 - bx1) * (by2 - by1))
+    return iw * ih / smaller if smaller > 0 else 0.0
+
+
+def tile_starts(length, tile, overlap):
+    """一个方向上各分块的起点：相邻分块重叠overlap像素，最后一块与图像边缘对齐，各分块大小相同"""
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, tile - overlap))
+    starts.append(length - tile)
+    return starts
+
+
+def merge_tile_boxes(boxes, scores, tiers, max_overlap=0.5):
+    """合并分块检测的结果。tiers为每个框的来源：0 完整落在分块内，1 整图检测，
+    2 被分块的内侧边缘截断。截断的框先与相交的截断框合并成外接最小矩形（跨接缝的船牌），
+    再按(来源, -分数)的顺序做非极大值抑制：与已保留的框重叠超过max_overlap（交集占较小框的比例）
+    的丢弃。分块内的完整框分辨率最高，优先保留；截断的半块船牌会被别处完整检测到的同一船牌抑制"""
+    pieces = [[box, score] for box, score, tier in zip(boxes, scores, tiers) if tier == 2]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(pieces)):
+            for j in range(i + 1, len(pieces)):
+                ax1, ay1, ax2, ay2 = box_rect(pieces[i][0])
+                bx1, by1, bx2, by2 = box_rect(pieces[j][0])
+                if min(ax2, bx2) > max(ax1, bx1) and min(ay2, by2) > max(ay1, by1):
+                    pts = np.concatenate([pieces[i][0], pieces[j][0]]).astype(np.float32)
+                    pieces[i] = [order_points_clockwise(cv2.boxPoints(cv2.minAreaRect(pts))),
+                                 max(pieces[i][1], pieces[j][1])]
+                    del pieces[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    candidates = [(tier, -score, box) for box, score, tier in zip(boxes, scores, tiers) if tier != 2]
+    candidates += [(2, -score, box) for box, score in pieces]
+    candidates.sort(key=lambda c: c[:2])
+    kept_boxes, kept_scores = [], []
+    for _, neg_score, box in candidates:
+        if all(box_overlap(box, kept) <= max_overlap for kept in kept_boxes):
+            kept_boxes.append(box)
+            kept_scores.append(-neg_score)
+    return kept_boxes, kept_scores
+
+
+class StageTimer:
+    """按阶段记录耗时：赋给引擎的stage_timer后，检测、裁剪、识别各阶段每调用一次记一笔；
+    counts为计数（如识别级联中轻量模型直接采用、转交完整模型的裁剪图数）"""
+
+    def __init__(self):
+        self.samples = {}
+        self.counts = {}
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def inc(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def reset(self):
+        self.samples = {}
+        self.counts = {}
+
+
+class ShipPlateEngine:
+    """无界面的船牌检测识别引擎，模型只加载一次，可批量处理图片"""
+
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_CONFIG)
+        if config:
+            self.config.update(config)
+        device = self.config['device']
+        if device not in ('auto', 'cpu', 'gpu'):
+            raise ValueError('未知的设备类型: %s' % device)
+        if self.config['det_mode'] not in DET_MODES:
+            raise ValueError('未知的检测模式: %s' % self.config['det_mode'])
+        if self.config['det_postprocess'] not in ('paddle', 'fast'):
+            raise ValueError('未知的DB后处理实现: %s' % self.config['det_postprocess'])
+        backend = self.config['backend']
+        if backend not in BACKENDS:
+            raise ValueError('未知的推理后端: %s' % backend)
+        self.fast_postprocess = FastDBPostProcess(
+            thresh=self.config['det_db_thresh'], box_thresh=self.config['det_db_box_thresh'],
+            unclip_ratio=self.config['det_db_unclip_ratio'])
+        self._fingerprint = None
+        self.stage_timer = None  # 需要分阶段耗时时设为StageTimer
+        if backend == 'paddle':
+            self.use_gpu = device == 'gpu' or (device == 'auto' and gpu_available())
+            self.runtime = None
+            from paddleocr import PaddleOCR
+            options = dict(
+                det_model_dir=self.config['det_model_dir'],
+                rec_model_dir=self.config['rec_model_dir'],
+                det_limit_side_len=self.config['det_limit_side_len'],
+                det_db_thresh=self.config['det_db_thresh'],
+                det_db_box_thresh=self.config['det_db_box_thresh'],
+                det_db_unclip_ratio=self.config['det_db_unclip_ratio'],
+                use_angle_cls=False,
+                use_gpu=self.use_gpu,
+                cpu_threads=self.config['cpu_threads'],
+                enable_mkldnn=self.config['enable_mkldnn'],
+                rec_batch_num=self.config['rec_batch_num'],
+                drop_score=self.config['drop_score'],
+                show_log=False
+            )
+            self.ocr = PaddleOCR(**options)
+            self.recognizers = {'full': self.ocr.text_recognizer}
+            if self.config['rec_cascade']:
+                # PaddleOCR实例总会带一个检测器，这里只取轻量模型的识别器
+                options['rec_model_dir'] = self.config['rec_light_model_dir']
+                self.recognizers['light'] = PaddleOCR(**options).text_recognizer
+        else:
+            if device == 'gpu':
+                raise ValueError('%s后端只支持CPU' % backend)
+            from onnx_backend import OnnxBackend, PRECISIONS
+            if self.config['onnx_precision'] not in PRECISIONS:
+                raise ValueError('未知的模型精度: %s' % self.config['onnx_precision'])
+            self.use_gpu = False
+            self.ocr = None
+            self.recognizers = None
+            self.runtime = OnnxBackend(self.config)
+
+    @property
+    def fingerprint(self):
+        """模型文件内容和影响结果的配置项的哈希，任一变化时缓存自动失效"""
+        if self._fingerprint is None:
+            h = hashlib.blake2b(digest_size=16)
+            paths = []
+            model_dirs = [self.config['det_model_dir'], self.config['rec_model_dir']]
+            kinds = ['det', 'rec']
+            if self.config['rec_cascade']:
+                model_dirs.append(self.config['rec_light_model_dir'])
+                kinds.append('rec_light')
+            for model_dir in model_dirs:
+                paths.extend(os.path.join(model_dir, name) for name in sorted(os.listdir(model_dir)))
+            if self.config['backend'] != 'paddle':
+                from onnx_backend import model_path
+                # 只计入实际加载的ONNX文件，生成INT8模型不会让FP32的缓存失效
+                paths.extend(model_path(self.config['onnx_model_dir'], kind, self.config['onnx_precision'])
+                             for kind in kinds)
+            for path in paths:
+                if not os.path.isfile(path):
+                    continue
+                h.update(os.path.basename(path).encode('utf-8'))
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        h.update(chunk)
+            options = {k: v for k, v in self.config.items()
+                       if k not in RUNTIME_ONLY_KEYS and not k.endswith('_model_dir')}
+            h.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    @property
+    def model_version(self):
+        """写入识别记录的模型版本：后端、精度和指纹前12位，如 paddle:3f2a9c01d4e5"""
+        backend = self.config['backend']
+        if backend != 'paddle':
+            backend += '-' + self.config['onnx_precision']
+        return '%s:%s' % (backend, self.fingerprint[:12])
+
+    def det_preprocess(self, img, limit_side_len=None):
+        """检测前处理（同DetResizeForTest+NormalizeImage：长边不超过limit_side_len，
+        宽高取32的倍数），返回(CHW张量, [原高, 原宽, 高缩放比, 宽缩放比])"""
+        limit_side_len = limit_side_len or self.config['det_limit_side_len']
+        h, w = img.shape[:2]
+        ratio = float(limit_side_len) / max(h, w) if max(h, w) > limit_side_len else 1.0
+        resize_h = max(int(round(int(h * ratio) / 32) * 32), 32)
+        resize_w = max(int(round(int(w * ratio) / 32) * 32), 32)
+        resized = cv2.resize(img, (resize_w, resize_h))
+        tensor = (resized.astype(np.float32) * np.float32(1.0 / 255.0) - DET_MEAN) / DET_STD
+        shape = np.array([h, w, resize_h / float(h), resize_w / float(w)])
+        return tensor.transpose((2, 0, 1)), shape
+
+    def det_infer(self, batch):
+        """运行检测模型，输入NCHW，返回概率图(N, 1, H, W)"""
+        if self.runtime is not None:
+            return self.runtime.run_det(batch)
+        det = self.ocr.text_detector
+        det.input_tensor.copy_from_cpu(np.ascontiguousarray(batch))
+        det.predictor.run()
+        return det.output_tensors[0].copy_to_cpu()
+
+    def det_postprocess(self, prob_map, shape):
+        """DB后处理：单张概率图(H, W)转成原图坐标下的检测框和检测分数"""
+        if self.ocr is None or self.config['det_postprocess'] == 'fast':
+            post = self.fast_postprocess
+        else:
+            post = self.ocr.text_detector.postprocess_op
+        src_h, src_w = int(shape[0]), int(shape[1])
+        mask = prob_map > post.thresh
+        if post.dilation_kernel is not None:
+            mask = cv2.dilate(mask.astype(np.uint8), post.dilation_kernel)
+        boxes, scores = post.boxes_from_bitmap(prob_map, mask, src_w, src_h)
+        return self._filter_boxes(boxes, scores, src_h, src_w)
+
+    @staticmethod
+    def _filter_boxes(boxes, scores, img_h, img_w):
+        """角点排序、裁到图像范围内并去掉过小的框，检测分数随框保留"""
+        kept_boxes, kept_scores = [], []
+        for box, score in zip(boxes, scores):
+            box = order_points_clockwise(np.asarray(box, dtype=np.float32))
+            box[:, 0] = np.clip(box[:, 0], 0, img_w - 1).astype(np.int32)
+            box[:, 1] = np.clip(box[:, 1], 0, img_h - 1).astype(np.int32)
+            if int(np.linalg.norm(box[0] - box[1])) <= 3 or int(np.linalg.norm(box[0] - box[3])) <= 3:
+                continue
+            kept_boxes.append(box)
+            kept_scores.append(float(score))
+        return kept_boxes, kept_scores
+
+    def _timed(self, stage, t0):
+        """记录从t0到现在的耗时，返回当前时间作为下一阶段的起点"""
+        t1 = time.perf_counter()
+        if self.stage_timer is not None:
+            self.stage_timer.add(stage, t1 - t0)
+        return t1
+
+    def _detect_once(self, img, limit_side_len):
+        """按指定分辨率检测一次，返回(检测框列表, 检测分数列表, 缩放比)"""
+        t0 = time.perf_counter()
+        tensor, shape = self.det_preprocess(img, limit_side_len)
+        t0 = self._timed('det_preprocess', t0)
+        prob_map = self.det_infer(tensor[np.newaxis])[0, 0]
+        t0 = self._timed('det_infer', t0)
+        boxes, scores = self.det_postprocess(prob_map, shape)
+        self._timed('db_postprocess', t0)
+        return boxes, scores, min(shape[2], shape[3])
+
+    def _detect_adaptive(self, img, opts):
+        """由粗到细检测：先低分辨率检测，小目标所在区域再按完整分辨率裁剪重检"""
+        full_side = opts['det_limit_side_len']
+        coarse_side = opts['det_coarse_side_len']
+        h, w = img.shape[:2]
+        if max(h, w) <= coarse_side or coarse_side >= full_side:
+            return self._detect_once(img, full_side)[:2]
+        boxes, scores, ratio = self._detect_once(img, coarse_side)
+        if not boxes:
+            # 粗检什么都没找到，可能船牌太小，退回完整分辨率
+            return self._detect_once(img, full_side)[:2]
+
+        kept_boxes, kept_scores, regions = [], [], []
+        margin = opts['det_refine_margin']
+        for box, score in zip(boxes, scores):
+            x1, y1, x2, y2 = box_rect(box)
+            if (y2 - y1) * ratio >= opts['det_refine_min_height']:
+                kept_boxes.append(box)
+                kept_scores.append(score)
+                continue
+            mx, my = (x2 - x1) * margin + 16, (y2 - y1) * margin + 16
+            regions.append([max(0, int(x1 - mx)), max(0, int(y1 - my)),
+                            min(w, int(x2 + mx) + 1), min(h, int(y2 + my) + 1)])
+
+        # 相互重叠的细检区域合并，避免同一块区域检测两次
+        merged = []
+        for region in sorted(regions):
+            if merged and region[0] <= merged[-1][2] and region[1] <= merged[-1][3] \
+                    and region[3] >= merged[-1][1]:
+                last = merged[-1]
+                merged[-1] = [min(last[0], region[0]), min(last[1], region[1]),
+                              max(last[2], region[2]), max(last[3], region[3])]
+            else:
+                merged.append(region)
+
+        for x1, y1, x2, y2 in merged:
+            # 裁剪区域比整图小，按同样的长边上限检测时分辨率不低于完整检测
+            sub_boxes, sub_scores, _ = self._detect_once(img[y1:y2, x1:x2], full_side)
+            for box, score in zip(sub_boxes, sub_scores):
+                box = box + np.float32([x1, y1])
+                if all(box_iou(box, kept) < 0.5 for kept in kept_boxes):
+                    kept_boxes.append(box)
+                    kept_scores.append(score)
+        return kept_boxes, kept_scores
+
+    def _detect_tiled(self, img, opts):
+        """分块检测：超大图切成重叠的分块，每块按原分辨率检测（不缩小，远处的小船牌不会只剩几个像素），
+        每次det_tile_batch块成批推理，检测时的峰值内存与原图大小无关。
+        紧贴分块内侧边缘的框视为被截断，最后与整图检测的结果一起合并去重"""
+        tile, overlap = opts['det_tile_size'], opts['det_tile_overlap']
+        if not 0 <= overlap < tile:
+            raise ValueError('分块重叠像素数应在0到分块边长之间: %s' % overlap)
+        h, w = img.shape[:2]
+        if max(h, w) <= opts['det_tile_min_side']:
+            return self._detect_once(img, opts['det_limit_side_len'])[:2]
+        boxes, scores, tiers = [], [], []
+        if opts['det_tile_global']:
+            boxes, scores = self._detect_once(img, opts['det_limit_side_len'])[:2]
+            tiers = [1] * len(boxes)
+        tiles = [(x, y) for y in tile_starts(h, tile, overlap) for x in tile_starts(w, tile, overlap)]
+        batch_num = max(1, opts['det_tile_batch'])
+        for start in range(0, len(tiles), batch_num):
+            chunk = tiles[start:start + batch_num]
+            t0 = time.perf_counter()
+            # 各分块大小相同（图像某一边小于分块边长时该边取整边），缩放后尺寸一致，可以拼成一批
+            inputs = [self.det_preprocess(img[y:y + tile, x:x + tile], tile) for x, y in chunk]
+            batch = np.stack([tensor for tensor, _ in inputs])
+            t0 = self._timed('det_preprocess', t0)
+            prob_maps = self.det_infer(batch)
+            t0 = self._timed('det_infer', t0)
+            del batch
+            for (x, y), (_, shape), prob_map in zip(chunk, inputs, prob_maps):
+                tile_h, tile_w = int(shape[0]), int(shape[1])
+                # 分块的内侧边缘（不是原图边缘），框贴着它说明船牌可能被切开
+                inner = (x > 0, y > 0, x + tile_w < w, y + tile_h < h)
+                for box, score in zip(*self.det_postprocess(prob_map[0], shape)):
+                    x1, y1, x2, y2 = box_rect(box)
+                    cut = (inner[0] and x1 <= 2) or (inner[1] and y1 <= 2) or \
+                        (inner[2] and x2 >= tile_w - 3) or (inner[3] and y2 >= tile_h - 3)
+                    boxes.append(box + np.float32([x, y]))
+                    scores.append(score)
+                    tiers.append(2 if cut else 0)
+            self._timed('db_postprocess', t0)
+        t0 = time.perf_counter()
+        boxes, scores = merge_tile_boxes(boxes, scores, tiers)
+        self._timed('det_merge', t0)
+        return boxes, scores
+
+    def detect_with_scores(self, img, options=None):
+        """文本检测，返回排好序的(检测框列表, 检测分数列表)；options可按摄像头覆盖检测参数"""
+        opts = dict(self.config, **options) if options else self.config
+        if opts['det_mode'] == 'adaptive':
+            boxes, scores = self._detect_adaptive(img, opts)
+        elif opts['det_mode'] == 'tiled':
+            boxes, scores = self._detect_tiled(img, opts)
+        else:
+            boxes, scores = self._detect_once(img, opts['det_limit_side_len'])[:2]
+        order = sorted_box_indices(boxes)
+        return [boxes[k] for k in order], [scores[k] for k in order]
+
+    def detect_many(self, images, options=None):
+        """批量检测，返回与images等长的[(检测框列表, 检测分数列表) 或 None, ...]和每张的检测耗时。
+        full模式下缩放后尺寸相同的图片拼成一批送入检测模型（每批最多det_batch_num张，
+        耗时按张数分摊），adaptive/tiled模式和只有一张的尺寸逐张检测；images中的None跳过"""
+        options = options or [None] * len(images)
+        detections, times = [None] * len(images), [0.0] * len(images)
+        groups = {}  # 缩放后尺寸 -> [(下标, 张量, 缩放信息), ...]
+        batch_num = max(1, self.config['det_batch_num'])
+        for i, (img, opts) in enumerate(zip(images, options)):
+            if img is None:
+                continue
+            opts = dict(self.config, **opts) if opts else self.config
+            if batch_num == 1 or opts['det_mode'] != 'full':
+                t0 = time.perf_counter()
+                detections[i] = self.detect_with_scores(img, opts)
+                times[i] = time.perf_counter() - t0
+                continue
+            t0 = time.perf_counter()
+            tensor, shape = self.det_preprocess(img, opts['det_limit_side_len'])
+            times[i] = self._timed('det_preprocess', t0) - t0
+            groups.setdefault(tensor.shape, []).append((i, tensor, shape))
+        for items in groups.values():
+            for start in range(0, len(items), batch_num):
+                chunk = items[start:start + batch_num]
+                t0 = time.perf_counter()
+                prob_maps = self.det_infer(np.stack([tensor for _, tensor, _ in chunk]))
+                t1 = self._timed('det_infer', t0)
+                for (i, _, shape), prob_map in zip(chunk, prob_maps):
+                    t2 = time.perf_counter()
+                    boxes, scores = self.det_postprocess(prob_map[0], shape)
+                    order = sorted_box_indices(boxes)
+                    detections[i] = [boxes[k] for k in order], [scores[k] for k in order]
+                    times[i] += (t1 - t0) / len(chunk) + self._timed('db_postprocess', t2) - t2
+        return detections, times
+
+    def detect(self, img):
+        """文本检测，返回排好序的检测框列表"""
+        return self.detect_with_scores(img)[0]
+
+    def rec_infer(self, batch, model='full'):
+        """运行识别模型（model为REC_MODELS之一），输入NCHW，返回每一步各字符的概率(N, T, 类别数)"""
+        if self.runtime is not None:
+            return self.runtime.run_rec(batch, model)
+        rec = self.recognizers[model]
+        rec.input_tensor.copy_from_cpu(np.ascontiguousarray(batch))
+        rec.predictor.run()
+        return rec.output_tensors[0].copy_to_cpu()
+
+    def rec_decode(self, probs, model='full'):
+        """CTC解码，返回[(文本, 分数), ...]"""
+        if self.runtime is not None:
+            return ctc_decode(probs, self.runtime.charset(probs.shape[2], model))
+        return ctc_decode(probs, self.recognizers[model].postprocess_op.character)
+
+    def _recognize_with(self, model, crops, indices, results):
+        """用指定模型识别crops中下标为indices的裁剪图，结果按下标写入results。
+        轻量模型的前处理和推理耗时记在rec_light_前缀的阶段下"""
+        _, img_h, img_w = REC_IMAGE_SHAPE
+        prefix = 'rec_light_' if model == 'light' else 'rec_'
+        ratios = [crops[i].shape[1] / float(crops[i].shape[0]) for i in indices]
+        for batch_idx in plan_rec_batches(ratios, self.config['rec_batching'], self.config['rec_batch_num'],
+                                          self.config['rec_batch_budget_mb'], self.config['rec_bucket_spread']):
+            t0 = time.perf_counter()
+            max_wh_ratio = max([img_w / img_h] + [ratios[j] for j in batch_idx])
+            batch = np.stack([rec_resize_norm(crops[indices[j]], max_wh_ratio) for j in batch_idx])
+            t0 = self._timed(prefix + 'preprocess', t0)
+            probs = self.rec_infer(batch, model)
+            t0 = self._timed(prefix + 'infer', t0)
+            for j, res in zip(batch_idx, self.rec_decode(probs, model)):
+                results[indices[j]] = res
+            self._timed('ctc_decode', t0)
+
+    def recognize_routed(self, crops):
+        """文本识别，返回([(文本, 分数), ...], [每张裁剪图最终采用的模型, ...])。
+        开启rec_cascade时先用轻量模型识别全部裁剪图，分数低于rec_cascade_score的再用完整模型识别，
+        两类裁剪图数计入stage_timer的rec_light_accepted、rec_fallbacks"""
+        indices = list(range(len(crops)))
+        results = [None] * len(crops)
+        if not self.config['rec_cascade']:
+            self._recognize_with('full', crops, indices, results)
+            return results, ['full'] * len(crops)
+        self._recognize_with('light', crops, indices, results)
+        fallback = [i for i in indices if results[i][1] < self.config['rec_cascade_score']]
+        if fallback:
+            self._recognize_with('full', crops, fallback, results)
+        routes = ['light'] * len(crops)
+        for i in fallback:
+            routes[i] = 'full'
+        if self.stage_timer is not None:
+            self.stage_timer.inc('rec_light_accepted', len(crops) - len(fallback))
+            self.stage_timer.inc('rec_fallbacks', len(fallback))
+        return results, routes
+
+    def recognize(self, crops):
+        """文本识别（同PaddleOCR TextRecognizer的前后处理，每批宽度取批内最宽的比例），
+        按rec_batching分批，返回[(文本, 分数), ...]，顺序与输入一致"""
+        return self.recognize_routed(crops)[0]
+
+    def rank_candidates(self, img, boxes, det_scores):
+        """selective模式下按 检测分数 x 船牌形状得分 从高到低排列候选框下标"""
+        ranks = [det_score * plate_likeness(box, img.shape) for box, det_score in zip(boxes, det_scores)]
+        return sorted(range(len(boxes)), key=lambda k: -ranks[k])
+
+    def process_images(self, images, options=None):
+        """批量检测识别：逐张检测，每一轮所有图片的裁剪图合并成一次识别调用。
+        all模式只有一轮，识别全部检测框；selective模式先识别排名靠前的候选框，
+        最高得分仍低于rec_accept_score的图片再识别下一批候选。
+        options为与images等长的列表，逐张覆盖检测参数（摄像头配置）"""
+        selective = self.config['rec_mode'] == 'selective'
+        top_k = self.config['rec_top_k']
+        results, states = [], []
+        detections, det_times = self.detect_many(images, options)
+        for img, detection, det_time in zip(images, detections, det_times):
+            result = {'text': '', 'score': 0.0, 'det_score': 0.0, 'box': None, 'regions': [],
+                      'timings': {'det': det_time, 'crop': 0.0, 'rec': 0.0}}
+            results.append(result)
+            if img is None:
+                states.append(None)
+                continue
+            boxes, det_scores = detection
+            if selective:
+                order = self.rank_candidates(img, boxes, det_scores)[:self.config['rec_max_candidates']]
+            else:
+                order = list(range(len(boxes)))
+            states.append({'img': img, 'boxes': boxes, 'det_scores': det_scores,
+                           'order': order, 'next': 0, 'recognized': {}, 'routes': {}})
+
+        while True:
+            batch, crops = [], []
+            for result, state in zip(results, states):
+                if state is None or state['next'] >= len(state['order']):
+                    continue
+                if state['recognized'] and max(s for _, s in state['recognized'].values()) \
+                        >= self.config['rec_accept_score']:
+                    continue
+                step = top_k if selective else len(state['order'])
+                t0 = time.perf_counter()
+                for k in state['order'][state['next']:state['next'] + step]:
+                    batch.append((result, state, k))
+                    crops.append(get_rotate_crop_image(state['img'], state['boxes'][k]))
+                result['timings']['crop'] += self._timed('crop', t0) - t0
+                state['next'] += step
+            if not crops:
+                break
+            t0 = time.perf_counter()
+            rec_res, routes = self.recognize_routed(crops)
+            rec_time = time.perf_counter() - t0
+            for (result, state, k), rec, route in zip(batch, rec_res, routes):
+                state['recognized'][k] = rec
+                state['routes'][k] = route
+                # 识别是整批完成的，按裁剪图数量分摊耗时
+                result['timings']['rec'] += rec_time / len(crops)
+
+        for result, state in zip(results, states):
+            if state is None:
+                continue
+            result['candidates'] = len(state['boxes'])
+            result['recognized'] = len(state['recognized'])
+            if self.config['keep_detections']:
+                result['detections'] = [{'box': np.asarray(box).tolist(), 'det_score': det_score}
+                                        for box, det_score in zip(state['boxes'], state['det_scores'])]
+            if self.config['rec_cascade']:
+                routes = list(state['routes'].values())
+                result['rec_routes'] = {model: routes.count(model) for model in REC_MODELS}
+            # 按检测框原有顺序输出
+            for k in sorted(state['recognized']):
+                text, score = state['recognized'][k]
+                if score >= self.config['drop_score']:
+                    region = {'text': text, 'score': score, 'det_score': state['det_scores'][k],
+                              'box': np.asarray(state['boxes'][k]).tolist()}
+                    if self.config['rec_cascade']:
+                        region['rec_model'] = state['routes'][k]  # 该区域的文本由哪个识别模型给出
+                    result['regions'].append(region)
+            # 与原界面逻辑一致：取识别得分最高的文本区域作为船牌
+            if result['regions']:
+                best = max(result['regions'], key=lambda r: r['score'])
+                result['text'] = best['text']
+                result['score'] = best['score']
+                result['det_score'] = best['det_score']
+                result['box'] = best['box']
+        return results
+
+    def process_image(self, img):
+        """处理单张图片"""
+        return self.process_images([img])[0]
+
+    def warmup(self):
+        """用空白图各跑一次检测和识别：推理库在首次调用时分配内存、选择算子实现，
+        提前做掉可以让第一张真实图片不再额外等待。返回耗时(秒)"""
+        t0 = time.perf_counter()
+        side = self.config['det_limit_side_len']
+        self.detect(np.zeros((side * 9 // 16, side, 3), dtype=np.uint8))
+        self.recognize([np.zeros((REC_IMAGE_SHAPE[1], REC_IMAGE_SHAPE[2], 3), dtype=np.uint8)])
+        return time.perf_counter() - t0
+
+
+def recognize_paths(engine, paths, cache=None, profiles=None, crops=None):
+    """解码一批图片文件并检测识别，返回可直接序列化的结果记录列表；
+    传入cache时先按内容哈希查缓存，命中的图片不解码也不推理；
+    profiles为摄像头配置列表，按路径匹配后覆盖检测参数；
+    传入crops(CropStore)时保存船牌的识别输入裁剪图，记录的crop字段为其引用"""
+    records = [None] * len(paths)
+    pending, images, decode_times, options = [], [], [], []
+    for i, path in enumerate(paths):
+        t0 = time.perf_counter()
+        data = read_file(path)
+        profile = match_camera_profile(path, profiles)
+        key = None
+        if cache is not None and data:
+            # 摄像头配置不同，检测结果也可能不同，一并计入缓存键
+            key = content_hash(data + json.dumps(profile, sort_keys=True).encode('utf-8') if profile else data)
+        if key is not None:
+            cached = cache.get(key)
+            if cached is not None and crops is not None and cached['box'] and not crops.exists(cached.get('crop')):
+                cached = None  # 缓存的结果在当前裁剪图目录中没有裁剪图，重新识别
+            if cached is not None:
+                cached.update(image=path, cached=True, model_version=engine.model_version,
+                              timings={'cache': time.perf_counter() - t0, 'total': time.perf_counter() - t0})
+                records[i] = cached
+                continue
+        images.append(decode_image(data))
+        decode_times.append(time.perf_counter() - t0)
+        options.append(profile)
+        pending.append((i, path, key))
+
+    results = engine.process_images(images, options) if images else []
+    for (i, path, key), img, decode_time, result in zip(pending, images, decode_times, results):
+        timings = result['timings']
+        timings['decode'] = decode_time
+        timings['total'] = sum(timings.values())
+        record = {'image': path, 'text': result['text'], 'score': result['score'],
+                  'det_score': result['det_score'], 'box': result['box'], 'regions': result['regions'],
+                  'model_version': engine.model_version, 'timings': timings}
+        for field in OPTIONAL_RESULT_FIELDS:
+            if field in result:
+                record[field] = result[field]
+        if img is None:
+            record['error'] = '无法读取图片'
+            records[i] = record
+            continue
+        if crops is not None and result['box']:
+            t0 = time.perf_counter()
+            record['crop'] = crops.put(get_rotate_crop_image(img, result['box']))
+            timings['crop_store'] = time.perf_counter() - t0
+            timings['total'] += timings['crop_store']
+        if key is not None:
+            cache.put(key, record)
+        records[i] = record
+    return records
@@ -0,0 +1,83 @@
+import os
+import multiprocessing
+
+import cv2
+
+from ocr_engine import ShipPlateEngine, recognize_paths
+from result_cache import ResultCache
+from crop_store import CropStore
+
+# 控制各数学库线程数的环境变量，需在子进程导入paddle之前生效
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+_engine = None  # 每个子进程各自持有一个引擎
+_cache = None
+_profiles = None
+_crops = None
+
+
+def _init_worker(config, threads, cache_path, cache_size, profiles, crop_dir, crop_format):
+    global _engine, _cache, _profiles, _crops
+    _profiles = profiles
+    if crop_dir:
+        _crops = CropStore(crop_dir, crop_format)
+    cv2.setNumThreads(1)
+    config = dict(config or {})
+    config['cpu_threads'] = threads
+    _engine = ShipPlateEngine(config)
+    if cache_path:
+        _cache = ResultCache.for_engine(_engine, cache_path, cache_size)
+
+
+def _run_chunk(paths):
+    return recognize_paths(_engine, paths, _cache, _profiles, _crops)
+
+
+class OcrProcessPool:
+    """多进程识别池：每个进程只加载一次模型，共享输入队列，结果按提交顺序返回"""
+
+    def __init__(self, config=None, workers=None, threads_per_worker=None, chunk_size=4,
+                 cache_path=None, cache_size=100000, profiles=None, crop_dir=None, crop_format='png'):
+        cpu_count = os.cpu_count() or 1
+        if threads_per_worker is None:
+            threads_per_worker = 1 if workers is None else max(1, cpu_count // workers)
+        if workers is None:
+            workers = max(1, cpu_count // threads_per_worker)
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.chunk_size = chunk_size
+
+        # 子进程启动时继承父进程的环境变量，借此固定每个进程的线程数
+        saved = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+        for name in THREAD_ENV_VARS:
+            os.environ[name] = str(threads_per_worker)
+        try:
+            ctx = multiprocessing.get_context('spawn')
+            self.pool = ctx.Pool(workers, initializer=_init_worker,
+                                 initargs=(config, threads_per_worker, cache_path, cache_size, profiles,
+                                           crop_dir, crop_format))
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    def imap(self, paths):
+        """逐条产出识别记录，顺序与paths一致"""
+        chunks = [paths[i:i + self.chunk_size] for i in range(0, len(paths), self.chunk_size)]
+        for records in self.pool.imap(_run_chunk, chunks):
+            yield from records
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.pool.terminate()
@@ -0,0 +1,482 @@
+import os
+import sys
+import json
+import time
+import base64
+import asyncio
+import argparse
+import threading
+import http.client
+import concurrent.futures
+from urllib.parse import urlsplit
+
+from ocr_engine import ShipPlateEngine, DEFAULT_CONFIG, BACKENDS, BASE_DIR, decode_image, list_images, read_file
+from metrics import Metrics
+
+DEFAULT_PORT = 8765
+MAX_BODY = 32 * 1024 * 1024  # 上传图片的大小上限
+IDLE_TIMEOUT = 60.0  # 长连接空闲多久后关闭
+READ_TIMEOUT = 30.0  # 收完一个请求的请求头和请求体的时限
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           408: 'Request Timeout', 411: 'Length Required', 413: 'Payload Too Large', 500: 'Internal Server Error',
+           503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+
+class ServiceError(Exception):
+    """以指定HTTP状态码返回给调用方的错误"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:
+    """把并发请求攒成小批交给引擎：第一张图到达后最多再等max_wait秒或攒满max_batch张，
+    在唯一的推理线程中调用一次process_images。检测按缩放后尺寸分组成批（det_batch_num），
+    这一批所有请求的裁剪图合并成一次识别调用。推理进行时下一批在队列中继续攒。
+    排队数超过max_pending时直接拒绝，不让积压无限增长"""
+
+    def __init__(self, config, max_batch=8, max_wait=0.01, max_pending=64, metrics=None):
+        self.config = dict(config or {})
+        self.config.setdefault('det_batch_num', max_batch)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.metrics = metrics
+        self.engine = None
+        self.load_error = None
+        self.pending = 0
+        self.batches = 0
+        self.batched_images = 0
+        self.queue = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='ocr-infer')
+
+    @property
+    def ready(self):
+        return self.engine is not None and self.pending < self.max_pending
+
+    async def start(self):
+        """在推理线程中加载模型并预热，之后开始处理队列；加载失败时服务仍在，/readyz返回错误信息"""
+        self.queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        try:
+            self.engine = await loop.run_in_executor(self._executor, self._load)
+        except Exception as e:
+            self.load_error = '模型加载失败: %s' % e
+            print(self.load_error, file=sys.stderr)
+            return
+        await self.run()
+
+    def _load(self):
+        engine = ShipPlateEngine(self.config)
+        engine.warmup()
+        if self.metrics is not None:
+            engine.stage_timer = self.metrics
+        return engine
+
+    async def submit(self, img):
+        """加入一张图片，返回识别结果；排队已满时抛出503"""
+        if self.engine is None:
+            raise ServiceError(503, self.load_error or '模型加载中')
+        if self.pending >= self.max_pending:
+            if self.metrics is not None:
+                self.metrics.inc('requests_rejected')
+            raise ServiceError(503, '排队已满（%d），请稍后重试' % self.max_pending)
+        future = asyncio.get_running_loop().create_future()
+        self.pending += 1
+        self.queue.put_nowait((img, future, time.perf_counter()))
+        try:
+            return await future
+        finally:
+            self.pending -= 1
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # 已经超时放弃的请求不再推理
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self.engine.process_images, [img for img, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.batched_images += len(batch)
+            if self.metrics is not None:
+                self.metrics.inc('batches')
+            for (_, future, queued), result in zip(batch, results):
+                result['timings']['queue'] = started - queued
+                result['batch_size'] = len(batch)
+                if not future.done():
+                    future.set_result(result)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class OcrService:
+    """本机HTTP识别服务（asyncio，HTTP/1.1长连接）：
+    POST /recognize  请求体为图片文件字节，或JSON {"path": 本机图片路径} / {"image": base64}
+    GET  /healthz    进程存活即返回200
+    GET  /readyz     模型已就绪且排队未满时返回200，否则503
+    GET  /metrics    Prometheus格式的性能指标"""
+
+    def __init__(self, config=None, host='127.0.0.1', port=DEFAULT_PORT, max_batch=8, max_wait=0.01,
+                 max_pending=64, timeout=30.0, decode_threads=2):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.metrics = Metrics()
+        self.batcher = MicroBatcher(config, max_batch, max_wait, max_pending, self.metrics)
+        self.metrics.gauge('queue_depth', lambda: self.batcher.pending, '排队中的识别请求数')
+        self._decode_pool = concurrent.futures.ThreadPoolExecutor(decode_threads, thread_name_prefix='decode')
+        self._connections = set()  # 各连接的处理任务，关闭时一并取消
+        self._batcher_task = None
+        self.server = None
+
+    async def start(self):
+        """开始监听并在后台加载模型，返回实际端口（port=0时由系统分配）"""
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._batcher_task = asyncio.ensure_future(self.batcher.start())
+        return self.port
+
+    async def serve_forever(self):
+        await self.start()
+        print('识别服务 http://%s:%d/recognize' % (self.host, self.port), file=sys.stderr)
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        """停止监听，断开现有连接并停止攒批"""
+        self.server.close()
+        tasks = list(self._connections) + [self._batcher_task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.server.wait_closed()
+        self.batcher.close()
+        self._decode_pool.shutdown(wait=False)
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not line.strip():
+                    break
+                keep_alive = await self._handle_request(line, reader, writer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _handle_request(self, line, reader, writer):
+        """处理一个请求并写出响应，返回是否保持连接"""
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            self._respond(writer, 400, {'error': '请求行格式错误'}, False)
+            return False
+        try:
+            headers, body = await self._read_request(reader)
+        except asyncio.TimeoutError:
+            self._respond(writer, 408, {'error': '读取请求超时'}, False)
+            return False
+        except ServiceError as e:
+            self._respond(writer, e.status, {'error': str(e)}, False)
+            return False
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+        try:
+            status, payload = await self._dispatch(method, urlsplit(target).path, headers, body)
+        except ServiceError as e:
+            status, payload = e.status, {'error': str(e)}
+        except Exception as e:
+            status, payload = 500, {'error': '%s: %s' % (type(e).__name__, e)}
+        self._respond(writer, status, payload, keep_alive)
+        return keep_alive
+
+    async def _read_request(self, reader):
+        """在READ_TIMEOUT内读完请求头和请求体，超时抛出asyncio.TimeoutError"""
+        # 请求头和请求体共用一个截止时间，慢速发送或Content-Length大于实际数据的客户端不会一直占着连接
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + READ_TIMEOUT
+        headers = {}
+        while True:
+            header = await asyncio.wait_for(reader.readline(), max(deadline - loop.time(), 0))
+            if header in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = header.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise ServiceError(411, '不支持分块传输，请给出Content-Length')
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise ServiceError(400, 'Content-Length无效')
+        if length > MAX_BODY:
+            raise ServiceError(413, '请求体超过 %d 字节' % MAX_BODY)
+        body = b''
+        if length:
+            body = await asyncio.wait_for(reader.readexactly(length), max(deadline - loop.time(), 0))
+        return headers, body
+
+    def _respond(self, writer, status, payload, keep_alive):
+        if isinstance(payload, str):
+            body, content_type = payload.encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode('utf-8'), \
+                'application/json; charset=utf-8'
+        head = 'HTTP/1.1 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: %s\r\n\r\n' % (
+            status, REASONS.get(status, ''), content_type, len(body), 'keep-alive' if keep_alive else 'close')
+        writer.write(head.encode('latin-1') + body)
+
+    async def _dispatch(self, method, path, headers, body):
+        if path == '/healthz':
+            return 200, {'status': 'ok'}
+        if path == '/readyz':
+            batcher = self.batcher
+            payload = {'ready': batcher.ready, 'pending': batcher.pending, 'max_pending': batcher.max_pending}
+            if batcher.engine is not None:
+                payload['model_version'] = batcher.engine.model_version
+            elif batcher.load_error:
+                payload['error'] = batcher.load_error
+            return (200 if batcher.ready else 503), payload
+        if path == '/metrics':
+            return 200, self.metrics.render()
+        if path != '/recognize':
+            raise ServiceError(404, '未知路径: %s' % path)
+        if method != 'POST':
+            raise ServiceError(405, '/recognize 只接受POST')
+        return 200, await self.recognize(headers, body)
+
+    async def recognize(self, headers, body):
+        t0 = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        if headers.get('content-type', '').startswith('application/json'):
+            try:
+                request = json.loads(body)
+            except ValueError:
+                raise ServiceError(400, '请求体不是有效的JSON')
+            if not isinstance(request, dict):
+                raise ServiceError(400, 'JSON请求体应为对象')
+            if 'path' in request:
+                if not isinstance(request['path'], str):
+                    raise ServiceError(400, 'path字段应为字符串')
+                data = await loop.run_in_executor(self._decode_pool, read_file, request['path'])
+                if data is None:
+                    raise ServiceError(400, '无法读取文件: %s' % request['path'])
+            elif 'image' in request:
+                try:
+                    data = base64.b64decode(request['image'], validate=True)
+                except (TypeError, ValueError):
+                    raise ServiceError(400, 'image字段不是有效的base64')
+            else:
+                raise ServiceError(400, 'JSON请求需要path或image字段')
+        else:
+            data = body
+        if not data:
+            raise ServiceError(400, '没有图片数据')
+        # 解码在线程池中进行，不阻塞事件循环
+        img = await loop.run_in_executor(self._decode_pool, decode_image, data)
+        if img is None:
+            raise ServiceError(400, '无法解码图片')
+        decode_time = time.perf_counter() - t0
+        try:
+            result = await asyncio.wait_for(self.batcher.submit(img), self.timeout)
+        except asyncio.TimeoutError:
+            self.metrics.inc('requests_timed_out')
+            raise ServiceError(504, '识别超时（%.1fs）' % self.timeout)
+        except ServiceError:
+            raise
+        except Exception:
+            self.metrics.inc('errors')
+            raise
+        timings = result['timings']
+        timings['decode'] = decode_time
+        timings['total'] = time.perf_counter() - t0
+        self.metrics.observe('decode', decode_time)
+        self.metrics.observe('total', timings['total'])
+        self.metrics.inc('images')
+        return {'text': result['text'], 'score': result['score'], 'det_score': result['det_score'],
+                'box': result['box'], 'regions': result['regions'], 'batch_size': result['batch_size'],
+                'model_version': self.batcher.engine.model_version, 'timings': timings}
+
+
+def post_image(conn, data):
+    """客户端：在已有连接上提交一张图片，返回(状态码, 结果字典)"""
+    conn.request('POST', '/recognize', body=data, headers={'Content-Type': 'application/octet-stream'})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def wait_ready(host, port, timeout=300.0):
+    """轮询 /readyz 直到服务就绪"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        conn = http.client.HTTPConnection(host, port, timeout=5)
+        try:
+            conn.request('GET', '/readyz')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        finally:
+            conn.close()
+        time.sleep(0.1)
+    return False
+
+
+def bench(config, paths, clients, requests, max_batch, max_wait):
+    """在本机起一个服务，clients个客户端并发、各自用长连接提交requests张图片，
+    返回{'images_per_sec', 'latency', 'mean_batch', 'errors'}"""
+    from benchmark import latency_stats
+
+    datas = [read_file(path) for path in paths]
+    service = OcrService(config, port=0, max_batch=max_batch, max_wait=max_wait, max_pending=clients * 2)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(service.start())
+        started.set()
+        loop.run_forever()
+        loop.close()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    started.wait()
+    if not wait_ready('127.0.0.1', service.port):
+        raise RuntimeError('服务未能就绪: %s' % service.batcher.load_error)
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def client(k):
+        conn = http.client.HTTPConnection('127.0.0.1', service.port, timeout=60)
+        for i in range(requests):
+            t0 = time.perf_counter()
+            status, result = post_image(conn, datas[(k * requests + i) % len(datas)])
+            with lock:
+                if status == 200:
+                    latencies.append(time.perf_counter() - t0)
+                else:
+                    errors.append(result.get('error'))
+        conn.close()
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    batcher = service.batcher
+    asyncio.run_coroutine_threadsafe(service.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    return {'images_per_sec': len(latencies) / elapsed, 'latency': latency_stats(latencies),
+            'mean_batch': batcher.batched_images / max(1, batcher.batches), 'errors': errors}
+
+
+def engine_config(args):
+    return {
+        'det_model_dir': args.det_model_dir,
+        'rec_model_dir': args.rec_model_dir,
+        'rec_cascade': args.rec_cascade,
+        'rec_light_model_dir': args.rec_light_model_dir,
+        'rec_cascade_score': args.cascade_score,
+        'device': args.device,
+        'backend': args.backend,
+        'onnx_model_dir': args.onnx_model_dir,
+        'onnx_precision': args.precision,
+        'det_postprocess': args.det_postprocess,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='本机HTTP船牌识别服务：并发请求动态攒批')
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help='启动服务')
+    serve.add_argument('--host', default='127.0.0.1', help='监听地址，默认只接受本机连接')
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--timeout', type=float, default=30.0, help='单个请求的超时秒数，超时返回504')
+    serve.add_argument('--max-pending', type=int, default=64, help='最多排队的请求数，超出时返回503')
+    bench_parser = sub.add_parser('bench', help='在本机起服务并用多个并发客户端压测')
+    bench_parser.add_argument('inputs', nargs='*', default=[os.path.join(BASE_DIR, 'test')])
+    bench_parser.add_argument('--clients', type=int, default=8, help='并发客户端数')
+    bench_parser.add_argument('--requests', type=int, default=10, help='每个客户端的请求数')
+    for p in (serve, bench_parser):
+        p.add_argument('--max-batch', type=int, default=8, help='一批最多的图片数')
+        p.add_argument('--max-wait-ms', type=float, default=10.0, help='第一张图到达后最多等多少毫秒攒批')
+        p.add_argument('--device', choices=['auto', 'cpu', 'gpu'], default='cpu')
+        p.add_argument('--backend', choices=BACKENDS, default=DEFAULT_CONFIG['backend'])
+        p.add_argument('--onnx-model-dir', default=DEFAULT_CONFIG['onnx_model_dir'])
+        p.add_argument('--precision', choices=['fp32', 'int8'], default=DEFAULT_CONFIG['onnx_precision'])
+        p.add_argument('--det-model-dir', default=DEFAULT_CONFIG['det_model_dir'])
+        p.add_argument('--rec-model-dir', default=DEFAULT_CONFIG['rec_model_dir'])
+        p.add_argument('--rec-cascade', action='store_true',
+                       help='识别级联：先用轻量识别模型，置信度低于--cascade-score的裁剪图再用完整模型识别')
+        p.add_argument('--rec-light-model-dir', default=DEFAULT_CONFIG['rec_light_model_dir'])
+        p.add_argument('--cascade-score', type=float, default=DEFAULT_CONFIG['rec_cascade_score'])
+        p.add_argument('--det-postprocess', choices=['paddle', 'fast'], default=DEFAULT_CONFIG['det_postprocess'])
+    args = parser.parse_args(argv)
+    config = engine_config(args)
+
+    if args.command == 'bench':
+        paths = list_images(args.inputs)
+        if not paths:
+            print('没有找到图片', file=sys.stderr)
+            return 1
+        # 与不攒批（每批一张）对比
+        for max_batch in sorted({1, args.max_batch}):
+            report = bench(config, paths, args.clients, args.requests, max_batch, args.max_wait_ms / 1000.0)
+            latency = report['latency']
+            print('max_batch=%d：%.2f 张/秒，平均批大小 %.1f，延迟 p50 %.0fms p95 %.0fms，失败 %d' % (
+                max_batch, report['images_per_sec'], report['mean_batch'], latency.get('p50_ms', 0),
+                latency.get('p95_ms', 0), len(report['errors'])))
+        return 0
+
+    service = OcrService(config, args.host, args.port, args.max_batch, args.max_wait_ms / 1000.0,
+                         args.max_pending, args.timeout)
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
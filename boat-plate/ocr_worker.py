@@ -0,0 +1,194 @@
+import time
+import queue
+import itertools
+import threading
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+
+from result_cache import DEFAULT_CACHE_PATH
+
+# 界面显示用图片的最大尺寸：原图在识别线程中一次缩小到这个范围内，界面线程只需再缩放到标签大小
+DISPLAY_SIZE = (1280, 960)
+
+
+def rgb_pixmap(rgb):
+    """把RGB图像（识别结果中的display/plate）转成QPixmap。QImage直接引用数组内存、不拷贝，
+    随即由QPixmap.fromImage拷贝成独立的像素图，数组只需在本函数内保持有效"""
+    h, w = rgb.shape[:2]
+    q_img = QImage(rgb.data, w, h, rgb.strides[0], QImage.Format_RGB888)
+    return QPixmap.fromImage(q_img)
+
+
+def format_startup_report(report):
+    """启动耗时报告，如 '启动 12.3s（窗口 0.4s，导入 2.1s，加载模型 7.6s，预热 2.2s）'"""
+    parts = ['%s %.1fs' % (name, report[key]) for key, name in
+             (('window', '窗口'), ('import', '导入'), ('load', '加载模型'), ('warmup', '预热'))
+             if key in report]
+    return '启动 %.1fs（%s）' % (report['total'], '，'.join(parts))
+
+
+class OcrWorker(QThread):
+    """后台识别线程：维护有界任务队列，识别结果通过信号返回界面线程"""
+    modelWarming = pyqtSignal()  # 模型已加载，开始预热
+    modelReady = pyqtSignal(object)  # 启动耗时报告：{'import', 'load', 'warmup', 'total'}，单位秒
+    modelFailed = pyqtSignal(str)
+    jobStarted = pyqtSignal(int, str)  # 任务号, 图片路径
+    jobFinished = pyqtSignal(int, str, object)  # 任务号, 图片路径, 识别结果
+    jobFailed = pyqtSignal(int, str, str)  # 任务号, 图片路径, 错误信息
+    jobCancelled = pyqtSignal(int, str)
+    progress = pyqtSignal(int, int)  # 已完成数, 本轮提交总数
+
+    def __init__(self, config=None, max_queue=16, cache_path=DEFAULT_CACHE_PATH, metrics=None,
+                 started=None, display_size=DISPLAY_SIZE, parent=None):
+        super().__init__(parent)
+        self.config = config
+        self.display_size = display_size
+        self.started = started  # 进程启动时的time.perf_counter()，报告中的total从这里算起
+        self.cache_path = cache_path  # 为None时不使用结果缓存
+        self.metrics = metrics  # metrics.Metrics，为None时不统计
+        if metrics is not None:
+            metrics.gauge('queue_depth', self.pendingCount, '排队中的识别任务数')
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self._job_ids = itertools.count(1)
+        self._cancelled = set()
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._done = 0
+
+    def submit(self, image_path):
+        """提交一张图片，返回任务号；队列已满时返回None"""
+        job_id = next(self._job_ids)
+        with self._lock:
+            # 上一轮任务全部完成后重新计数
+            if self._done >= self._submitted:
+                self._submitted = self._done = 0
+            try:
+                self.jobs.put_nowait((job_id, image_path))
+            except queue.Full:
+                return None
+            self._submitted += 1
+            self.progress.emit(self._done, self._submitted)
+        return job_id
+
+    def cancel(self, job_id):
+        """取消一个任务，正在识别的任务会丢弃其结果"""
+        with self._lock:
+            self._cancelled.add(job_id)
+
+    def cancelAll(self):
+        """取消所有还在排队的任务"""
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                self.jobCancelled.emit(*job)
+                self._jobDone()
+
+    def pendingCount(self):
+        return self.jobs.qsize()
+
+    def stop(self):
+        """清空队列并结束线程"""
+        self.cancelAll()
+        self.jobs.put(None)
+        self.wait()
+
+    def _jobDone(self):
+        with self._lock:
+            self._done += 1
+            self.progress.emit(self._done, self._submitted)
+
+    def _isCancelled(self, job_id):
+        with self._lock:
+            if job_id in self._cancelled:
+                self._cancelled.discard(job_id)
+                return True
+            return False
+
+    def run(self):
+        # cv2、numpy和推理库都在工作线程内导入，模型也在这里创建，界面线程不必等待；推理也只在该线程中进行
+        t0 = time.perf_counter()
+        report = {}
+        try:
+            import cv2
+            from ocr_engine import (ShipPlateEngine, read_file, decode_image, content_hash, crop_plate,
+                                    get_rotate_crop_image, fit_image)
+            from result_cache import ResultCache
+            t1 = time.perf_counter()
+            report['import'] = t1 - t0
+            engine = ShipPlateEngine(self.config)
+            # SQLite连接只能在创建它的线程中使用，因此缓存也在工作线程内打开
+            cache = ResultCache.for_engine(engine, self.cache_path) if self.cache_path else None
+            report['load'] = time.perf_counter() - t1
+            self.modelWarming.emit()
+            report['warmup'] = engine.warmup()
+        except Exception as e:
+            self.modelFailed.emit(str(e))
+            return
+        report['total'] = time.perf_counter() - (self.started if self.started is not None else t0)
+        metrics = self.metrics
+        if metrics is not None:
+            # 预热之后才开始统计，首次调用的初始化开销不计入各阶段耗时
+            engine.stage_timer = metrics
+            for stage in ('import', 'load', 'warmup'):
+                metrics.observe('startup_' + stage, report[stage])
+        self.modelReady.emit(report)
+
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            job_id, image_path = job
+            if self._isCancelled(job_id):
+                self.jobCancelled.emit(job_id, image_path)
+                self._jobDone()
+                continue
+
+            self.jobStarted.emit(job_id, image_path)
+            start = time.perf_counter()
+            try:
+                data = read_file(image_path)
+                img = decode_image(data)
+                if metrics is not None:
+                    metrics.observe('decode', time.perf_counter() - start)
+                if img is None:
+                    raise ValueError('无法读取图片')
+                # 重复上传的图片直接使用缓存结果
+                key = content_hash(data)
+                result = cache.get(key) if cache is not None else None
+                if metrics is not None and cache is not None:
+                    metrics.inc('cache_misses' if result is None else 'cache_hits')
+                if result is None:
+                    result = engine.process_image(img)
+                    if cache is not None:
+                        cache.put(key, result)
+                # 图片只在这里解码一次，界面显示的原图和船牌都从这份数据生成，界面线程不再读文件。
+                # 两者都经cvtColor得到独立的RGB数组，不引用原图，原图在本任务结束后即释放，
+                # 历史记录中每条结果只占一张缩小图和一张船牌小图的内存
+                t0 = time.perf_counter()
+                result['display'] = cv2.cvtColor(fit_image(img, *self.display_size), cv2.COLOR_BGR2RGB)
+                plate = crop_plate(img, result['box']) if result['box'] else None
+                result['plate'] = cv2.cvtColor(plate, cv2.COLOR_BGR2RGB) if plate is not None else None
+                # 识别模型的输入裁剪图，保存记录时存入裁剪图目录
+                result['crop_image'] = get_rotate_crop_image(img, result['box']) if result['box'] else None
+                result['model_version'] = engine.model_version
+                if metrics is not None:
+                    metrics.observe('display', time.perf_counter() - t0)
+            except Exception as e:
+                if metrics is not None:
+                    metrics.inc('errors')
+                self.jobFailed.emit(job_id, image_path, str(e))
+            else:
+                if metrics is not None:
+                    metrics.observe('total', time.perf_counter() - start)
+                    metrics.inc('images')
+                if self._isCancelled(job_id):
+                    self.jobCancelled.emit(job_id, image_path)
+                else:
+                    self.jobFinished.emit(job_id, image_path, result)
+            self._jobDone()
+        if cache is not None:
+            cache.close()
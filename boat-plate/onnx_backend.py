@@ -0,0 +1,197 @@
+import os
+import sys
+import shutil
+import argparse
+import subprocess
+
+import numpy as np
+
+# 模型精度：fp32为paddle2onnx导出的原始模型，int8为onnx_quantize.py量化后的模型
+PRECISIONS = ('fp32', 'int8')
+
+
+def model_path(onnx_model_dir, kind, precision='fp32'):
+    """onnx_model_dir下的模型文件：det.onnx / rec.onnx / rec_light.onnx（级联中的轻量识别模型），
+    INT8模型为det.int8.onnx / rec.int8.onnx / rec_light.int8.onnx"""
+    suffix = '.onnx' if precision == 'fp32' else '.%s.onnx' % precision
+    return os.path.join(onnx_model_dir, kind + suffix)
+
+
+def load_character_dict(rec_model_dir):
+    """读取model/rec/inference.yml中CTCLabelDecode的字符表"""
+    import yaml
+    with open(os.path.join(rec_model_dir, 'inference.yml'), encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    return [str(c) for c in config['PostProcess']['character_dict']]
+
+
+class OnnxRuntimeModel:
+    """用ONNX Runtime在CPU上运行一个单输入单输出的模型"""
+
+    def __init__(self, path, threads, spinning=True):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if not spinning:
+            # 线程池默认在每次推理后自旋等待下一次调用，几个会话交替推理时会互相抢CPU
+            options.add_session_config_entry('session.intra_op.allow_spinning', '0')
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoModel:
+    """用OpenVINO在CPU上运行一个单输入单输出的模型，直接读取ONNX文件；
+    OpenVINO的线程池不自旋等待，spinning只为与OnnxRuntimeModel接口一致"""
+
+    def __init__(self, path, threads, spinning=True):
+        import openvino as ov
+        core = ov.Core()
+        self.model = core.compile_model(core.read_model(path), 'CPU', {'INFERENCE_NUM_THREADS': threads})
+        self.output = self.model.output(0)
+
+    def run(self, batch):
+        return self.model([batch])[self.output]
+
+
+RUNTIMES = {'onnxruntime': OnnxRuntimeModel, 'openvino': OpenVinoModel}
+
+
+class OnnxBackend:
+    """ONNX模型的检测、识别推理，前后处理不依赖paddle，供ShipPlateEngine在CPU上使用"""
+
+    def __init__(self, config):
+        runtime = RUNTIMES[config['backend']]
+        precision = config['onnx_precision']
+        kinds = ('det', 'rec', 'rec_light') if config['rec_cascade'] else ('det', 'rec')
+        paths = [model_path(config['onnx_model_dir'], kind, precision) for kind in kinds]
+        for path in paths:
+            if not os.path.isfile(path):
+                tool = 'onnx_backend.py export' if precision == 'fp32' else 'onnx_quantize.py calibrate'
+                raise FileNotFoundError('找不到%s，请先运行 python %s' % (path, tool))
+        threads = config['cpu_threads']
+        # 识别级联时两个识别模型紧接着交替推理，线程池不自旋等待
+        spinning = not config['rec_cascade']
+        self.det_model = runtime(paths[0], threads, spinning)
+        # 识别模型及其字符表，键为ocr_engine.REC_MODELS
+        self.rec_models = {'full': runtime(paths[1], threads, spinning)}
+        self.characters = {'full': load_character_dict(config['rec_model_dir'])}
+        if config['rec_cascade']:
+            self.rec_models['light'] = runtime(paths[2], threads, spinning)
+            self.characters['light'] = load_character_dict(config['rec_light_model_dir'])
+        self._charsets = {}
+
+    def run_det(self, batch):
+        """输入NCHW，返回概率图(N, 1, H, W)"""
+        return self.det_model.run(np.ascontiguousarray(batch, dtype=np.float32))
+
+    def charset(self, num_classes, model='full'):
+        """解码用的字符表：下标0为CTC空白；训练时开启use_space_char的模型末尾还有空格"""
+        if model not in self._charsets:
+            charset = ['blank'] + self.characters[model]
+            if num_classes == len(charset) + 1:
+                charset.append(' ')
+            if num_classes != len(charset):
+                raise ValueError('识别模型输出%d类，与字符表的%d个字符不符' % (num_classes, len(self.characters[model])))
+            self._charsets[model] = charset
+        return self._charsets[model]
+
+    def run_rec(self, batch, model='full'):
+        """输入NCHW，返回每一步各字符的概率(N, T, 类别数)"""
+        return self.rec_models[model].run(batch)
+
+
+def export_onnx(model_dir, save_file, opset_version=11):
+    """用paddle2onnx把Paddle推理模型(inference.pdmodel/.pdiparams)导出为ONNX，输入尺寸保持动态"""
+    if not os.path.isfile(os.path.join(model_dir, 'inference.pdiparams')):
+        raise FileNotFoundError('%s下缺少inference.pdiparams' % model_dir)
+    exe = shutil.which('paddle2onnx')
+    if exe is None:
+        raise RuntimeError('未找到paddle2onnx，请先 pip install paddle2onnx')
+    os.makedirs(os.path.dirname(os.path.abspath(save_file)), exist_ok=True)
+    subprocess.run([exe, '--model_dir', model_dir,
+                    '--model_filename', 'inference.pdmodel',
+                    '--params_filename', 'inference.pdiparams',
+                    '--save_file', save_file,
+                    '--opset_version', str(opset_version),
+                    '--enable_onnx_checker', 'True'], check=True)
+
+
+def check_parity(inputs, backend, onnx_model_dir, rec_tolerance=0.01, det_tolerance=2.0):
+    """在同一批图片上对比Paddle与ONNX后端：检测概率图、检测框，以及同一批裁剪图的识别文本和分数。
+    Paddle一侧使用PaddleOCR自带的DB后处理，检测框的差异同时包含向量化后处理的偏差。
+    返回不一致的图片数"""
+    from ocr_engine import ShipPlateEngine, list_images, load_image, get_rotate_crop_image
+    from db_postprocess import compare_boxes
+    paddle = ShipPlateEngine({'device': 'cpu', 'det_postprocess': 'paddle'})
+    onnx = ShipPlateEngine({'device': 'cpu', 'backend': backend, 'onnx_model_dir': onnx_model_dir})
+    failed = 0
+    for path in list_images(inputs):
+        img = load_image(path)
+        if img is None:
+            continue
+        tensor, shape = paddle.det_preprocess(img)
+        map_diff = float(np.abs(paddle.det_infer(tensor[np.newaxis]) - onnx.det_infer(tensor[np.newaxis])).max())
+        boxes, _ = paddle.detect_with_scores(img)
+        onnx_boxes, _ = onnx.detect_with_scores(img)
+        # 偏差换算回概率图像素，与图片缩放比例无关
+        box_diff, box_mismatched = compare_boxes(boxes, onnx_boxes)
+        box_diff *= min(shape[2], shape[3])
+
+        # 识别用同一批裁剪图对比，排除检测差异的影响
+        crops = [get_rotate_crop_image(img, box) for box in boxes]
+        texts_differ, score_diff = 0, 0.0
+        for (text, score), (onnx_text, onnx_score) in zip(paddle.recognize(crops), onnx.recognize(crops)):
+            texts_differ += text != onnx_text
+            score_diff = max(score_diff, abs(score - onnx_score))
+
+        ok = (box_mismatched == 0 and box_diff <= det_tolerance
+              and texts_differ == 0 and score_diff <= rec_tolerance)
+        failed += not ok
+        print('%s  %s  概率图最大差 %.4f  框 %d/%d 偏差 %.1fpx  文本不同 %d/%d  分数最大差 %.4f' % (
+            'OK ' if ok else 'BAD', path, map_diff, len(boxes), len(onnx_boxes), box_diff,
+            texts_differ, len(crops), score_diff))
+    return failed
+
+
+def main(argv=None):
+    from ocr_engine import DEFAULT_CONFIG, BASE_DIR
+    parser = argparse.ArgumentParser(description='导出ONNX模型，并与Paddle推理结果对比')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    export = sub.add_parser('export', help='把model/det和model/rec（以及存在时的model/rec_light）导出为ONNX')
+    export.add_argument('--det-model-dir', default=DEFAULT_CONFIG['det_model_dir'])
+    export.add_argument('--rec-model-dir', default=DEFAULT_CONFIG['rec_model_dir'])
+    export.add_argument('--rec-light-model-dir', default=DEFAULT_CONFIG['rec_light_model_dir'],
+                        help='识别级联的轻量识别模型，目录中没有模型时跳过')
+    export.add_argument('--onnx-model-dir', default=DEFAULT_CONFIG['onnx_model_dir'])
+    export.add_argument('--opset', type=int, default=11, help='ONNX opset版本')
+
+    check = sub.add_parser('check', help='在图片上对比Paddle与ONNX后端的输出')
+    check.add_argument('inputs', nargs='*', default=[os.path.join(BASE_DIR, 'test')],
+                       help='图片文件、目录或通配符，默认test目录')
+    check.add_argument('--backend', choices=sorted(RUNTIMES), default='onnxruntime')
+    check.add_argument('--onnx-model-dir', default=DEFAULT_CONFIG['onnx_model_dir'])
+    check.add_argument('--tolerance', type=float, default=0.01, help='允许的识别分数差')
+    check.add_argument('--det-tolerance', type=float, default=2.0,
+                       help='允许的检测框顶点偏差（检测模型输入图上的像素）')
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        export_onnx(args.det_model_dir, model_path(args.onnx_model_dir, 'det'), args.opset)
+        export_onnx(args.rec_model_dir, model_path(args.onnx_model_dir, 'rec'), args.opset)
+        if os.path.isfile(os.path.join(args.rec_light_model_dir, 'inference.pdiparams')):
+            export_onnx(args.rec_light_model_dir, model_path(args.onnx_model_dir, 'rec_light'), args.opset)
+        print('已导出到 %s' % args.onnx_model_dir)
+        return 0
+    failed = check_parity(args.inputs, args.backend, args.onnx_model_dir, rec_tolerance=args.tolerance,
+                          det_tolerance=args.det_tolerance)
+    print('不一致的图片: %d' % failed)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
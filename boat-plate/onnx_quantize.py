@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from ocr_engine import rec_resize_norm, REC_IMAGE_SHAPE
+from onnx_backend import model_path
+
+# 只量化计算量集中的卷积和矩阵乘，Sigmoid/Softmax等逐元素算子保持浮点，减少精度损失
+QUANT_OP_TYPES = ['Conv', 'MatMul', 'Gemm']
+
+
+class ArrayDataReader:
+    """把样本逐个交给量化校准器，样本按需生成，避免一次占用大量内存"""
+
+    def __init__(self, input_name, samples):
+        self.input_name = input_name
+        self.samples = iter(samples)
+
+    def get_next(self):
+        sample = next(self.samples, None)
+        return None if sample is None else {self.input_name: sample}
+
+
+def quantize_model(fp32_path, int8_path, samples):
+    """静态量化：用校准样本统计激活值范围，权重按通道量化为INT8，输出QDQ格式的ONNX"""
+    import onnx
+    from onnxruntime.quantization import (quantize_static, CalibrationDataReader, QuantFormat,
+                                          QuantType, CalibrationMethod)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    class Reader(ArrayDataReader, CalibrationDataReader):
+        pass
+
+    # 先做形状推断和图优化（折叠BN等），量化出的模型算子更少
+    with tempfile.TemporaryDirectory() as tmp:
+        prepared = os.path.join(tmp, 'prepared.onnx')
+        quant_pre_process(fp32_path, prepared, skip_symbolic_shape=True)
+        input_name = onnx.load(prepared, load_external_data=False).graph.input[0].name
+        quantize_static(prepared, int8_path, Reader(input_name, samples),
+                        quant_format=QuantFormat.QDQ,
+                        op_types_to_quantize=QUANT_OP_TYPES,
+                        per_channel=True,
+                        activation_type=QuantType.QUInt8,
+                        weight_type=QuantType.QInt8,
+                        calibrate_method=CalibrationMethod.MinMax)
+
+
+def calibrate(images, onnx_model_dir, num_images=64):
+    """在样例图片上校准并生成INT8检测、识别模型：检测用整图的前处理结果，
+    识别用FP32模型检测出的裁剪图，与实际推理时的输入分布一致"""
+    from ocr_engine import ShipPlateEngine, load_image, get_rotate_crop_image
+    engine = ShipPlateEngine({'device': 'cpu', 'backend': 'onnxruntime', 'onnx_model_dir': onnx_model_dir})
+    images = [img for img in (load_image(path) for path in images[:num_images]) if img is not None]
+    if not images:
+        raise ValueError('没有可用于校准的图片')
+
+    _, img_h, img_w = REC_IMAGE_SHAPE
+    crops = []
+    for img in images:
+        crops.extend(get_rotate_crop_image(img, box) for box in engine.detect(img))
+    det_samples = (engine.det_preprocess(img)[0][np.newaxis] for img in images)
+    rec_samples = [rec_resize_norm(crop, max(img_w / img_h, crop.shape[1] / crop.shape[0]))[np.newaxis]
+                   for crop in crops]
+
+    quantize_model(model_path(onnx_model_dir, 'det', 'fp32'), model_path(onnx_model_dir, 'det', 'int8'),
+                   det_samples)
+    quantize_model(model_path(onnx_model_dir, 'rec', 'fp32'), model_path(onnx_model_dir, 'rec', 'int8'),
+                   rec_samples)
+    # 识别级联的轻量模型与完整模型输入相同，用同一批裁剪图校准
+    if os.path.isfile(model_path(onnx_model_dir, 'rec_light', 'fp32')):
+        quantize_model(model_path(onnx_model_dir, 'rec_light', 'fp32'), model_path(onnx_model_dir, 'rec_light', 'int8'),
+                       rec_samples)
+    return len(images), len(crops)
+
+
+def load_labels(path):
+    """读取标注文件，每行"图片路径\\t船牌文本"（PaddleOCR识别标注格式），按文件名对应"""
+    labels = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) >= 2:
+                labels[os.path.basename(parts[0])] = parts[1]
+    return labels
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def evaluate(engine, images):
+    """逐张推理，返回(识别文本列表, 每张耗时列表, 检测耗时合计, 识别耗时合计)；第一张先预热一次不计时"""
+    engine.process_image(images[0])
+    texts, latencies, det_time, rec_time = [], [], 0.0, 0.0
+    for img in images:
+        t0 = time.perf_counter()
+        result = engine.process_image(img)
+        latencies.append(time.perf_counter() - t0)
+        det_time += result['timings']['det']
+        rec_time += result['timings']['rec']
+        texts.append(result['text'])
+    return texts, latencies, det_time, rec_time
+
+
+def report(paths, onnx_model_dir, labels=None, threads=None):
+    """对比FP32与INT8模型在同一批图片上的耗时和船牌准确率。
+    有标注时按标注计算准确率；没有标注时以FP32的识别结果为基准，统计INT8结果一致的比例"""
+    from ocr_engine import ShipPlateEngine, DEFAULT_CONFIG, load_image
+    loaded = [(path, load_image(path)) for path in paths]
+    loaded = [(path, img) for path, img in loaded if img is not None]
+    if not loaded:
+        raise ValueError('没有可评估的图片')
+    images = [img for _, img in loaded]
+    config = {'device': 'cpu', 'backend': 'onnxruntime', 'onnx_model_dir': onnx_model_dir,
+              'cpu_threads': threads or DEFAULT_CONFIG['cpu_threads']}
+
+    summary = {'images': len(images)}
+    outputs = {}
+    for precision in ('fp32', 'int8'):
+        engine = ShipPlateEngine(dict(config, onnx_precision=precision))
+        texts, latencies, det_time, rec_time = evaluate(engine, images)
+        outputs[precision] = texts
+        summary[precision] = {
+            'mean_ms': 1000 * sum(latencies) / len(latencies),
+            'p50_ms': 1000 * percentile(latencies, 50),
+            'p95_ms': 1000 * percentile(latencies, 95),
+            'det_ms': 1000 * det_time / len(images),
+            'rec_ms': 1000 * rec_time / len(images),
+        }
+
+    if labels:
+        truth = [labels.get(os.path.basename(path)) for path, _ in loaded]
+        scored = [k for k, t in enumerate(truth) if t is not None]
+        summary['labeled'] = len(scored)
+        for precision in ('fp32', 'int8'):
+            correct = sum(outputs[precision][k] == truth[k] for k in scored)
+            summary[precision]['accuracy'] = 100.0 * correct / len(scored) if scored else 0.0
+        summary['accuracy_drop'] = summary['fp32']['accuracy'] - summary['int8']['accuracy']
+    else:
+        agree = sum(a == b for a, b in zip(outputs['fp32'], outputs['int8']))
+        summary['int8']['agreement'] = 100.0 * agree / len(images)
+        summary['accuracy_drop'] = 100.0 - summary['int8']['agreement']
+    summary['speedup'] = summary['fp32']['mean_ms'] / summary['int8']['mean_ms']
+    summary['mismatches'] = [path for (path, _), a, b in zip(loaded, outputs['fp32'], outputs['int8']) if a != b]
+    return summary
+
+
+def print_report(summary, min_speedup, max_drop):
+    print('图片 %d 张%s' % (summary['images'], '，有标注 %d 张' % summary['labeled'] if 'labeled' in summary else ''))
+    print('%-6s %10s %10s %10s %10s %10s %10s' % ('', '平均ms', 'p50 ms', 'p95 ms', '检测ms', '识别ms', '准确率%'))
+    for precision in ('fp32', 'int8'):
+        s = summary[precision]
+        accuracy = s.get('accuracy', s.get('agreement', 100.0))
+        print('%-6s %10.1f %10.1f %10.1f %10.1f %10.1f %10.2f' % (
+            precision, s['mean_ms'], s['p50_ms'], s['p95_ms'], s['det_ms'], s['rec_ms'], accuracy))
+    print('加速比 %.2fx（目标 >= %.1fx）%s' % (summary['speedup'], min_speedup,
+                                          '' if summary['speedup'] >= min_speedup else '  未达标'))
+    print('准确率下降 %.2f 个百分点（目标 < %.1f）%s' % (summary['accuracy_drop'], max_drop,
+                                                '' if summary['accuracy_drop'] < max_drop else '  未达标'))
+    for path in summary['mismatches']:
+        print('结果不同: %s' % path)
+
+
+def main(argv=None):
+    from ocr_engine import DEFAULT_CONFIG, BASE_DIR, list_images
+    parser = argparse.ArgumentParser(description='ONNX模型INT8训练后量化，并报告加速和准确率变化')
+    sub = parser.add_subparsers(dest='command', required=True)
+    default_inputs = [os.path.join(BASE_DIR, 'test')]
+
+    calib = sub.add_parser('calibrate', help='用样例图片校准，生成det.int8.onnx和rec.int8.onnx')
+    calib.add_argument('inputs', nargs='*', default=default_inputs, help='校准图片，默认test目录')
+    calib.add_argument('--num', type=int, default=64, help='最多使用的校准图片数')
+    calib.add_argument('--onnx-model-dir', default=DEFAULT_CONFIG['onnx_model_dir'])
+
+    rep = sub.add_parser('report', help='对比FP32与INT8模型的耗时和准确率')
+    rep.add_argument('inputs', nargs='*', default=default_inputs, help='评估图片，默认test目录')
+    rep.add_argument('--labels', default=None, help='标注文件，每行"图片路径\\t船牌文本"；不提供时以FP32结果为基准')
+    rep.add_argument('--onnx-model-dir', default=DEFAULT_CONFIG['onnx_model_dir'])
+    rep.add_argument('--threads', type=int, default=None, help='推理线程数')
+    rep.add_argument('--min-speedup', type=float, default=2.0)
+    rep.add_argument('--max-drop', type=float, default=1.0, help='允许的准确率下降（百分点）')
+    rep.add_argument('--json', default=None, help='同时把报告写入JSON文件')
+    args = parser.parse_args(argv)
+
+    paths = list_images(args.inputs)
+    if args.command == 'calibrate':
+        num_images, num_crops = calibrate(paths, args.onnx_model_dir, args.num)
+        print('用 %d 张图片、%d 个裁剪图完成校准，INT8模型已写入 %s' % (num_images, num_crops, args.onnx_model_dir))
+        return 0
+
+    labels = load_labels(args.labels) if args.labels else None
+    summary = report(paths, args.onnx_model_dir, labels, args.threads)
+    print_report(summary, args.min_speedup, args.max_drop)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    ok = summary['speedup'] >= args.min_speedup and summary['accuracy_drop'] < args.max_drop
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from ocr_engine import ShipPlateEngine, DEFAULT_CONFIG, BACKENDS, DET_MODES, edit_distance, load_image, recognize_paths
+from ocr_pool import OcrProcessPool
+from recognition_store import normalize_plate
+
+
+def load_eval_labels(path, data_dir=None):
+    """读取评估标注，返回[{'path', 'plate', 'boxes', 'ignore'}, ...]。两种格式按行自动识别：
+    识别标注 图片路径\\t船牌文本，只评估船牌准确率；检测标注 图片路径\\t[{"transcription", "points"}, ...]
+    （PaddleOCR格式），同时评估检测，文本最长的框作为船牌（船名号通常是画面中最长的文字），
+    文本为###的框是忽略区域。图片路径相对于data_dir（默认为标注文件所在目录）"""
+    data_dir = data_dir or os.path.dirname(os.path.abspath(path))
+    samples = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line.strip():
+                continue
+            image, _, label = line.partition('\t')
+            sample = {'path': os.path.join(data_dir, image), 'plate': label, 'boxes': None, 'ignore': []}
+            if label.startswith('['):
+                items = json.loads(label)
+                texts = [item for item in items if item['transcription'] != '###']
+                sample['boxes'] = [item['points'] for item in texts]
+                sample['ignore'] = [item['points'] for item in items if item['transcription'] == '###']
+                sample['plate'] = max((item['transcription'] for item in texts), key=len, default='')
+            samples.append(sample)
+    return samples
+
+
+def polygon_area(poly):
+    return abs(cv2.contourArea(np.asarray(poly, dtype=np.float32).reshape(-1, 2)))
+
+
+def polygon_intersection(a, b):
+    """两个多边形凸包的交集面积，四点检测框都是凸的"""
+    hull_a = cv2.convexHull(np.asarray(a, dtype=np.float32).reshape(-1, 2))
+    hull_b = cv2.convexHull(np.asarray(b, dtype=np.float32).reshape(-1, 2))
+    area, _ = cv2.intersectConvexConvex(hull_a, hull_b)
+    return max(0.0, float(area))
+
+
+def polygon_iou(a, b):
+    inter = polygon_intersection(a, b)
+    union = polygon_area(a) + polygon_area(b) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_boxes(gt_boxes, pred_boxes, ignore=(), iou_thresh=0.5):
+    """检测框一对一匹配（同PaddleOCR DetMetric）：与忽略区域重叠过半的预测框不计，
+    其余按交并比从高到低贪心匹配，不低于iou_thresh算命中。返回(命中数, 参与计数的预测框数,
+    未命中的标注框下标, 误检的预测框下标)"""
+    counted = [k for k, box in enumerate(pred_boxes)
+               if not any(polygon_intersection(box, region) > 0.5 * polygon_area(box) for region in ignore)]
+    pairs = sorted(((polygon_iou(gt, pred_boxes[k]), g, k) for g, gt in enumerate(gt_boxes) for k in counted),
+                   reverse=True)
+    used_gt, used_pred = set(), set()
+    for iou, g, k in pairs:
+        if iou < iou_thresh:
+            break
+        if g not in used_gt and k not in used_pred:
+            used_gt.add(g)
+            used_pred.add(k)
+    missed = [g for g in range(len(gt_boxes)) if g not in used_gt]
+    false_pos = [k for k in counted if k not in used_pred]
+    return len(used_gt), len(counted), missed, false_pos
+
+
+def score_record(sample, record):
+    """一张图片的评估结果：船牌是否完全一致、编辑距离，以及有检测标注时的检测命中情况。
+    检测按record['detections']中的全部检测框评估（需开启keep_detections），与识别分数无关；
+    regions只用于船牌文本"""
+    truth, pred = normalize_plate(sample['plate']), normalize_plate(record['text'])
+    result = {'image': sample['path'], 'truth': sample['plate'], 'pred': record['text'], 'score': record['score'],
+              'exact': truth == pred and 'error' not in record, 'edits': edit_distance(truth, pred),
+              'chars': len(truth)}
+    if 'error' in record:
+        result['error'] = record['error']
+    if 'rec_routes' in record:
+        result['rec_routes'] = record['rec_routes']
+    if sample['boxes'] is not None:
+        pred_boxes = [detection['box'] for detection in record.get('detections', [])]
+        hits, counted, missed, false_pos = match_boxes(sample['boxes'], pred_boxes, sample['ignore'])
+        result.update(det_hits=hits, det_gt=len(sample['boxes']), det_pred=counted,
+                      det_missed=[sample['boxes'][g] for g in missed],
+                      det_false=[pred_boxes[k] for k in false_pos])
+    return result
+
+
+def summarize(results, elapsed):
+    n = len(results)
+    chars = sum(r['chars'] for r in results)
+    summary = {'images': n, 'exact_match': 100.0 * sum(r['exact'] for r in results) / n if n else 0.0,
+               'cer': 100.0 * sum(r['edits'] for r in results) / chars if chars else 0.0,
+               'errors': sum('error' in r for r in results),
+               'seconds': elapsed, 'images_per_sec': n / elapsed if elapsed else 0.0}
+    routed = [r['rec_routes'] for r in results if 'rec_routes' in r]
+    if routed:
+        light, full = sum(r['light'] for r in routed), sum(r['full'] for r in routed)
+        summary['rec_light_rate'] = 100.0 * light / (light + full) if light + full else 0.0
+    det = [r for r in results if 'det_gt' in r]
+    if det:
+        hits = sum(r['det_hits'] for r in det)
+        pred = sum(r['det_pred'] for r in det)
+        gt = sum(r['det_gt'] for r in det)
+        precision = hits / float(pred) if pred else 0.0
+        recall = hits / float(gt) if gt else 0.0
+        summary.update(det_precision=100.0 * precision, det_recall=100.0 * recall,
+                       det_hmean=200.0 * precision * recall / (precision + recall) if precision + recall else 0.0)
+    return summary
+
+
+def is_failure(result):
+    return not result['exact'] or bool(result.get('det_missed')) or bool(result.get('det_false'))
+
+
+def dump_failure(result, failure_dir, index):
+    """把一张失败图片画上漏检的标注框（蓝）、误检框（红）和识别结果，存到failure_dir；
+    文件名前加样本序号index，不同子目录中同名的图片不会互相覆盖"""
+    img = load_image(result['image'])
+    if img is None:
+        return None
+    for boxes, color in ((result.get('det_missed', []), (255, 0, 0)), (result.get('det_false', []), (0, 0, 255))):
+        for box in boxes:
+            cv2.polylines(img, [np.int32(box)], True, color, 3)
+    scale = max(1.0, img.shape[1] / 1280.0)
+    cv2.putText(img, 'pred: %s' % result['pred'].encode('ascii', 'replace').decode('ascii'), (10, int(40 * scale)),
+                cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 255), max(1, int(2 * scale)))
+    name = '%05d_%s.jpg' % (index, os.path.splitext(os.path.basename(result['image']))[0])
+    path = os.path.join(failure_dir, name)
+    cv2.imencode('.jpg', img)[1].tofile(path)
+    return path
+
+
+def run_pipeline(samples, config, batch_size=8, workers=0, threads=None):
+    """对全部样本运行完整的检测识别流程，按样本顺序逐条产出记录：workers大于0时用多进程池，
+    否则在本进程中每batch_size张一批（检测按缩放后尺寸拼批，识别合并成一次调用）"""
+    paths = [sample['path'] for sample in samples]
+    config = dict(config, det_batch_num=batch_size, keep_detections=True)
+    if workers > 0:
+        with OcrProcessPool(config, workers=workers, threads_per_worker=threads, chunk_size=batch_size) as pool:
+            yield from pool.imap(paths)
+        return
+    engine = ShipPlateEngine(config)
+    engine.warmup()
+    for start in range(0, len(paths), batch_size):
+        yield from recognize_paths(engine, paths[start:start + batch_size])
+
+
+def evaluate(samples, config, batch_size=8, workers=0, threads=None, failure_dir=None):
+    """评估并返回(汇总, 逐张结果)；failure_dir不为空时把失败图片的标注图和failures.jsonl写进去"""
+    start = time.perf_counter()
+    results = [score_record(sample, record)
+               for sample, record in zip(samples, run_pipeline(samples, config, batch_size, workers, threads))]
+    summary = summarize(results, time.perf_counter() - start)
+    if failure_dir:
+        os.makedirs(failure_dir, exist_ok=True)
+        with open(os.path.join(failure_dir, 'failures.jsonl'), 'w', encoding='utf-8') as f:
+            for index, result in enumerate(results):
+                if is_failure(result):
+                    result['dump'] = dump_failure(result, failure_dir, index)
+                    f.write(json.dumps(result, ensure_ascii=False) + '\n')
+    return summary, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='在带标注的图片集上评估完整检测识别流程：船牌准确率、字符错误率、检测精确率/召回率和速度')
+    parser.add_argument('label_file', help='标注文件：每行 图片路径\\t船牌文本，或PaddleOCR检测标注（同时评估检测）')
+    parser.add_argument('--data-dir', default=None, help='标注中图片路径的根目录，默认为标注文件所在目录')
+    parser.add_argument('--batch-size', type=int, default=8, help='每批图片数（多进程模式为每次分给进程的张数）')
+    parser.add_argument('--workers', type=int, default=0, help='大于0时使用多进程，每个进程加载一份模型')
+    parser.add_argument('--threads', type=int, default=None, help='推理线程数（多进程模式为每个进程的线程数）')
+    parser.add_argument('--device', choices=['auto', 'cpu', 'gpu'], default=DEFAULT_CONFIG['device'])
+    parser.add_argument('--backend', choices=BACKENDS, default=DEFAULT_CONFIG['backend'])
+    parser.add_argument('--onnx-model-dir', default=DEFAULT_CONFIG['onnx_model_dir'])
+    parser.add_argument('--precision', choices=['fp32', 'int8'], default=DEFAULT_CONFIG['onnx_precision'])
+    parser.add_argument('--det-model-dir', default=DEFAULT_CONFIG['det_model_dir'])
+    parser.add_argument('--rec-model-dir', default=DEFAULT_CONFIG['rec_model_dir'])
+    parser.add_argument('--rec-cascade', action='store_true',
+                        help='识别级联：先用轻量识别模型，置信度低于--cascade-score的裁剪图再用完整模型识别')
+    parser.add_argument('--rec-light-model-dir', default=DEFAULT_CONFIG['rec_light_model_dir'])
+    parser.add_argument('--cascade-score', type=float, default=DEFAULT_CONFIG['rec_cascade_score'])
+    parser.add_argument('--det-mode', choices=DET_MODES, default=DEFAULT_CONFIG['det_mode'])
+    parser.add_argument('--rec-mode', choices=['all', 'selective'], default=DEFAULT_CONFIG['rec_mode'])
+    parser.add_argument('--failures', default=None, metavar='DIR',
+                        help='把识别错误、漏检或误检的图片画上框存到该目录，并写出failures.jsonl')
+    parser.add_argument('-o', '--output', default=None, help='汇总结果写入JSON文件')
+    parser.add_argument('--min-accuracy', type=float, default=None, help='船牌准确率低于该值（%%）时返回非0')
+    parser.add_argument('--max-cer', type=float, default=None, help='字符错误率高于该值（%%）时返回非0')
+    parser.add_argument('--min-recall', type=float, default=None, help='检测召回率低于该值（%%）时返回非0')
+    args = parser.parse_args(argv)
+
+    samples = load_eval_labels(args.label_file, args.data_dir)
+    if not samples:
+        print('标注文件中没有样本', file=sys.stderr)
+        return 1
+    config = {'det_model_dir': args.det_model_dir, 'rec_model_dir': args.rec_model_dir, 'device': args.device,
+              'backend': args.backend, 'onnx_model_dir': args.onnx_model_dir, 'onnx_precision': args.precision,
+              'det_mode': args.det_mode, 'rec_mode': args.rec_mode, 'rec_cascade': args.rec_cascade,
+              'rec_light_model_dir': args.rec_light_model_dir, 'rec_cascade_score': args.cascade_score}
+    if args.threads and not args.workers:
+        config['cpu_threads'] = args.threads
+    summary, results = evaluate(samples, config, args.batch_size, args.workers, args.threads, args.failures)
+
+    print('图片 %d 张，船牌准确率 %.2f%%，字符错误率 %.2f%%，读图失败 %d 张' % (
+        summary['images'], summary['exact_match'], summary['cer'], summary['errors']))
+    if 'det_precision' in summary:
+        print('检测 精确率 %.2f%%，召回率 %.2f%%，F值 %.2f%%' % (
+            summary['det_precision'], summary['det_recall'], summary['det_hmean']))
+    if 'rec_light_rate' in summary:
+        print('识别级联 轻量模型采用 %.2f%%' % summary['rec_light_rate'])
+    print('耗时 %.1fs，%.2f 张/秒' % (summary['seconds'], summary['images_per_sec']))
+    if args.failures:
+        print('失败 %d 张，见 %s' % (sum(map(is_failure, results)), os.path.join(args.failures, 'failures.jsonl')))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    failed = []
+    if args.min_accuracy is not None and summary['exact_match'] < args.min_accuracy:
+        failed.append('船牌准确率')
+    if args.max_cer is not None and summary['cer'] > args.max_cer:
+        failed.append('字符错误率')
+    if args.min_recall is not None and summary.get('det_recall', 0.0) < args.min_recall:
+        failed.append('检测召回率')
+    if failed:
+        print('未达标: %s' % '、'.join(failed), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
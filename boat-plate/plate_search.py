@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import time
+import random
+import calendar
+import argparse
+import tempfile
+
+import numpy as np
+
+from ocr_engine import edit_distance
+from recognition_store import (DEFAULT_DB_PATH, GRAM_SIZE, RecognitionStore, connect, init_schema,
+                               normalize_plate, text_grams, utc_timestamp)
+
+TIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d')
+
+
+def parse_time(value):
+    """'YYYY-MM-DD[ HH:MM[:SS]]'（本地时间）转成库中的UTC时间字符串"""
+    for fmt in TIME_FORMATS:
+        try:
+            return utc_timestamp(time.mktime(time.strptime(value, fmt)))
+        except ValueError:
+            continue
+    raise ValueError('无法识别的时间: %s，格式应为 YYYY-MM-DD [HH:MM[:SS]]' % value)
+
+
+def local_time(timestamp):
+    """库中的UTC时间字符串转成本地时间显示"""
+    t = calendar.timegm(time.strptime(timestamp, TIME_FORMATS[0]))
+    return time.strftime(TIME_FORMATS[0], time.localtime(t))
+
+
+def edit_distances(query, texts):
+    """query到texts中每个文本的编辑距离，一次算完全部候选：逐个处理query的字符，
+    每一行的递推 cur[j] = min(t[j], cur[j-1] + 1) 改写成 cur[j] - j 的前缀最小值，用numpy向量化"""
+    if not texts:
+        return np.zeros(0, dtype=np.int32)
+    lengths = np.array([len(text) for text in texts])
+    width = int(lengths.max())
+    # 定长UTF-32编码后每个字符对应一个整数，补位的0不会与query中的字符相等
+    codes = np.frombuffer(''.join(text.ljust(width, '\0') for text in texts).encode('utf-32-le'),
+                          dtype=np.uint32).reshape(len(texts), width)
+    steps = np.arange(width + 1, dtype=np.int32)
+    previous = np.broadcast_to(steps, (len(texts), width + 1))
+    for i, char in enumerate(query, 1):
+        t = np.minimum(previous[:, 1:] + 1, previous[:, :-1] + (codes != ord(char)))
+        current = np.empty_like(previous)
+        current[:, 0] = i
+        current[:, 1:] = t - steps[1:]
+        current = np.minimum.accumulate(current, axis=1) + steps
+        current[:, 0] = i
+        previous = current
+    return previous[np.arange(len(texts)), lengths]
+
+
+class PlateSearch:
+    """在识别记录库中模糊查找船牌：三元组倒排索引召回共有三元组足够多的文本，再按编辑距离精排，
+    可限定时间范围。回答"这条船以前出现过吗"，容忍识别差一两个字"""
+
+    def __init__(self, path=DEFAULT_DB_PATH, candidates=None):
+        # 按共有三元组数最多取前多少个文本计算编辑距离；None为不限，满足三元组下界的文本全部计算，不漏召回
+        self.candidates = candidates
+        self.conn = connect(path)
+        init_schema(self.conn)
+
+    def _candidates(self, query, max_distance):
+        """返回[(文本, 共有三元组数), ...]。每处编辑最多破坏GRAM_SIZE个三元组，
+        距离不超过max_distance的文本至少共有 len(grams) - GRAM_SIZE * max_distance 个"""
+        grams = sorted(text_grams(query))
+        min_shared = max(1, len(grams) - GRAM_SIZE * max_distance)
+        limit, params = '', grams + [min_shared]
+        if self.candidates is not None:
+            limit = 'ORDER BY shared DESC LIMIT ?'
+            params.append(self.candidates)
+        return self.conn.execute('''
+            SELECT t.text, c.shared FROM (
+                SELECT text_id, COUNT(*) AS shared FROM plate_grams
+                WHERE gram IN (%s) GROUP BY text_id HAVING shared >= ? %s
+            ) AS c JOIN plate_texts AS t ON t.id = c.text_id
+        ''' % (','.join('?' * len(grams)), limit), params).fetchall()
+
+    def search(self, query, max_distance=2, since=None, until=None, limit=20, images=3):
+        """模糊查找，since/until为库中格式的UTC时间字符串（见parse_time）。
+        返回按编辑距离排序的列表，每项为{'text', 'distance', 'sightings', 'first_seen', 'last_seen', 'images'}，
+        sightings等统计只计时间范围内的记录，images为最近几条记录的(图片名, 时间)"""
+        query = normalize_plate(query)
+        if not query:
+            return []
+        candidates = self._candidates(query, max_distance)
+        # 常见前缀（如"浙岱渔"）的三元组使候选多达上万个，编辑距离一次性向量化计算
+        distances = edit_distances(query, [normalize_plate(text) for text, _ in candidates])
+        matches = sorted((int(distance), -shared, text) for (text, shared), distance in zip(candidates, distances)
+                         if distance <= max_distance)
+
+        where, params = 'recognized_text = ?', []
+        if since:
+            where += ' AND timestamp >= ?'
+            params.append(since)
+        if until:
+            where += ' AND timestamp <= ?'
+            params.append(until)
+        results = []
+        for distance, _, text in matches:
+            count, first, last = self.conn.execute(
+                'SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM recognitions WHERE ' + where,
+                [text] + params).fetchone()
+            if not count:
+                continue
+            recent = self.conn.execute(
+                'SELECT image_filename, timestamp FROM recognitions WHERE %s ORDER BY timestamp DESC LIMIT ?' % where,
+                [text] + params + [images]).fetchall()
+            results.append({'text': text, 'distance': distance, 'sightings': count,
+                            'first_seen': local_time(first), 'last_seen': local_time(last),
+                            'images': [(name, local_time(ts)) for name, ts in recent]})
+            if len(results) >= limit:
+                break
+        return results
+
+    def close(self):
+        self.conn.close()
+
+
+def random_plate(rng):
+    prefix = rng.choice(['浙岱渔', '浙舟渔', '浙普渔', '闽渔', '鲁荣渔', '苏连渔', '辽丹渔'])
+    return '%s%05d' % (prefix, rng.randrange(100000))
+
+
+def corrupt(text, rng, edits):
+    """模拟识别错误：随机替换、删除或插入edits个字符"""
+    chars = list(text)
+    for _ in range(edits):
+        k = rng.randrange(len(chars))
+        op = rng.choice('sdi')
+        if op == 's':
+            chars[k] = rng.choice('0123456789渔浙')
+        elif op == 'd' and len(chars) > 1:
+            del chars[k]
+        else:
+            chars.insert(k, rng.choice('0123456789'))
+    return ''.join(chars)
+
+
+def bench(path, rows, plates, queries, seed=0):
+    """生成rows条记录（plates个不同船牌，时间分布在最近一年内），再用带1~2处错误的船牌查询，
+    返回(查询耗时p50, p95 毫秒, 召回率)。原船牌在结果中，或者结果已被距离不大于它的船牌占满
+    （错误太多时与其他船牌无法区分）都算召回"""
+    rng = random.Random(seed)
+    pool = list({random_plate(rng) for _ in range(plates)})
+    now = time.time()
+    with RecognitionStore(path, batch_size=5000) as store:
+        for i in range(rows):
+            store.add('bench_%07d.jpg' % i, rng.choice(pool), utc_timestamp(now - rng.uniform(0, 365 * 86400)))
+    searcher = PlateSearch(path)
+    latencies, found = [], 0
+    for _ in range(queries):
+        truth = rng.choice(pool)
+        query = corrupt(truth, rng, rng.randint(1, 2))
+        t0 = time.perf_counter()
+        results = searcher.search(query)
+        latencies.append(time.perf_counter() - t0)
+        distance = edit_distance(normalize_plate(query), truth)
+        found += any(r['text'] == truth for r in results) or \
+            (len(results) == 20 and all(r['distance'] <= distance for r in results))
+    searcher.close()
+    ms = np.asarray(latencies) * 1000
+    return float(np.percentile(ms, 50)), float(np.percentile(ms, 95)), found / float(queries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='在识别记录库中模糊查找船牌（容忍一两个字的识别差异）')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    find = sub.add_parser('find', help='查找船牌')
+    find.add_argument('query', help='船牌号，可以有识别错误')
+    find.add_argument('--db', default=DEFAULT_DB_PATH, help='识别记录库路径')
+    find.add_argument('--max-distance', type=int, default=2, help='允许的最大编辑距离')
+    find.add_argument('--since', default=None, help='起始时间 YYYY-MM-DD [HH:MM[:SS]]（本地时间）')
+    find.add_argument('--until', default=None, help='截止时间 YYYY-MM-DD [HH:MM[:SS]]（本地时间）')
+    find.add_argument('--limit', type=int, default=20, help='最多返回的船牌数')
+    find.add_argument('--json', action='store_true', help='以JSON输出')
+
+    bench_parser = sub.add_parser('bench', help='在临时库中生成大量记录，测量查找延迟和召回率')
+    bench_parser.add_argument('--rows', type=int, default=1000000)
+    bench_parser.add_argument('--plates', type=int, default=100000, help='不同船牌数')
+    bench_parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        with tempfile.TemporaryDirectory() as tmp:
+            p50, p95, recall = bench(os.path.join(tmp, 'bench.db'), args.rows, args.plates, args.queries)
+        print('%d 条记录，%d 个船牌：查找 p50 %.1fms，p95 %.1fms，召回率 %.1f%%' % (
+            args.rows, args.plates, p50, p95, 100 * recall))
+        return 0
+
+    since = parse_time(args.since) if args.since else None
+    until = parse_time(args.until) if args.until else None
+    searcher = PlateSearch(args.db)
+    t0 = time.perf_counter()
+    results = searcher.search(args.query, args.max_distance, since, until, args.limit)
+    elapsed = time.perf_counter() - t0
+    searcher.close()
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return 0
+    for r in results:
+        print('%s  距离 %d  出现 %d 次  %s ~ %s' % (r['text'], r['distance'], r['sightings'],
+                                               r['first_seen'], r['last_seen']))
+        for name, ts in r['images']:
+            print('    %s  %s' % (ts, name))
+    print('找到 %d 个船牌，耗时 %.1fms' % (len(results), 1000 * elapsed), file=sys.stderr)
+    return 0 if results else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
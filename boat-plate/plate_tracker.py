@@ -0,0 +1,152 @@
+import time
+import itertools
+
+import cv2
+import numpy as np
+
+from ocr_engine import get_rotate_crop_image, box_iou, box_rect
+
+
+class PlateTracker:
+    """跨帧跟踪船牌：用光流平移检测框，每隔若干帧或跟丢时才重新检测，
+    裁剪图变化明显或置信度下降时才重新识别"""
+
+    def __init__(self, engine, det_interval=10, rec_interval=25, match_iou=0.3,
+                 crop_change=12.0, min_score=0.8, min_flow_points=6):
+        self.engine = engine
+        self.det_interval = det_interval  # 最多间隔多少帧做一次完整检测
+        self.rec_interval = rec_interval  # 最多间隔多少帧重新识别一次
+        self.match_iou = match_iou  # 重新检测时，与已有轨迹匹配的交并比阈值
+        self.crop_change = crop_change  # 裁剪图缩略图平均灰度差超过该值则重新识别
+        self.min_score = min_score  # 识别得分低于该值的轨迹每帧都重新识别
+        self.min_flow_points = min_flow_points
+        self.tracks = []
+        self.prev_gray = None
+        self.frame_index = 0
+        self.last_det_frame = None
+        self._track_ids = itertools.count(1)
+
+    def reset(self):
+        self.tracks = []
+        self.prev_gray = None
+        self.last_det_frame = None
+
+    @staticmethod
+    def _crop_thumb(crop):
+        gray = cv2.cvtColor(np.ascontiguousarray(crop), cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, (64, 16), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    def _propagate(self, gray):
+        """用金字塔LK光流把每条轨迹的检测框平移到当前帧，跟丢返回False"""
+        h, w = gray.shape[:2]
+        all_pts, owners = [], []
+        for i, track in enumerate(self.tracks):
+            x1, y1, x2, y2 = (int(v) for v in box_rect(track['box']))
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(w, x2), min(h, y2)
+            if x2 - x1 < 4 or y2 - y1 < 4:
+                return False
+            pts = cv2.goodFeaturesToTrack(self.prev_gray[y1:y2, x1:x2], maxCorners=40,
+                                          qualityLevel=0.01, minDistance=3)
+            if pts is None or len(pts) < self.min_flow_points:
+                return False
+            pts = pts.reshape(-1, 2) + (x1, y1)
+            all_pts.append(pts)
+            owners.extend([i] * len(pts))
+        if not all_pts:
+            return True
+
+        pts = np.concatenate(all_pts).astype(np.float32).reshape(-1, 1, 2)
+        nxt, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, pts, None,
+                                                 winSize=(15, 15), maxLevel=2)
+        status = status.reshape(-1).astype(bool)
+        shifts = (nxt - pts).reshape(-1, 2)
+        owners = np.asarray(owners)
+        for i, track in enumerate(self.tracks):
+            good = status & (owners == i)
+            if good.sum() < self.min_flow_points:
+                return False
+            dx, dy = np.median(shifts[good], axis=0)
+            box = track['box'] + (dx, dy)
+            box[:, 0] = np.clip(box[:, 0], 0, w - 1)
+            box[:, 1] = np.clip(box[:, 1], 0, h - 1)
+            track['box'] = box.astype(np.float32)
+        return True
+
+    def _redetect(self, frame):
+        """完整检测一次，检测框与已有轨迹按交并比匹配，匹配上的沿用识别结果"""
+        boxes, det_scores = self.engine.detect_with_scores(frame)
+        tracks = []
+        unused = list(self.tracks)
+        for box, det_score in zip(boxes, det_scores):
+            box = np.asarray(box, dtype=np.float32)
+            best, best_iou = None, self.match_iou
+            for track in unused:
+                iou = box_iou(box, track['box'])
+                if iou >= best_iou:
+                    best, best_iou = track, iou
+            if best is None:
+                best = {'id': next(self._track_ids), 'text': '', 'score': 0.0,
+                        'thumb': None, 'rec_frame': None}
+            else:
+                unused.remove(best)
+            best['box'] = box
+            best['det_score'] = det_score
+            tracks.append(best)
+        self.tracks = tracks
+        self.last_det_frame = self.frame_index
+
+    def update(self, frame):
+        """处理一帧，返回与ShipPlateEngine.process_image相同格式的结果"""
+        timings = {'track': 0.0, 'det': 0.0, 'crop': 0.0, 'rec': 0.0}
+        t0 = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        need_det = (not self.tracks or self.prev_gray is None
+                    or self.frame_index - self.last_det_frame >= self.det_interval)
+        if not need_det and not self._propagate(gray):
+            need_det = True  # 跟丢了，立即重新检测
+        t1 = time.perf_counter()
+        timings['track'] = t1 - t0
+        if need_det:
+            self._redetect(frame)
+        t2 = time.perf_counter()
+        timings['det'] = t2 - t1
+
+        # 只重新识别变化明显、置信度低或太久没识别的轨迹
+        pending, crops = [], []
+        for track in self.tracks:
+            crop = get_rotate_crop_image(frame, track['box'])
+            if crop.size == 0:
+                continue
+            thumb = self._crop_thumb(crop)
+            stale = (track['rec_frame'] is None
+                     or track['score'] < self.min_score
+                     or self.frame_index - track['rec_frame'] >= self.rec_interval
+                     or float(np.mean(np.abs(thumb - track['thumb']))) > self.crop_change)
+            if stale:
+                pending.append((track, thumb))
+                crops.append(crop)
+        t3 = time.perf_counter()
+        timings['crop'] = t3 - t2
+        for (track, thumb), (text, score) in zip(pending, self.engine.recognize(crops)):
+            track.update(text=text, score=score, thumb=thumb, rec_frame=self.frame_index)
+        timings['rec'] = time.perf_counter() - t3
+
+        self.prev_gray = gray
+        self.frame_index += 1
+
+        result = {'text': '', 'score': 0.0, 'det_score': 0.0, 'box': None, 'regions': [], 'timings': timings,
+                  'detected': need_det, 'recognized': len(crops)}
+        drop_score = self.engine.config['drop_score']
+        for track in self.tracks:
+            if track['text'] and track['score'] >= drop_score:
+                result['regions'].append({'track': track['id'], 'text': track['text'],
+                                          'score': track['score'], 'det_score': track['det_score'],
+                                          'box': track['box'].tolist()})
+        if result['regions']:
+            best = max(result['regions'], key=lambda r: r['score'])
+            result['text'] = best['text']
+            result['score'] = best['score']
+            result['det_score'] = best['det_score']
+            result['box'] = best['box']
+        return result
@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import time
+import queue
+import sqlite3
+import argparse
+import tempfile
+import threading
+
+# 识别记录库，与界面程序原来使用的文件相同（在ocr_engine.BASE_DIR下）。
+# 本模块不导入ocr_engine和numpy，界面启动时打开数据库不必先加载cv2
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ship_recognition_data.db')
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS recognitions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        image_filename TEXT NOT NULL,
+        recognized_text TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        polygon TEXT,
+        det_score REAL,
+        rec_score REAL,
+        model_version TEXT,
+        crop_ref TEXT
+    )
+    ''',
+    # 按文本查找时常带时间范围，文本索引同时包含时间
+    'CREATE INDEX IF NOT EXISTS idx_recognitions_text ON recognitions (recognized_text, timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_recognitions_timestamp ON recognitions (timestamp)',
+    # 模糊查找用的字符三元组倒排索引：plate_texts为去重后的船牌文本，plate_grams为三元组到文本的映射，
+    # plate_index_state记录已建索引的最大记录号
+    'CREATE TABLE IF NOT EXISTS plate_texts (id INTEGER PRIMARY KEY, text TEXT NOT NULL UNIQUE)',
+    '''
+    CREATE TABLE IF NOT EXISTS plate_grams (
+        gram TEXT NOT NULL,
+        text_id INTEGER NOT NULL,
+        PRIMARY KEY (gram, text_id)
+    ) WITHOUT ROWID
+    ''',
+    'CREATE TABLE IF NOT EXISTS plate_index_state (last_id INTEGER NOT NULL)',
+]
+
+# 后来增加的列，旧库打开时自动补上：polygon为检测框四点坐标的JSON，det_score/rec_score为检测和识别得分，
+# model_version为产生结果的模型版本，crop_ref为裁剪图在CropStore中的引用
+ADDED_COLUMNS = [
+    ('polygon', 'TEXT'),
+    ('det_score', 'REAL'),
+    ('rec_score', 'REAL'),
+    ('model_version', 'TEXT'),
+    ('crop_ref', 'TEXT'),
+]
+
+INSERT_SQL = ('INSERT INTO recognitions (image_filename, recognized_text, timestamp, polygon, det_score, '
+              'rec_score, model_version, crop_ref) VALUES (?, ?, ?, ?, ?, ?, ?, ?)')
+
+GRAM_SIZE = 3
+
+
+def utc_timestamp(t=None):
+    """与SQLite的CURRENT_TIMESTAMP相同的格式（UTC）"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(t))
+
+
+def normalize_plate(text):
+    """去掉空白并转大写，模糊查找时文本按此比较"""
+    return ''.join(text.split()).upper()
+
+
+def text_grams(text):
+    """文本首尾各加一个边界符后的字符三元组集合，短文本也至少有一个"""
+    padded = '^%s$' % normalize_plate(text)
+    return {padded[i:i + GRAM_SIZE] for i in range(max(1, len(padded) - GRAM_SIZE + 1))}
+
+
+def index_new_rows(conn):
+    """把上次建索引之后新增记录中的新船牌文本加入三元组索引，返回新增的文本数；
+    在写入记录的同一事务中调用，不单独提交"""
+    row = conn.execute('SELECT last_id FROM plate_index_state').fetchone()
+    last_id = row[0] if row else 0
+    max_id = conn.execute('SELECT MAX(id) FROM recognitions').fetchone()[0] or 0
+    if max_id <= last_id:
+        return 0
+    added = 0
+    texts = conn.execute('SELECT DISTINCT recognized_text FROM recognitions WHERE id > ? AND id <= ?',
+                         (last_id, max_id)).fetchall()
+    for (text,) in texts:
+        cur = conn.execute('INSERT OR IGNORE INTO plate_texts (text) VALUES (?)', (text,))
+        if cur.rowcount:
+            conn.executemany('INSERT OR IGNORE INTO plate_grams (gram, text_id) VALUES (?, ?)',
+                             [(gram, cur.lastrowid) for gram in text_grams(text)])
+            added += 1
+    if row is None:
+        conn.execute('INSERT INTO plate_index_state (last_id) VALUES (?)', (max_id,))
+    else:
+        conn.execute('UPDATE plate_index_state SET last_id = ?', (max_id,))
+    return added
+
+
+def connect(path=DEFAULT_DB_PATH):
+    """打开识别记录库：WAL模式下写入不阻塞读取，synchronous=NORMAL只在检查点时刷盘"""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def init_schema(conn):
+    """建表建索引，为旧版建的表补上新增的列，并为已有的记录（如旧版界面写入的）补建模糊查找索引"""
+    for statement in SCHEMA:
+        conn.execute(statement)
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(recognitions)')}
+    for name, kind in ADDED_COLUMNS:
+        if name not in columns:
+            conn.execute('ALTER TABLE recognitions ADD COLUMN %s %s' % (name, kind))
+    index_new_rows(conn)
+    conn.commit()
+
+
+class RecognitionStore:
+    """识别记录的后台写入：add只把记录放进队列，专门的写线程攒够batch_size条或等满
+    flush_interval秒后一次事务提交，避免每条记录一次fsync。写入失败时调用on_error(错误信息)，
+    该回调在写线程中执行"""
+
+    def __init__(self, path=DEFAULT_DB_PATH, batch_size=500, flush_interval=0.5, max_queue=100000,
+                 metrics=None, on_error=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.metrics = metrics
+        self.on_error = on_error
+        self.written = 0
+        self.failed = 0
+        # 建表在调用线程中完成，库文件有问题时立即报错
+        conn = connect(path)
+        init_schema(conn)
+        conn.close()
+        self.queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def add(self, image_filename, recognized_text, timestamp=None, polygon=None, det_score=None,
+            rec_score=None, model_version=None, crop_ref=None):
+        """加入一条识别记录，时间戳默认取加入时刻；队列满时阻塞，对上游形成背压"""
+        self.queue.put((image_filename, recognized_text, timestamp or utc_timestamp(),
+                        json.dumps(polygon) if polygon is not None else None,
+                        det_score, rec_score, model_version, crop_ref))
+
+    def add_result(self, image_filename, result, timestamp=None):
+        """加入一条识别结果：recognize_paths的记录、引擎的结果或视频的船牌事件，
+        文本、检测框、检测/识别得分、模型版本和裁剪图引用分别取自
+        text、box、det_score、score、model_version、crop字段（后几项可以没有）"""
+        self.add(image_filename, result['text'], timestamp, result.get('box'), result.get('det_score'),
+                 result.get('score'), result.get('model_version'), result.get('crop'))
+
+    def flush(self):
+        """等待已加入的记录全部提交"""
+        self.queue.join()
+
+    def close(self):
+        """提交剩余记录并结束写线程"""
+        self.queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        conn = connect(self.path)
+        closing = False
+        while not closing:
+            rows = []
+            item = self.queue.get()
+            taken = 1
+            if item is None:
+                closing = True
+            else:
+                rows.append(item)
+            # 第一条记录到达后最多再等flush_interval秒，积压时很快攒满一批
+            deadline = time.monotonic() + self.flush_interval
+            while rows and not closing and len(rows) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                taken += 1
+                if item is None:
+                    closing = True
+                else:
+                    rows.append(item)
+            try:
+                if rows:
+                    self._write(conn, rows)
+            finally:
+                # 写入出什么错都要标记完成，否则flush()会一直等下去
+                for _ in range(taken):
+                    self.queue.task_done()
+        conn.close()
+
+    def _write(self, conn, rows):
+        t0 = time.perf_counter()
+        try:
+            conn.executemany(INSERT_SQL, rows)
+            index_new_rows(conn)
+            conn.commit()
+        except Exception as e:
+            # 除数据库错误外，格式不对的记录或建索引出错也只丢弃这一批，写线程继续处理后面的记录
+            conn.rollback()
+            self.failed += len(rows)
+            if self.metrics is not None:
+                self.metrics.inc('db_errors', len(rows))
+            if self.on_error is not None:
+                self.on_error(str(e) if isinstance(e, sqlite3.Error) else '%s: %s' % (type(e).__name__, e))
+            return
+        self.written += len(rows)
+        if self.metrics is not None:
+            self.metrics.observe('db_write', time.perf_counter() - t0)
+            self.metrics.inc('db_writes', len(rows))
+
+
+def bench(path, rows, batch_size, flush_interval):
+    """写入压测：一个线程尽快加入rows条记录，同时另一个连接不停地按文本和时间查询，
+    返回(每分钟写入条数, 查询次数, 查询耗时p50, p95 毫秒)"""
+    import numpy as np
+    store = RecognitionStore(path, batch_size=batch_size, flush_interval=flush_interval)
+    stop = threading.Event()
+    query_times = []
+
+    def reader():
+        conn = connect(path)
+        k = 0
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            conn.execute('SELECT COUNT(*) FROM recognitions WHERE recognized_text = ?',
+                         ('浙岱渔%05d' % (k % 1000),)).fetchone()
+            conn.execute('SELECT image_filename, recognized_text FROM recognitions '
+                         'ORDER BY timestamp DESC LIMIT 20').fetchall()
+            query_times.append(time.perf_counter() - t0)
+            k += 1
+        conn.close()
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    t0 = time.perf_counter()
+    for i in range(rows):
+        store.add('bench_%06d.jpg' % i, '浙岱渔%05d' % (i % 1000))
+    store.close()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    thread.join()
+    if store.failed:
+        raise RuntimeError('%d 条记录写入失败' % store.failed)
+    ms = np.asarray(query_times or [0.0]) * 1000
+    return rows * 60.0 / elapsed, len(query_times), float(np.percentile(ms, 50)), float(np.percentile(ms, 95))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='识别记录库写入压测：后台分组提交，同时并发查询')
+    parser.add_argument('--rows', type=int, default=60000, help='写入的记录数')
+    parser.add_argument('--batch-size', type=int, default=500, help='每次事务提交的最大记录数')
+    parser.add_argument('--flush-interval', type=float, default=0.5, help='攒批的最长等待秒数')
+    parser.add_argument('--path', default=None, help='压测用的库文件，默认使用临时文件')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.path or os.path.join(tmp, 'bench.db')
+        per_minute, queries, p50, p95 = bench(path, args.rows, args.batch_size, args.flush_interval)
+    print('写入 %d 条，%.0f 条/分钟；并发查询 %d 次，p50 %.2fms，p95 %.2fms' % (
+        args.rows, per_minute, queries, p50, p95))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import sqlite3
+
+# 缓存库与识别记录库放在同一目录（即ocr_engine.BASE_DIR）；不导入ocr_engine，界面启动时不必先加载cv2
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ocr_cache.db')
+
+# 只缓存识别结果本身，耗时等运行信息不入库；crop为裁剪图引用，保存了裁剪图时才有；
+# rec_routes、detections同ocr_engine.OPTIONAL_RESULT_FIELDS，rec_cascade和keep_detections计入模型指纹，
+# 开启与否的结果分开缓存
+CACHED_FIELDS = ('text', 'score', 'det_score', 'box', 'regions', 'crop', 'rec_routes', 'detections')
+
+
+class ResultCache:
+    """按图片内容哈希和模型指纹缓存识别结果，超出容量按最近最少使用淘汰
+
+    不同配置的引擎（如界面和batch_run）可以共用一个缓存库，各自只读写自己指纹下的结果；
+    模型或阈值变化后旧指纹的结果不再被使用，随LRU淘汰逐渐清出"""
+
+    def __init__(self, fingerprint, path=DEFAULT_CACHE_PATH, max_entries=100000):
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, timeout=30)
+        # 多进程同时读写同一个缓存库时WAL模式冲突更少
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # 早期版本只以image_hash为主键，一张图片只能存一个指纹的结果；缓存可以重建，直接换成新表
+        pk = [row[1] for row in self.conn.execute('PRAGMA table_info(results)') if row[5]]
+        if pk == ['image_hash']:
+            self.conn.execute('DROP TABLE results')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS results (
+                image_hash TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                result TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (image_hash, fingerprint)
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_results_last_used ON results (last_used)')
+        self.conn.commit()
+        self.count = self.conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    @classmethod
+    def for_engine(cls, engine, path=DEFAULT_CACHE_PATH, max_entries=100000):
+        return cls(engine.fingerprint, path, max_entries)
+
+    def get(self, image_hash):
+        """命中返回结果字典并刷新使用时间，未命中返回None"""
+        row = self.conn.execute('SELECT result FROM results WHERE image_hash = ? AND fingerprint = ?',
+                                (image_hash, self.fingerprint)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.conn.execute('UPDATE results SET last_used = ? WHERE image_hash = ? AND fingerprint = ?',
+                          (time.time(), image_hash, self.fingerprint))
+        self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, image_hash, result):
+        payload = json.dumps({k: result[k] for k in CACHED_FIELDS if k in result}, ensure_ascii=False)
+        now = time.time()
+        # 先尝试覆盖已有记录，只有真正新增一行时才计数；INSERT OR REPLACE覆盖时rowcount同样为1
+        cur = self.conn.execute('UPDATE results SET result = ?, last_used = ? WHERE image_hash = ? AND fingerprint = ?',
+                                (payload, now, image_hash, self.fingerprint))
+        if not cur.rowcount:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO results (image_hash, fingerprint, result, last_used) VALUES (?, ?, ?, ?)',
+                (image_hash, self.fingerprint, payload, now))
+            self.count += 1
+        self.conn.commit()
+        if self.count > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        """淘汰最久未使用的记录，一次多删一些，避免每次写入都触发淘汰"""
+        # 其他进程也可能在写同一个缓存库，按实际行数决定删多少
+        self.count = self.conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        if self.count <= self.max_entries:
+            return
+        target = int(self.max_entries * 0.9)
+        self.conn.execute('''
+            DELETE FROM results WHERE image_hash IN (
+                SELECT image_hash FROM results ORDER BY last_used LIMIT ?
+            )
+        ''', (max(0, self.count - target),))
+        self.conn.commit()
+        self.count = self.conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        self.conn.close()
@@ -1,46 +1,68 @@
+import time
+STARTED = time.perf_counter()  # 启动耗时从这里算起，须在其他导入之前
 import sys
 import sqlite3  # 导入sqlite3模块
 import datetime  # 用于时间戳
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QLabel, QVBoxLayout,
                              QHBoxLayout, QWidget, QPushButton, QFileDialog,
-                             QFrame, QSizePolicy, QMessageBox)  # 添加QMessageBox
-from PyQt5.QtGui import QPixmap, QFont, QIcon, QColor, QPalette
-from PyQt5.QtCore import Qt, QCoreApplication, QSize
+                             QFrame, QSizePolicy, QMessageBox,  # 添加QMessageBox
+                             QListWidget, QListWidgetItem, QProgressBar, QLineEdit)
+from PyQt5.QtGui import QFont, QIcon, QColor, QPalette
+from PyQt5.QtCore import Qt, QSize, pyqtSignal
 import os
-import cv2
-import numpy as np
-from paddleocr import PaddleOCR
+from ocr_worker import OcrWorker, format_startup_report, rgb_pixmap
+from metrics import start_metrics_from_env
+from recognition_store import RecognitionStore, DEFAULT_DB_PATH
 
 
 class ShipLicenseRecognitionApp(QMainWindow):
+    dbError = pyqtSignal(str)  # 后台写库失败时从写线程发出
+    searchDone = pyqtSignal(int, object)  # 查找序号、结果列表，从查找线程发出
+    searchFailed = pyqtSignal(int, str)  # 查找序号、错误信息，从查找线程发出
+
     def __init__(self):
         super().__init__()
         self.current_image_name = None  # 用于存储当前图片的文件名
         self.current_recognized_text = None  # 用于存储当前识别的文本
+        self.current_result = None  # 当前显示的识别结果，保存时写入检测框、得分和裁剪图
+        self.results = {}  # 任务号 -> (图片路径, 识别结果)
+        self.follow_latest = True  # 用户没有点开较早的记录时，新结果出来就自动显示
 
         self.initUI()
-        # 初始化PaddleOCR
-        self.ocr = PaddleOCR(
-            det_model_dir='model/det',
-            rec_model_dir='model/rec',
-            use_angle_cls=False,
-            use_gpu=True  # 请确保您的环境支持GPU并且PaddleOCR GPU版本已正确安装
-        )
+        self.window_time = time.perf_counter() - STARTED
+        # 识别在后台线程中进行，界面不再卡顿；推理库的导入、模型加载和预热也在后台进行，
+        # 窗口先显示出来，加载期间上传的图片排队等待
+        # 设置环境变量SHIP_OCR_METRICS_PORT/SHIP_OCR_METRICS_LOG_INTERVAL时开启性能指标
+        self.metrics = start_metrics_from_env()
+        self.worker = OcrWorker(max_queue=16, metrics=self.metrics, started=STARTED)
+        self.worker.modelWarming.connect(lambda: self.status_label.setText("模型预热中..."))
+        self.worker.modelReady.connect(self.onModelReady)
+        self.worker.modelFailed.connect(lambda msg: self.status_label.setText("模型加载失败: " + msg))
+        self.worker.jobStarted.connect(self.onJobStarted)
+        self.worker.jobFinished.connect(self.onJobFinished)
+        self.worker.jobFailed.connect(self.onJobFailed)
+        self.worker.progress.connect(self.onProgress)
+        self.worker.start()
         self.init_db()  # 初始化数据库
 
     def init_db(self):
-        """初始化数据库连接和表"""
-        self.db_conn = sqlite3.connect('ship_recognition_data.db')
-        self.db_cursor = self.db_conn.cursor()
-        self.db_cursor.execute('''
-            CREATE TABLE IF NOT EXISTS recognitions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                image_filename TEXT NOT NULL,
-                recognized_text TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        self.db_conn.commit()
+        """打开识别记录库，记录由后台线程分组写入，界面线程不等待磁盘"""
+        self.dbError.connect(lambda msg: QMessageBox.warning(self, "数据库错误", f"保存数据失败: {msg}"))
+        self.searchDone.connect(self.onSearchDone)
+        self.searchFailed.connect(self.onSearchFailed)
+        # 查找和裁剪图目录第一次用到时再创建，启动时不必导入它们依赖的numpy/cv2
+        self.searcher = None
+        self.crops = None
+        # 查找在单独的线程中进行（查找连接只在该线程中使用），等待写线程提交时界面不卡顿；
+        # search_seq为最近一次查找的序号，较早查找的结果到达时丢弃
+        self.search_pool = None
+        self.search_seq = 0
+        self.search_query = ''
+        try:
+            self.store = RecognitionStore(metrics=self.metrics, on_error=self.dbError.emit)
+        except sqlite3.Error as e:
+            self.store = None
+            QMessageBox.warning(self, "数据库错误", f"打开数据库失败: {e}")
 
     def initUI(self):
         # 设置主窗口属性
@@ -82,6 +104,41 @@ class ShipLicenseRecognitionApp(QMainWindow):
         """)
         left_layout.addWidget(self.image_label)
 
+        # 识别记录列表，点击可回看并保存之前的识别结果
+        self.history_list = QListWidget(self)
+        self.history_list.setFixedHeight(160)
+        self.history_list.setStyleSheet("""
+            QListWidget {
+                font-size: 14px; color: #2c3e50; background-color: #f8f9fa;
+                border-radius: 8px; border: 1px solid #e0e0e0;
+            }
+        """)
+        self.history_list.itemClicked.connect(self.onHistoryClicked)
+        left_layout.addWidget(self.history_list)
+
+        # 历史记录模糊查找，容忍一两个字的识别差异
+        search_layout = QHBoxLayout()
+        self.search_edit = QLineEdit(self)
+        self.search_edit.setPlaceholderText("输入船牌号，模糊查找历史记录")
+        self.search_edit.setStyleSheet("font-size: 14px; padding: 6px; border-radius: 6px; border: 1px solid #d0d0d0;")
+        self.search_edit.returnPressed.connect(self.searchHistory)
+        search_layout.addWidget(self.search_edit)
+        search_button = QPushButton("查找", self)
+        search_button.setStyleSheet("font-size: 14px; padding: 6px 16px;")
+        search_button.clicked.connect(self.searchHistory)
+        search_layout.addWidget(search_button)
+        left_layout.addLayout(search_layout)
+
+        self.search_list = QListWidget(self)
+        self.search_list.setFixedHeight(140)
+        self.search_list.setStyleSheet("""
+            QListWidget {
+                font-size: 14px; color: #2c3e50; background-color: #f8f9fa;
+                border-radius: 8px; border: 1px solid #e0e0e0;
+            }
+        """)
+        left_layout.addWidget(self.search_list)
+
         right_panel = QFrame()
         right_panel.setFrameShape(QFrame.StyledPanel)
         right_panel.setStyleSheet("""
@@ -172,6 +229,18 @@ class ShipLicenseRecognitionApp(QMainWindow):
         result_layout.addWidget(self.plate_number_label)
         right_layout.addWidget(result_frame)
 
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%v / %m")
+        self.progress_bar.setAlignment(Qt.AlignCenter)
+        right_layout.addWidget(self.progress_bar)
+
+        self.status_label = QLabel("模型加载中...", self)
+        self.status_label.setAlignment(Qt.AlignCenter)
+        self.status_label.setStyleSheet("QLabel { font-size: 14px; color: #7f8c8d; }")
+        right_layout.addWidget(self.status_label)
+
         button_frame = QFrame()
         button_layout = QVBoxLayout(button_frame)
         button_layout.setSpacing(15)
@@ -208,6 +277,18 @@ class ShipLicenseRecognitionApp(QMainWindow):
         self.save_db_button.setEnabled(False)  # 初始时禁用
         button_layout.addWidget(self.save_db_button)
 
+        cancel_button = QPushButton("取消排队任务", self)
+        cancel_button.setStyleSheet("""
+            QPushButton {
+                background-color: #f39c12; color: white; font-size: 18px; font-weight: bold;
+                padding: 12px; border-radius: 8px; border: none;
+            }
+            QPushButton:hover { background-color: #d68910; }
+            QPushButton:pressed { background-color: #9c640c; }
+        """)
+        cancel_button.clicked.connect(self.cancelPending)
+        button_layout.addWidget(cancel_button)
+
         exit_button = QPushButton("退出系统", self)
         exit_button.setIcon(QIcon('icon/exit-icon.png'))  # 请确保图标文件存在
         exit_button.setIconSize(QSize(24, 24))
@@ -240,129 +321,181 @@ class ShipLicenseRecognitionApp(QMainWindow):
         """)
         self.show()
 
+    def onModelReady(self, report):
+        report['window'] = self.window_time
+        text = format_startup_report(report)
+        self.status_label.setText("模型已就绪，" + text)
+        print(text, file=sys.stderr)
+
     def uploadImage(self):
-        file_dialog = QFileDialog()
-        file_dialog.setNameFilter("图片文件 (*.png *.jpg *.bmp)")
-        image_path, _ = file_dialog.getOpenFileName(self, '选择图片', '', 'Image Files (*.png *.jpg *.bmp)')
-
-        if image_path:
-            self.current_image_name = os.path.basename(image_path)  # 获取文件名
-            self.current_recognized_text = None  # 重置当前识别文本
-            self.save_db_button.setEnabled(False)  # 上传新图片后，先禁用保存按钮
-
-            pixmap = QPixmap(image_path)
-            self.image_label.setPixmap(pixmap.scaled(
-                self.image_label.width(), self.image_label.height(),  # 使用实际大小
+        # 可一次选择多张图片，加入后台队列依次识别
+        image_paths, _ = QFileDialog.getOpenFileNames(self, '选择图片', '', 'Image Files (*.png *.jpg *.bmp)')
+
+        rejected = 0
+        for image_path in image_paths:
+            if self.worker.submit(image_path) is None:
+                rejected += 1
+        if rejected:
+            self.status_label.setText("队列已满，%d 张图片未加入" % rejected)
+
+    def cancelPending(self):
+        self.worker.cancelAll()
+        self.status_label.setText("已取消排队中的任务")
+
+    def onProgress(self, done, total):
+        self.progress_bar.setRange(0, max(total, 1))
+        self.progress_bar.setValue(done)
+
+    def onJobStarted(self, job_id, image_path):
+        self.status_label.setText("正在识别: %s（排队 %d 张）" % (
+            os.path.basename(image_path), self.worker.pendingCount()))
+
+    def onJobFinished(self, job_id, image_path, result):
+        self.results[job_id] = (image_path, result)
+        item = QListWidgetItem("%s  —  %s" % (os.path.basename(image_path), result['text'] or "未识别"))
+        item.setData(Qt.UserRole, job_id)
+        self.history_list.addItem(item)
+        if self.follow_latest:  # 用户没有在回看较早的记录时，自动显示最新结果并选中它
+            self.history_list.setCurrentItem(item)
+            self.showResult(job_id)
+        if self.worker.pendingCount() == 0:
+            self.status_label.setText("识别完成")
+
+    def onJobFailed(self, job_id, image_path, message):
+        self.history_list.addItem("%s  —  失败: %s" % (os.path.basename(image_path), message))
+
+    def onHistoryClicked(self, item):
+        # 点的是最新一条时恢复自动显示，点较早的记录则停在该记录上
+        self.follow_latest = self.history_list.row(item) == self.history_list.count() - 1
+        job_id = item.data(Qt.UserRole)
+        if job_id in self.results:
+            self.showResult(job_id)
+
+    def showResult(self, job_id):
+        image_path, result = self.results[job_id]
+        self.current_result = result
+        self.current_image_name = os.path.basename(image_path)  # 获取文件名
+        self.current_recognized_text = None  # 重置当前识别文本
+        self.save_db_button.setEnabled(False)
+
+        # 识别线程已把图片解码并缩小成RGB数组，这里不再读文件、不再解码原图
+        self.image_label.setPixmap(rgb_pixmap(result['display']).scaled(
+            self.image_label.width(), self.image_label.height(),  # 使用实际大小
+            Qt.KeepAspectRatio,
+            Qt.SmoothTransformation
+        ))
+
+        plate_img = result['plate']  # RGB，识别线程中已转换好
+        if plate_img is not None and plate_img.size > 0:
+            self.plate_image_label.setStyleSheet("""
+                QLabel {
+                    min-height: 150px; background-color: #eef2f7; border-radius: 8px;
+                    border: 1px dashed #a0a0a0; font-size: 14px; color: #7f8c8d;
+                }
+            """)
+            self.plate_image_label.setPixmap(rgb_pixmap(plate_img).scaled(
+                self.plate_image_label.width(), self.plate_image_label.height(),  # 使用实际大小
                 Qt.KeepAspectRatio,
                 Qt.SmoothTransformation
             ))
-
-            self.plate_image_label.setText("检测中...")
+        else:
+            self.plate_image_label.setText("未检测到船牌")
             self.plate_image_label.setStyleSheet("""
                 QLabel {
-                    min-height: 150px; background-color: #eef2f7; border-radius: 8px;
-                    border: 1px dashed #a0a0a0; font-size: 14px; color: #7f8c8d;
+                    min-height: 150px; background-color: #fde8e8; border-radius: 8px;
+                    border: 1px dashed #e74c3c; font-size: 14px; color: #c0392b;
                 }
             """)
-            self.plate_number_label.setText("识别中...")
-            QApplication.processEvents()
-
-            plate_image_qimg, plate_number = self.detectAndRecognizeShipLicense(image_path)
-
-            if plate_image_qimg is not None:
-                self.plate_image_label.setPixmap(QPixmap.fromImage(plate_image_qimg).scaled(
-                    self.plate_image_label.width(), self.plate_image_label.height(),  # 使用实际大小
-                    Qt.KeepAspectRatio,
-                    Qt.SmoothTransformation
-                ))
-            else:
-                self.plate_image_label.setText("未检测到船牌")
-                self.plate_image_label.setStyleSheet("""
-                    QLabel {
-                        min-height: 150px; background-color: #fde8e8; border-radius: 8px;
-                        border: 1px dashed #e74c3c; font-size: 14px; color: #c0392b;
-                    }
-                """)
-
-            if plate_number:
-                self.plate_number_label.setText(plate_number)
-                self.current_recognized_text = plate_number  # 存储识别结果
-                self.save_db_button.setEnabled(True)  # 识别成功，激活保存按钮
-            else:
-                self.plate_number_label.setText("未能识别船牌号码")
-                self.current_recognized_text = None
-                self.save_db_button.setEnabled(False)
-
-    def detectAndRecognizeShipLicense(self, image_path):
-        img = cv2.imread(image_path)
-        if img is None:
-            return None, ""
-
-        result = self.ocr.ocr(img, cls=False)
-
-        if not result or not result[0]:
-            return None, ""
-
-        boxes = [line[0] for line in result[0]]
-        texts = [line[1][0] for line in result[0]]
-        scores = [line[1][1] for line in result[0]]
-
-        if not scores:  # 以防万一scores为空
-            return None, ""
-
-        # 找出得分最高的文本区域
-        best_idx = scores.index(max(scores))
-        best_box = boxes[best_idx]
-        best_text = texts[best_idx]
-
-        x_coords = [int(p[0]) for p in best_box]
-        y_coords = [int(p[1]) for p in best_box]
-        x1, x2 = min(x_coords), max(x_coords)
-        y1, y2 = min(y_coords), max(y_coords)
-
-        h_img, w_img = img.shape[:2]
-        x1, y1 = max(0, x1), max(0, y1)
-        x2, y2 = min(w_img, x2), min(h_img, y2)
-
-        if x1 >= x2 or y1 >= y2:  # 确保裁剪区域有效
-            return None, best_text  # 即使无法裁剪，也可能识别出了文本
-
-        plate_img_cv = img[y1:y2, x1:x2]
-
-        q_img = None
-        if plate_img_cv.size > 0:
-            try:
-                plate_img_rgb = cv2.cvtColor(plate_img_cv, cv2.COLOR_BGR2RGB)
-                h, w, ch = plate_img_rgb.shape
-                bytes_per_line = ch * w
-                from PyQt5.QtGui import QImage
-                q_img = QImage(plate_img_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
-            except cv2.error as e:
-                print(f"OpenCV error during color conversion: {e}")
-                return None, best_text  # 返回已识别文本，即使图像处理失败
 
-        return q_img, best_text
+        plate_number = result['text']
+        if plate_number:
+            self.plate_number_label.setText(plate_number)
+            self.current_recognized_text = plate_number  # 存储识别结果
+            self.save_db_button.setEnabled(True)  # 识别成功，激活保存按钮
+        else:
+            self.plate_number_label.setText("未能识别船牌号码")
 
     def saveToDatabase(self):
         """将当前识别结果保存到数据库"""
-        if self.current_image_name and self.current_recognized_text:
+        if self.store is None:
+            QMessageBox.warning(self, "数据库错误", "数据库不可用，无法保存。")
+        elif self.current_image_name and self.current_recognized_text:
+            result = self.current_result
             try:
-                self.db_cursor.execute(
-                    "INSERT INTO recognitions (image_filename, recognized_text) VALUES (?, ?)",
-                    (self.current_image_name, self.current_recognized_text)
-                )
-                self.db_conn.commit()
-                QMessageBox.information(self, "成功", "数据已成功保存到数据库！")
-                self.save_db_button.setEnabled(False)  # 保存后禁用，避免重复保存同一条记录
-            except sqlite3.Error as e:
-                QMessageBox.warning(self, "数据库错误", f"保存数据失败: {e}")
+                if self.crops is None:
+                    from crop_store import CropStore, crop_dir_for
+                    self.crops = CropStore(crop_dir_for(DEFAULT_DB_PATH))
+                crop_ref = self.crops.put(result['crop_image'])
+            except (OSError, ValueError) as e:
+                crop_ref = None
+                QMessageBox.warning(self, "裁剪图保存失败", f"记录仍会保存，但没有裁剪图: {e}")
+            self.store.add(self.current_image_name, self.current_recognized_text, polygon=result['box'],
+                           det_score=result.get('det_score'), rec_score=result['score'],
+                           model_version=result['model_version'], crop_ref=crop_ref)
+            self.status_label.setText("已保存: %s" % self.current_recognized_text)
+            self.save_db_button.setEnabled(False)  # 保存后禁用，避免重复保存同一条记录
         else:
             QMessageBox.warning(self, "无数据", "没有可保存的图片或识别结果。")
 
+    def searchHistory(self):
+        """在识别记录库中模糊查找输入的船牌号，列出相近的船牌及出现次数"""
+        query = self.search_edit.text().strip()
+        if not query:
+            return
+        if self.store is None:
+            QMessageBox.warning(self, "数据库错误", "数据库不可用，无法查找。")
+            return
+        if self.search_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.search_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='plate-search')
+        self.search_seq += 1
+        self.search_query = query
+        self.search_list.clear()
+        self.search_list.addItem("查找中...")
+        self.search_pool.submit(self._runSearch, self.search_seq, query)
+
+    def _runSearch(self, seq, query):
+        """在查找线程中执行：等刚保存的记录提交后再查，结果通过信号交回界面线程"""
+        try:
+            self.store.flush()  # 刚保存的记录也能查到
+            if self.searcher is None:
+                from plate_search import PlateSearch
+                self.searcher = PlateSearch()
+            self.searchDone.emit(seq, self.searcher.search(query))
+        except Exception as e:
+            self.searchFailed.emit(seq, str(e))
+
+    def _closeSearch(self):
+        if self.searcher is not None:
+            self.searcher.close()
+
+    def onSearchDone(self, seq, results):
+        if seq != self.search_seq:
+            return
+        self.search_list.clear()
+        for r in results:
+            self.search_list.addItem("%s  距离 %d  出现 %d 次  最近 %s" % (
+                r['text'], r['distance'], r['sightings'], r['last_seen']))
+        if not results:
+            self.search_list.addItem("没有找到与 %s 相近的船牌" % self.search_query)
+
+    def onSearchFailed(self, seq, message):
+        if seq != self.search_seq:
+            return
+        self.search_list.clear()
+        QMessageBox.warning(self, "数据库错误", f"查找失败: {message}")
+
     def closeEvent(self, event):
-        """关闭窗口前关闭数据库连接"""
-        if self.db_conn:
-            self.db_conn.close()
+        """关闭窗口前结束后台识别线程，并等待未提交的记录写入数据库"""
+        self.worker.stop()
+        if self.search_pool is not None:
+            # 查找连接在查找线程中创建，也在那里关闭；进行中的查找先完成
+            self.search_pool.submit(self._closeSearch)
+            self.search_pool.shutdown()
+        if self.store is not None:
+            self.store.close()
+        if self.metrics is not None:
+            self.metrics.close()
         super().closeEvent(event)
 
 
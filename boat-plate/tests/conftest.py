@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 各模块都是以boat-plate为工作目录直接运行的脚本，测试时同样从该目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
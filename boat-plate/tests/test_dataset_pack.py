@@ -0,0 +1,71 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from dataset_pack import pack, PackedDataset
+
+
+def write_images(root, count, shape):
+    rng = np.random.RandomState(0)
+    images = []
+    for k in range(count):
+        img = rng.randint(0, 256, size=shape, dtype=np.uint8)
+        cv2.imwrite(str(root / ('%d.png' % k)), img)
+        images.append(img)
+    return images
+
+
+def test_rec_round_trip(tmp_path):
+    images = write_images(tmp_path, 5, (32, 100, 3))
+    (tmp_path / 'rec.txt').write_text(''.join('%d.png\t浙岱渔%d\n' % (k, k) for k in range(5)), encoding='utf-8')
+    count, skipped, _, _ = pack(str(tmp_path / 'rec.txt'), str(tmp_path / 'rec.pack'), 'rec', height=64)
+    assert (count, skipped) == (5, 0)
+
+    ds = PackedDataset(str(tmp_path / 'rec.pack'))
+    assert len(ds) == 5
+    for k in range(5):
+        img, label = ds[k]
+        assert label == '浙岱渔%d' % k
+        assert ds.record(k)[0] == '%d.png' % k
+        np.testing.assert_array_equal(img, images[k])  # PNG无损，未超过height不缩放
+    np.testing.assert_allclose(ds.aspect_ratios(), 100 / 32.0)
+
+
+def test_det_resize_scales_boxes(tmp_path):
+    write_images(tmp_path, 1, (400, 800, 3))
+    boxes = [{'transcription': '浙岱渔1', 'points': [[100, 100], [300, 100], [300, 200], [100, 200]]}]
+    (tmp_path / 'det.txt').write_text('0.png\t%s\n' % json.dumps(boxes, ensure_ascii=False), encoding='utf-8')
+    pack(str(tmp_path / 'det.txt'), str(tmp_path / 'det.pack'), 'det', max_side=400)
+
+    img, label = PackedDataset(str(tmp_path / 'det.pack'))[0]
+    assert img.shape == (200, 400, 3)
+    assert json.loads(label) == [{'transcription': '浙岱渔1', 'points': [[50, 50], [150, 50], [150, 100], [50, 100]]}]
+
+
+def test_bad_lines_are_skipped(tmp_path):
+    write_images(tmp_path, 3, (10, 10, 3))
+    (tmp_path / 'rec.txt').write_text('0.png\ta\n1.png\n\nmissing.png\tb\n2.png\tc\n', encoding='utf-8')
+    count, skipped, _, _ = pack(str(tmp_path / 'rec.txt'), str(tmp_path / 'rec.pack'), 'rec')
+    assert (count, skipped) == (3, 1)  # 没有制表符的行按空文本打包，读不出的图片跳过
+    ds = PackedDataset(str(tmp_path / 'rec.pack'))
+    assert [ds[k][1] for k in range(len(ds))] == ['a', '', 'c']
+
+    (tmp_path / 'det.txt').write_text('0.png\t[]\n1.png\tnot json\n2.png\n', encoding='utf-8')
+    count, skipped, _, _ = pack(str(tmp_path / 'det.txt'), str(tmp_path / 'det.pack'), 'det')
+    assert (count, skipped) == (1, 2)
+
+
+@pytest.mark.parametrize('num_shards', [1, 2, 3])
+def test_shards_partition_samples(tmp_path, num_shards):
+    write_images(tmp_path, 7, (8, 8, 3))
+    (tmp_path / 'rec.txt').write_text(''.join('%d.png\t%d\n' % (k, k) for k in range(7)), encoding='utf-8')
+    pack(str(tmp_path / 'rec.txt'), str(tmp_path / 'rec.pack'), 'rec')
+
+    shards = [PackedDataset(str(tmp_path / 'rec.pack'), k, num_shards) for k in range(num_shards)]
+    labels = [ds[i][1] for ds in shards for i in range(len(ds))]
+    assert sorted(labels, key=int) == [str(k) for k in range(7)]
+    assert max(map(len, shards)) - min(map(len, shards)) <= 1
+    with pytest.raises(ValueError):
+        PackedDataset(str(tmp_path / 'rec.pack'), num_shards, num_shards)
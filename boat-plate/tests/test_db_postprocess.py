@@ -0,0 +1,53 @@
+import cv2
+import numpy as np
+import pytest
+
+from db_postprocess import FastDBPostProcess, box_score_masked, quad_mean_scores, compare_boxes
+
+
+def probability_map(seed, size=640, count=12):
+    """随机画一些旋转的文本条并模糊，近似检测模型输出的概率图"""
+    rng = np.random.RandomState(seed)
+    pred = np.zeros((size, size), dtype=np.float32)
+    for _ in range(count):
+        center = rng.uniform(40, size - 40, 2)
+        rect_size = (rng.uniform(20, 200), rng.uniform(8, 40))
+        corners = cv2.boxPoints((tuple(center), rect_size, rng.uniform(-30, 30)))
+        cv2.fillPoly(pred, [np.int32(np.round(corners))], float(rng.uniform(0.75, 1.0)))
+    return cv2.GaussianBlur(pred, (5, 5), 0)
+
+
+def test_quad_mean_scores_match_masked_mean():
+    rng = np.random.RandomState(0)
+    pred = rng.uniform(0, 1, (120, 160)).astype(np.float32)
+    centers = rng.uniform(-10, 170, (300, 2))
+    quads = np.stack([cv2.boxPoints((tuple(c), tuple(rng.uniform(3, 60, 2)), rng.uniform(-90, 90)))
+                      for c in centers]).astype(np.float32)
+    # 部分框超出图像边界，走逐个画掩码的路径
+    expected = [box_score_masked(pred, quad) for quad in quads]
+    np.testing.assert_allclose(quad_mean_scores(pred, quads), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_compare_boxes():
+    box = np.array([[0, 0], [10, 0], [10, 5], [0, 5]])
+    assert compare_boxes([box], [np.roll(box, 1, axis=0) + 1]) == (1.0, 0)
+    assert compare_boxes([box], []) == (0.0, 1)
+    assert compare_boxes([], [box]) == (0.0, 1)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_paddle_db_postprocess(seed):
+    # 参照实现为PaddleOCR自带的DBPostProcess，未安装paddleocr时跳过
+    module = pytest.importorskip('paddleocr.ppocr.postprocess.db_postprocess')
+    options = dict(thresh=0.3, box_thresh=0.6, max_candidates=1000, unclip_ratio=1.5)
+    reference, fast = module.DBPostProcess(**options), FastDBPostProcess(**options)
+    pred = probability_map(seed)
+    bitmap = pred > options['thresh']
+    ref_boxes, ref_scores = reference.boxes_from_bitmap(pred, bitmap, 1280, 1280)
+    boxes, scores = fast.boxes_from_bitmap(pred, bitmap, 1280, 1280)
+    assert len(ref_boxes) > 0
+    # 文档承诺：框数相同，角点偏差在概率图上不超过2个像素（这里输出放大了2倍）
+    worst, mismatched = compare_boxes(ref_boxes, boxes)
+    assert mismatched == 0
+    assert worst / 2 <= 2.0
+    np.testing.assert_allclose(sorted(scores), sorted(ref_scores), rtol=1e-4)
@@ -0,0 +1,71 @@
+import json
+import asyncio
+
+import pytest
+
+import ocr_service
+from ocr_service import OcrService
+
+
+async def _exchange(service, data, hold=False):
+    """发送原始请求字节，返回(状态码, 响应JSON)；hold为True时发完不关闭写端"""
+    server = await asyncio.start_server(service._handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(data)
+        await writer.drain()
+        if not hold:
+            writer.write_eof()
+        response = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+    finally:
+        server.close()
+        await server.wait_closed()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+
+def exchange(data, hold=False):
+    service = OcrService({})
+    try:
+        return asyncio.run(_exchange(service, data, hold))
+    finally:
+        service.batcher.close()
+        service._decode_pool.shutdown(wait=False)
+
+
+def post(body, content_type='application/json'):
+    return (b'POST /recognize HTTP/1.1\r\nContent-Type: %s\r\nContent-Length: %d\r\n\r\n'
+            % (content_type.encode(), len(body)) + body)
+
+
+@pytest.mark.parametrize('content_length', [b'abc', b'-5', b'1e3'])
+def test_bad_content_length(content_length):
+    status, payload = exchange(b'POST /recognize HTTP/1.1\r\nContent-Length: ' + content_length + b'\r\n\r\n')
+    assert status == 400
+    assert 'Content-Length' in payload['error']
+
+
+@pytest.mark.parametrize('body', [b'[1]', b'"x"', b'3', b'{"path": 3}', b'{"image": 5}', b'{}', b'{bad'])
+def test_bad_json_body(body):
+    status, payload = exchange(post(body))
+    assert status == 400
+    assert payload['error']
+
+
+def test_bad_request_line():
+    status, _ = exchange(b'GARBAGE\r\n\r\n')
+    assert status == 400
+
+
+def test_body_shorter_than_content_length_times_out(monkeypatch):
+    monkeypatch.setattr(ocr_service, 'READ_TIMEOUT', 0.2)
+    status, _ = exchange(b'POST /recognize HTTP/1.1\r\nContent-Length: 100\r\n\r\n{"pa', hold=True)
+    assert status == 408
+
+
+def test_slow_headers_time_out(monkeypatch):
+    monkeypatch.setattr(ocr_service, 'READ_TIMEOUT', 0.2)
+    status, _ = exchange(b'POST /recognize HTTP/1.1\r\nContent-Type: application/json\r\n', hold=True)
+    assert status == 408
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+from ocr_engine import DEFAULT_CONFIG, BASE_DIR, list_images
+from onnx_backend import check_parity, model_path
+
+# 需要Paddle模型权重和导出好的ONNX模型（python onnx_backend.py export），缺任何一项时跳过
+REQUIRED_FILES = [os.path.join(DEFAULT_CONFIG['det_model_dir'], 'inference.pdiparams'),
+                  os.path.join(DEFAULT_CONFIG['rec_model_dir'], 'inference.pdiparams'),
+                  model_path(DEFAULT_CONFIG['onnx_model_dir'], 'det'),
+                  model_path(DEFAULT_CONFIG['onnx_model_dir'], 'rec')]
+
+
+@pytest.fixture(scope='module')
+def sample_images():
+    pytest.importorskip('paddleocr')
+    pytest.importorskip('onnxruntime')
+    missing = [path for path in REQUIRED_FILES if not os.path.isfile(path)]
+    if missing:
+        pytest.skip('缺少模型文件: %s' % ', '.join(missing))
+    images = list_images([os.path.join(BASE_DIR, 'test')])[:2]
+    if not images:
+        pytest.skip('test目录中没有样例图片')
+    return images
+
+
+def test_onnxruntime_matches_paddle(sample_images):
+    # 与命令行 onnx_backend.py check 的默认容差相同：Paddle一侧用PaddleOCR自带的DB后处理
+    assert check_parity(sample_images, 'onnxruntime', DEFAULT_CONFIG['onnx_model_dir'],
+                        rec_tolerance=0.01, det_tolerance=2.0) == 0
@@ -0,0 +1,52 @@
+import json
+
+import cv2
+import numpy as np
+
+from plate_eval import match_boxes, polygon_iou, evaluate
+import plate_eval
+
+
+def rect(x, y, w, h):
+    return [[x, y], [x + w, y], [x + w, y + h], [x, y + h]]
+
+
+def test_polygon_iou():
+    assert polygon_iou(rect(0, 0, 10, 10), rect(0, 0, 10, 10)) == 1.0
+    assert abs(polygon_iou(rect(0, 0, 10, 10), rect(5, 0, 10, 10)) - 50 / 150.0) < 1e-6
+    assert polygon_iou(rect(0, 0, 10, 10), rect(20, 20, 5, 5)) == 0.0
+
+
+def test_match_boxes_is_one_to_one():
+    gt = [rect(0, 0, 100, 20), rect(0, 50, 100, 20)]
+    # 两个预测框都与第一个标注框重叠，只有交并比最高的一个算命中，另一个是误检
+    pred = [rect(2, 0, 100, 20), rect(0, 1, 100, 20)]
+    hits, counted, missed, false_pos = match_boxes(gt, pred)
+    assert (hits, counted, missed, false_pos) == (1, 2, [1], [1])
+
+
+def test_match_boxes_threshold_and_ignore():
+    gt = [rect(0, 0, 100, 20)]
+    pred = [rect(60, 0, 100, 20), rect(300, 300, 50, 20)]
+    ignore = [rect(290, 290, 100, 100)]
+    hits, counted, missed, false_pos = match_boxes(gt, pred, ignore)
+    # 交并比40/160低于0.5不算命中；落在忽略区域内的预测框不参与计数
+    assert (hits, counted, missed, false_pos) == (0, 1, [0], [0])
+    assert match_boxes(gt, pred, ignore, iou_thresh=0.2)[:3] == (1, 1, [])
+    assert match_boxes([], []) == (0, 0, [], [])
+
+
+def test_failure_dumps_do_not_collide(tmp_path, monkeypatch):
+    samples = []
+    for folder in ('a', 'b'):
+        (tmp_path / folder).mkdir()
+        cv2.imwrite(str(tmp_path / folder / '0001.jpg'), np.zeros((40, 80, 3), dtype=np.uint8))
+        samples.append({'path': str(tmp_path / folder / '0001.jpg'), 'plate': '浙岱渔1', 'boxes': None, 'ignore': []})
+    record = {'text': '', 'score': 0.0, 'det_score': 0.0, 'box': None, 'regions': []}
+    monkeypatch.setattr(plate_eval, 'run_pipeline', lambda samples, *args: [dict(record) for _ in samples])
+
+    evaluate(samples, {}, failure_dir=str(tmp_path / 'failures'))
+    with open(str(tmp_path / 'failures' / 'failures.jsonl'), encoding='utf-8') as f:
+        dumps = [json.loads(line)['dump'] for line in f]
+    assert len(set(dumps)) == 2
+    assert all(cv2.imread(path) is not None for path in dumps)
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from ocr_engine import edit_distance
+from plate_search import PlateSearch, edit_distances, random_plate, corrupt
+from recognition_store import RecognitionStore, normalize_plate
+
+
+def random_text(rng):
+    return ''.join(rng.choice('浙岱渔01234AB') for _ in range(rng.randint(0, 10)))
+
+
+def test_edit_distances_match_scalar():
+    rng = random.Random(0)
+    for _ in range(200):
+        query = random_text(rng)
+        texts = [random_text(rng) for _ in range(rng.randint(1, 8))]
+        assert list(edit_distances(query, texts)) == [edit_distance(query, text) for text in texts]
+
+
+def test_edit_distances_edge_cases():
+    assert len(edit_distances('浙岱渔1', [])) == 0
+    assert list(edit_distances('', ['', 'ab'])) == [0, 2]
+    assert list(edit_distances('abc', ['', 'abc', 'abd', 'xabc', 'cba'])) == [3, 0, 1, 1, 2]
+
+
+@pytest.fixture(scope='module')
+def history(tmp_path_factory):
+    rng = random.Random(1)
+    plates = sorted({random_plate(rng) for _ in range(1000)})
+    path = str(tmp_path_factory.mktemp('search') / 'history.db')
+    with RecognitionStore(path, batch_size=1000) as store:
+        for k, plate in enumerate(plates):
+            store.add('%d.jpg' % k, plate)
+    return path, plates
+
+
+@pytest.mark.parametrize('max_distance', [1, 2])
+def test_search_recalls_every_text_within_distance(history, max_distance):
+    # 三元组下界只用来过滤，结果应与对全部文本逐个计算编辑距离完全一致
+    path, plates = history
+    rng = random.Random(max_distance)
+    searcher = PlateSearch(path)
+    try:
+        for _ in range(30):
+            query = corrupt(rng.choice(plates), rng, rng.randint(1, 2))
+            expected = {plate for plate in plates if edit_distance(normalize_plate(query), plate) <= max_distance}
+            results = searcher.search(query, max_distance=max_distance, limit=len(plates))
+            assert {r['text'] for r in results} == expected
+            assert all(r['distance'] == edit_distance(normalize_plate(query), r['text']) for r in results)
+            assert [r['distance'] for r in results] == sorted(r['distance'] for r in results)
+    finally:
+        searcher.close()
@@ -0,0 +1,275 @@
+import sys
+import json
+import time
+import argparse
+import itertools
+
+import cv2
+import numpy as np
+
+from ocr_engine import (ShipPlateEngine, DEFAULT_CONFIG, BACKENDS, DET_MODES, text_similarity, box_iou,
+                        load_camera_profiles, find_camera_profile, get_rotate_crop_image)
+from plate_tracker import PlateTracker
+from metrics import start_metrics
+from recognition_store import RecognitionStore, DEFAULT_DB_PATH
+from crop_store import CROP_FORMATS, CropStore, crop_dir_for
+
+
+def open_source(source):
+    """打开视频文件、视频流地址或摄像头编号"""
+    cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if not cap.isOpened():
+        raise IOError('无法打开视频源: %s' % source)
+    return cap
+
+
+def iter_sampled_frames(cap, sample_fps):
+    """按指定帧率抽帧，产出(帧号, 时间戳秒, 图像)；未抽中的帧只grab不取出图像"""
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    step = max(1, int(round(fps / sample_fps))) if fps > 0 else None
+    start = time.monotonic()
+    last_sample = None
+    for index in itertools.count():
+        if not cap.grab():
+            break
+        if step is not None:
+            if index % step:
+                continue
+            timestamp = index / fps
+        else:
+            # 拿不到帧率的视频流按墙上时钟抽帧
+            timestamp = time.monotonic() - start
+            if last_sample is not None and timestamp - last_sample < 1.0 / sample_fps:
+                continue
+            last_sample = timestamp
+        ok, frame = cap.retrieve()
+        if not ok:
+            break
+        yield index, timestamp, frame
+
+
+class FrameChangeFilter:
+    """与上一次送检的帧比较缩略图差异，几乎没变化的帧直接跳过"""
+
+    def __init__(self, threshold=4.0, size=(64, 36), max_skip=10):
+        self.threshold = threshold  # 灰度缩略图的平均绝对差阈值(0~255)
+        self.size = size
+        self.max_skip = max_skip  # 连续跳过这么多帧后强制送检一次
+        self.last_thumb = None
+        self.skipped = 0
+
+    def changed(self, frame):
+        thumb = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), self.size,
+                           interpolation=cv2.INTER_AREA).astype(np.float32)
+        if self.last_thumb is not None and self.skipped < self.max_skip:
+            if float(np.mean(np.abs(thumb - self.last_thumb))) < self.threshold:
+                self.skipped += 1
+                return False
+        self.last_thumb = thumb
+        self.skipped = 0
+        return True
+
+
+class PlateEventMerger:
+    """把连续帧中同一船牌的多次识别合并成一个事件，保留得分最高的文本"""
+
+    def __init__(self, gap=2.0, min_similarity=0.6, min_iou=0.3, min_reads=1):
+        self.gap = gap  # 超过这么多秒没再出现则认为事件结束
+        self.min_similarity = min_similarity
+        self.min_iou = min_iou
+        self.min_reads = min_reads
+        self.active = []
+        self.visible = []  # 上一次送检帧中出现的事件
+        self._event_ids = itertools.count(1)
+
+    def _match(self, text, box):
+        best, best_sim = None, 0.0
+        for event in self.active:
+            sim = text_similarity(text, event['text'])
+            # 文本相近，或者位置基本没动（同一块船牌读错了字）都算同一事件
+            if sim >= self.min_similarity or box_iou(box, event['box']) >= self.min_iou:
+                if best is None or sim > best_sim:
+                    best, best_sim = event, sim
+        return best
+
+    def add(self, frame_index, timestamp, result):
+        """加入一帧的识别结果，返回因超时而结束的事件列表"""
+        closed = self.expire(timestamp)
+        self.visible = []
+        if not result['text']:
+            return closed
+        event = self._match(result['text'], result['box'])
+        if event is None:
+            event = {'event': next(self._event_ids), 'text': result['text'], 'score': result['score'],
+                     'det_score': result['det_score'], 'box': result['box'], 'start': timestamp, 'end': timestamp,
+                     'best_frame': frame_index, 'best_box': result['box'], 'reads': 0, 'texts': {}}
+            self.active.append(event)
+        event['reads'] += 1
+        event['end'] = timestamp
+        event['texts'][result['text']] = event['texts'].get(result['text'], 0) + 1
+        if result['score'] > event['score']:
+            event['text'] = result['text']
+            event['score'] = result['score']
+            event['det_score'] = result['det_score']
+            event['best_frame'] = frame_index
+            event['best_box'] = result['box']
+        event['box'] = result['box']
+        self.visible = [event]
+        return closed
+
+    def extend(self, timestamp):
+        """画面没有变化而跳过的帧：上一帧看到的船牌视为仍然在场"""
+        for event in self.visible:
+            event['end'] = timestamp
+        return self.expire(timestamp)
+
+    def expire(self, timestamp):
+        closed = [e for e in self.active if timestamp - e['end'] > self.gap]
+        self.active = [e for e in self.active if timestamp - e['end'] <= self.gap]
+        return [e for e in closed if e['reads'] >= self.min_reads]
+
+    def flush(self):
+        """视频结束时关闭所有事件"""
+        closed, self.active = self.active, []
+        return [e for e in closed if e['reads'] >= self.min_reads]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='视频/视频流船牌识别：抽帧、跳过静止帧、合并同一船牌')
+    parser.add_argument('source', help='视频文件、视频流地址(rtsp://...)或摄像头编号')
+    parser.add_argument('-o', '--output', default='-', help='事件输出文件(JSONL)，默认标准输出')
+    parser.add_argument('--sample-fps', type=float, default=2.0, help='每秒抽取的帧数')
+    parser.add_argument('--diff-threshold', type=float, default=4.0,
+                        help='与上次送检帧的灰度平均差低于该值时跳过')
+    parser.add_argument('--gap', type=float, default=2.0, help='船牌消失超过该秒数则结束事件')
+    parser.add_argument('--min-reads', type=int, default=1, help='事件至少被识别到的次数')
+    parser.add_argument('--frames', action='store_true', help='同时输出每一帧的识别结果')
+    parser.add_argument('--track', action='store_true',
+                        help='跟踪模式：光流跟踪检测框，隔帧检测，画面变化时才重新识别')
+    parser.add_argument('--det-interval', type=int, default=10, help='跟踪模式下完整检测的最大间隔帧数')
+    parser.add_argument('--det-mode', choices=DET_MODES, default=DEFAULT_CONFIG['det_mode'],
+                        help='adaptive：先低分辨率粗检，只对小目标区域做完整分辨率细检；'
+                             'tiled：超大图切成重叠分块按原分辨率检测，找远处的小船牌')
+    parser.add_argument('--det-postprocess', choices=['paddle', 'fast'], default=DEFAULT_CONFIG['det_postprocess'],
+                        help='fast：使用向量化的DB后处理，检测框与paddle实现一致（误差在1~2像素内）')
+    parser.add_argument('--camera-profiles', default=None, help='摄像头配置文件')
+    parser.add_argument('--camera', default=None, help='使用摄像头配置文件中的哪一项')
+    parser.add_argument('--device', choices=['auto', 'cpu', 'gpu'], default=DEFAULT_CONFIG['device'])
+    parser.add_argument('--backend', choices=BACKENDS, default=DEFAULT_CONFIG['backend'],
+                        help='推理后端，onnxruntime/openvino需先用onnx_backend.py导出ONNX模型，只支持CPU')
+    parser.add_argument('--onnx-model-dir', default=DEFAULT_CONFIG['onnx_model_dir'])
+    parser.add_argument('--precision', choices=['fp32', 'int8'], default=DEFAULT_CONFIG['onnx_precision'],
+                        help='ONNX后端的模型精度，int8需先用onnx_quantize.py校准生成')
+    parser.add_argument('--det-model-dir', default=DEFAULT_CONFIG['det_model_dir'])
+    parser.add_argument('--rec-model-dir', default=DEFAULT_CONFIG['rec_model_dir'])
+    parser.add_argument('--rec-cascade', action='store_true',
+                        help='识别级联：先用轻量识别模型，置信度低于--cascade-score的裁剪图再用完整模型识别')
+    parser.add_argument('--rec-light-model-dir', default=DEFAULT_CONFIG['rec_light_model_dir'])
+    parser.add_argument('--cascade-score', type=float, default=DEFAULT_CONFIG['rec_cascade_score'])
+    parser.add_argument('--db', nargs='?', const=DEFAULT_DB_PATH, default=None, metavar='PATH',
+                        help='船牌事件同时写入识别记录库（后台分组提交），图片名记为 视频源#最佳帧号')
+    parser.add_argument('--crop-dir', default=None,
+                        help='船牌事件最佳帧裁剪图的目录，默认为库文件旁的 <库名>_crops；指定后不写库也保存裁剪图')
+    parser.add_argument('--crop-format', choices=sorted(CROP_FORMATS), default='png',
+                        help='裁剪图格式：png无损；webp有损，约小5倍')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='在 http://127.0.0.1:端口/metrics 提供Prometheus格式的性能指标')
+    parser.add_argument('--metrics-log-interval', type=float, default=None,
+                        help='每隔这么多秒输出一行性能指标日志')
+    args = parser.parse_args(argv)
+    if args.camera and not args.camera_profiles:
+        parser.error('--camera 需要 --camera-profiles')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = {
+        'det_model_dir': args.det_model_dir,
+        'rec_model_dir': args.rec_model_dir,
+        'rec_cascade': args.rec_cascade,
+        'rec_light_model_dir': args.rec_light_model_dir,
+        'rec_cascade_score': args.cascade_score,
+        'device': args.device,
+        'det_mode': args.det_mode,
+        'det_postprocess': args.det_postprocess,
+        'backend': args.backend,
+        'onnx_model_dir': args.onnx_model_dir,
+        'onnx_precision': args.precision,
+    }
+    if args.camera:
+        # 一路视频只对应一个摄像头，直接用其配置覆盖检测参数
+        config.update(find_camera_profile(args.camera, load_camera_profiles(args.camera_profiles)))
+    engine = ShipPlateEngine(config)
+    metrics = start_metrics(args.metrics_port, args.metrics_log_interval)
+    if metrics is not None:
+        engine.stage_timer = metrics
+    store = RecognitionStore(args.db, metrics=metrics) if args.db else None
+    crop_dir = args.crop_dir or (crop_dir_for(args.db) if args.db else None)
+    crops = CropStore(crop_dir, args.crop_format) if crop_dir else None
+    best_crops = {}  # 事件号 -> 目前最佳帧的裁剪图，事件结束时保存
+    cap = open_source(args.source)
+    change_filter = FrameChangeFilter(threshold=args.diff_threshold)
+    merger = PlateEventMerger(gap=args.gap, min_reads=args.min_reads)
+    tracker = PlateTracker(engine, det_interval=args.det_interval) if args.track else None
+
+    stream = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+
+    def emit(record):
+        if 'event' in record:
+            record['model_version'] = engine.model_version
+            if crops is not None:
+                record['crop'] = crops.put(best_crops.pop(record['event'], None))
+        stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        stream.flush()
+        if store is not None and 'event' in record:
+            store.add('%s#%d' % (args.source, record['best_frame']), record['text'], polygon=record['best_box'],
+                      det_score=record['det_score'], rec_score=record['score'],
+                      model_version=record['model_version'], crop_ref=record.get('crop'))
+
+    sampled = processed = 0
+    start = time.perf_counter()
+    try:
+        for frame_index, timestamp, frame in iter_sampled_frames(cap, args.sample_fps):
+            sampled += 1
+            if not change_filter.changed(frame):
+                if metrics is not None:
+                    metrics.inc('frames_skipped')
+                for event in merger.extend(timestamp):
+                    emit(event)
+                continue
+            processed += 1
+            t0 = time.perf_counter()
+            result = tracker.update(frame) if tracker else engine.process_image(frame)
+            if metrics is not None:
+                metrics.observe('total', time.perf_counter() - t0)
+                metrics.inc('images')
+            if args.frames:
+                emit({'frame': frame_index, 'time': timestamp, 'text': result['text'],
+                      'score': result['score'], 'box': result['box']})
+            closed = merger.add(frame_index, timestamp, result)
+            if crops is not None and merger.visible and merger.visible[0]['best_frame'] == frame_index:
+                best_crops[merger.visible[0]['event']] = get_rotate_crop_image(frame, result['box'])
+            for event in closed:
+                emit(event)
+            if len(best_crops) > len(merger.active):
+                # 读数不够min_reads而丢弃的事件不再需要裁剪图
+                active = {e['event'] for e in merger.active}
+                best_crops = {k: v for k, v in best_crops.items() if k in active}
+        for event in merger.flush():
+            emit(event)
+    finally:
+        cap.release()
+        if stream is not sys.stdout:
+            stream.close()
+        if store is not None:
+            store.close()
+        if metrics is not None:
+            metrics.close()
+    print('抽帧 %d，实际识别 %d，耗时 %.2fs' % (sampled, processed, time.perf_counter() - start),
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,65 +1,259 @@
-import imgaug.augmenters as iaa
+import os
+import sys
+import json
+import time
+import argparse
+import collections
+import multiprocessing
+
 import cv2
-import matplotlib.pyplot as plt
 import numpy as np
 
-# 1. 定义增强序列
-# 创建一个序列，包含随机旋转和随机水平翻转
-# order="linear" 和 cval=0 是处理旋转后边界的参数
-# rotate=(-10, 10) 表示随机旋转角度在-10到+10度之间
-# flipr=0.5 表示以50%的概率水平翻转
-augmenter = iaa.Sequential([
-    iaa.Affine(rotate=(-10, 10), order=1, cval=0, mode='constant'), # 随机旋转
-    iaa.Fliplr(0.5) # 随机水平翻转
-], random_order=True) # 以随机顺序应用序列中的增强
-
-# 2. 加载图像 (请替换为你的图片路径)
-image_path = "./1.jpg" # 示例图片路径
-image = cv2.imread(image_path)
-
-if image is None:
-    print(f"错误：无法加载图片 {image_path}")
-else:
-    # OpenCV加载的图片是BGR格式，为了在matplotlib中正确显示，转换为RGB
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-
-    # 3. 应用数据增强
-    # augmenter可以处理单张图片或一个图片列表
-    augmented_image = augmenter(image=image)
-
-    # 4. 显示原始图像和增强后的图像
-    fig, axes = plt.subplots(1, 2, figsize=(10, 5))
-    axes[0].imshow(image)
-    axes[0].set_title("Original Image")
-    axes[0].axis('off')
-
-    axes[1].imshow(augmented_image)
-    axes[1].set_title("Augmented Image")
-    axes[1].axis('off')
-
-    plt.tight_layout()
-    plt.show()
-
-    # 5. 应用更复杂的增强序列 (示例，你可以根据config配置更多)
-    more_complex_augmenter = iaa.Sequential([
-        iaa.Affine(
-            scale={"x": (0.5, 1.5), "y": (0.5, 1.5)}, # 随机缩放
-            translate_percent={"x": (-0.1, 0.1), "y": (-0.1, 0.1)}, # 随机平移
-            rotate=(-20, 20), # 更大范围的旋转
-            shear=(-8, 8), # 剪切变换
-            order=[0, 1], # 使用最近邻或双线性插值
-            cval=(0, 255), # 填充边界的像素值范围
-            mode=iaa.ALL # 填充模式
-        ),
-        iaa.AddToHueAndSaturation((-20, 20)), # 随机改变色相和饱和度
-        iaa.GammaContrast((0.5, 2.0)), # 随机改变对比度
-        iaa.GaussianBlur(sigma=(0.0, 1.0)) # 随机应用高斯模糊
-    ], random_order=True)
-
-    augmented_image_complex = more_complex_augmenter(image=image)
-
-    plt.figure(figsize=(6, 6))
-    plt.imshow(augmented_image_complex)
-    plt.title("More Complex Augmented Image")
-    plt.axis('off')
-    plt.show()
\ No newline at end of file
+from ocr_engine import load_image, order_points_clockwise
+
+# 离线数据增强：按PaddleOCR标注文件逐行读取样本，多进程生成增强后的图片和新的标注文件。
+# 检测(det)标注每行为 图片路径\t[{"transcription": 文本, "points": [[x, y], ...]}, ...]，
+# 检测框随图片一起变换；识别(rec)标注每行为 图片路径\t文本。
+# 输出目录下图片按shard_00000/、shard_00001/...分目录存放，标注文件中的路径相对于输出目录，
+# 训练时把输出目录作为data_dir、labels.txt加入label_file_list即可
+
+TASKS = ('det', 'rec')
+
+_task = None  # 每个子进程各自持有一个增强序列
+_augmenter = None
+_data_dir = None
+_out_dir = None
+_quality = None
+
+
+def build_augmenter(task):
+    """增强序列，与原脚本中的复杂序列相同：仿射（缩放、平移、旋转、剪切）、色相饱和度、Gamma、高斯模糊，
+    det另加水平翻转（同训练参数中的IaaAugment）。边界用常数填充，镜像填充会凭空多出没有标注的文字。
+    rec的裁剪图不翻转（翻转后文字成了镜像），几何变换也小一些，避免文字被切出画面"""
+    import albumentations as A
+    if task == 'det':
+        geometric = [
+            A.HorizontalFlip(p=0.5),
+            A.Affine(scale=(0.5, 1.5), translate_percent=(-0.1, 0.1), rotate=(-20, 20), shear=(-8, 8),
+                     border_mode=cv2.BORDER_CONSTANT, fill=0, p=1.0),
+        ]
+    else:
+        geometric = [
+            A.Affine(scale=(0.9, 1.1), rotate=(-5, 5), shear=(-5, 5), border_mode=cv2.BORDER_CONSTANT, fill=0,
+                     p=1.0),
+        ]
+    return A.Compose(geometric + [
+        A.HueSaturationValue(hue_shift_limit=20, sat_shift_limit=20, val_shift_limit=0, p=1.0),
+        A.RandomGamma(gamma_limit=(50, 200), p=1.0),
+        A.GaussianBlur(sigma_limit=(0.1, 1.0), p=0.5),
+    ], keypoint_params=A.KeypointParams(format='xy', remove_invisible=False))
+
+
+def sample_seed(seed, index):
+    """第index个输出样本的随机种子，只由总种子和样本序号决定，与进程数和任务调度无关"""
+    return int(np.random.SeedSequence([seed, index]).generate_state(1)[0])
+
+
+def parse_label_line(line, task):
+    """解析标注文件的一行，返回(图片路径, 标注)，det的标注为检测框列表，rec为文本；空行返回None"""
+    line = line.rstrip('\r\n')
+    if not line.strip():
+        return None
+    path, _, label = line.partition('\t')
+    return path, json.loads(label) if task == 'det' else label
+
+
+def format_label_line(path, label, task):
+    if task == 'det':
+        label = json.dumps(label, ensure_ascii=False)
+    return '%s\t%s' % (path, label)
+
+
+def transform_polygons(label, points, shape, min_visible=0.9):
+    """把增强后的角点按原标注分回各检测框：四点框重新按顺时针排列（水平翻转后顺序会反），
+    坐标裁到图像范围内。完全移出画面的框丢弃，只剩一部分在画面内（裁剪后面积不足min_visible）
+    的框文本标为###，训练时忽略"""
+    h, w = shape[:2]
+    polygons, start = [], 0
+    for item in label:
+        n = len(item['points'])
+        poly = np.asarray(points[start:start + n], dtype=np.float32).reshape(-1, 2)
+        start += n
+        if n == 4:
+            poly = order_points_clockwise(poly)
+        area = abs(cv2.contourArea(poly))
+        clipped = poly.copy()
+        clipped[:, 0] = np.clip(clipped[:, 0], 0, w - 1)
+        clipped[:, 1] = np.clip(clipped[:, 1], 0, h - 1)
+        visible = abs(cv2.contourArea(clipped))
+        if visible < 1.0:
+            continue
+        text = item['transcription'] if visible >= min_visible * area else '###'
+        polygons.append({'transcription': text, 'points': np.round(clipped).astype(int).tolist()})
+    return polygons
+
+
+def augment_sample(img, label, task, augmenter, seed):
+    """对一张BGR图片做一次增强，返回(增强后的图片, 标注)。det的检测框角点与图片经过同一组变换"""
+    augmenter.set_random_seed(seed)
+    points = [pt for item in label for pt in item['points']] if task == 'det' else []
+    out = augmenter(image=cv2.cvtColor(img, cv2.COLOR_BGR2RGB), keypoints=points)
+    aug = cv2.cvtColor(out['image'], cv2.COLOR_RGB2BGR)
+    if task == 'det':
+        label = transform_polygons(label, out['keypoints'], aug.shape)
+    return aug, label
+
+
+def iter_jobs(label_file, task, copies, seed, shard_size):
+    """逐行读取标注文件，产出(图片路径, 标注, [(种子, 输出路径), ...])，每张原图生成copies个样本。
+    只在需要时读下一行，标注文件再大也不会整个读进内存"""
+    index = 0
+    with open(label_file, encoding='utf-8') as f:
+        for line in f:
+            parsed = parse_label_line(line, task)
+            if parsed is None:
+                continue
+            outputs = []
+            for _ in range(copies):
+                outputs.append((sample_seed(seed, index), 'shard_%05d/%08d.jpg' % (index // shard_size, index)))
+                index += 1
+            yield parsed[0], parsed[1], outputs
+
+
+def _init_worker(task, data_dir, out_dir, quality):
+    global _task, _augmenter, _data_dir, _out_dir, _quality
+    # 每个进程单线程，靠进程数扩展，多个进程的OpenCV线程池互相争抢反而更慢
+    cv2.setNumThreads(1)
+    _task, _data_dir, _out_dir, _quality = task, data_dir, out_dir, quality
+    _augmenter = build_augmenter(task)
+
+
+def _run_job(job):
+    """原图只解码一次，生成它的全部样本并写盘，返回新标注文件中的行；原图读不出时返回(原图路径, None)"""
+    path, label, outputs = job
+    img = load_image(os.path.join(_data_dir, path))
+    if img is None:
+        return path, None
+    lines = []
+    for seed, name in outputs:
+        aug, aug_label = augment_sample(img, label, _task, _augmenter, seed)
+        ok, buf = cv2.imencode('.jpg', aug, [cv2.IMWRITE_JPEG_QUALITY, _quality])
+        if not ok:
+            raise ValueError('图片编码失败: %s' % name)
+        out_path = os.path.join(_out_dir, name)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with open(out_path, 'wb') as f:
+            f.write(buf.tobytes())
+        lines.append(format_label_line(name, aug_label, _task))
+    return path, lines
+
+
+def bounded_imap(pool, func, items, window):
+    """与pool.imap一样按输入顺序产出结果，但最多只有window个任务在途。
+    pool.imap的任务线程会尽快把整个输入迭代器读完送进队列，这里读一个、交一个"""
+    pending = collections.deque()
+    for item in items:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def generate(label_file, data_dir, out_dir, task='det', copies=4, workers=None, seed=0, shard_size=5000,
+             quality=95, label_name='labels.txt'):
+    """生成增强数据集，返回(写出的样本数, 读不出的原图数, 耗时秒)。种子按样本序号派生，
+    同样的参数不论用几个进程，生成的图片和标注都完全相同"""
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = iter_jobs(label_file, task, copies, seed, shard_size)
+    written = missing = 0
+    start = time.perf_counter()
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(task, data_dir, out_dir, quality)) as pool, \
+            open(os.path.join(out_dir, label_name), 'w', encoding='utf-8') as labels:
+        for path, lines in bounded_imap(pool, _run_job, jobs, workers * 4):
+            if lines is None:
+                missing += 1
+                print('无法读取图片: %s' % path, file=sys.stderr)
+                continue
+            for line in lines:
+                labels.write(line + '\n')
+            written += len(lines)
+            if written % 1000 < len(lines):
+                print('已生成 %d 张，%.1f 张/秒' % (written, written / (time.perf_counter() - start)),
+                      file=sys.stderr)
+    return written, missing, time.perf_counter() - start
+
+
+def draw_sample(img, label, task):
+    """在图片上画出检测框（忽略的框为红色）或写上文本，用于人工检查增强结果"""
+    img = img.copy()
+    if task == 'det':
+        for item in label:
+            color = (0, 0, 255) if item['transcription'] == '###' else (0, 255, 0)
+            cv2.polylines(img, [np.int32(item['points'])], True, color, 2)
+    else:
+        cv2.putText(img, str(len(label)), (2, 14), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+    return img
+
+
+def preview(label_file, data_dir, output, task='det', count=7, seed=0, index=0):
+    """把标注文件第index个样本的原图和count个增强结果（画上检测框）拼成一张图写到output"""
+    for k, (path, label, _) in enumerate(iter_jobs(label_file, task, 1, seed, 1)):
+        if k == index:
+            break
+    else:
+        raise ValueError('标注文件中没有第 %d 个样本' % index)
+    img = load_image(os.path.join(data_dir, path))
+    if img is None:
+        raise ValueError('无法读取图片: %s' % path)
+    augmenter = build_augmenter(task)
+    tiles = [draw_sample(img, label, task)]
+    for k in range(count):
+        tiles.append(draw_sample(*augment_sample(img, label, task, augmenter, sample_seed(seed, k)), task))
+    h, w = img.shape[:2]
+    tiles = [cv2.resize(t, (w, h)) for t in tiles]
+    tiles += [np.zeros_like(tiles[0])] * (-len(tiles) % 4)
+    grid = np.vstack([np.hstack(tiles[i:i + 4]) for i in range(0, len(tiles), 4)])
+    cv2.imencode(os.path.splitext(output)[1] or '.jpg', grid)[1].tofile(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='离线数据增强：按PaddleOCR标注文件多进程生成增强样本和新的标注文件')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    gen = sub.add_parser('generate', help='生成增强数据集')
+    gen.add_argument('label_file', help='标注文件，每行 图片路径\\t标注')
+    gen.add_argument('out_dir', help='输出目录，图片分目录存放，标注写入其中的labels.txt')
+    gen.add_argument('--data-dir', default=None, help='标注中图片路径的根目录，默认为标注文件所在目录')
+    gen.add_argument('--task', choices=TASKS, default='det', help='det：检测标注，框随图片变换；rec：识别标注')
+    gen.add_argument('--copies', type=int, default=4, help='每张原图生成的样本数')
+    gen.add_argument('--workers', type=int, default=None, help='进程数，默认为CPU核数')
+    gen.add_argument('--seed', type=int, default=0)
+    gen.add_argument('--shard-size', type=int, default=5000, help='每个子目录存放的图片数')
+    gen.add_argument('--quality', type=int, default=95, help='输出JPEG质量')
+
+    pre = sub.add_parser('preview', help='把一个样本的若干增强结果画上标注拼成一张图，检查增强是否合适')
+    pre.add_argument('label_file')
+    pre.add_argument('-o', '--output', default='preview.jpg')
+    pre.add_argument('--data-dir', default=None)
+    pre.add_argument('--task', choices=TASKS, default='det')
+    pre.add_argument('--index', type=int, default=0, help='标注文件中的第几个样本')
+    pre.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    data_dir = args.data_dir or os.path.dirname(os.path.abspath(args.label_file))
+    if args.command == 'preview':
+        preview(args.label_file, data_dir, args.output, args.task, seed=args.seed, index=args.index)
+        print('已写入 %s' % args.output)
+        return 0
+    written, missing, elapsed = generate(args.label_file, data_dir, args.out_dir, args.task, args.copies,
+                                         args.workers, args.seed, args.shard_size, args.quality)
+    print('生成 %d 张样本，耗时 %.1fs，%.1f 张/秒；%d 张原图无法读取' % (
+        written, elapsed, written / elapsed if elapsed else 0.0, missing))
+    return 1 if missing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())